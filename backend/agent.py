@@ -2,23 +2,45 @@
 AI Agent 类
 """
 import json
+import time
 import asyncio
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Optional
 from langchain_deepseek import ChatDeepSeek
 from langchain.schema import HumanMessage, AIMessage
-from langchain.memory import ConversationBufferMemory
+from langchain_core.messages import ToolMessage
 from tools.manager import ToolManager
 from tools.base import ToolResult
+from session import SessionStore, Session
+from context import ContextBuilder, estimate_tokens, render_messages
+from prompt import PromptBuilder
+from intent import IntentDetector
+from streaming import coalesce_chunks, sse_event
+from llm_cache import LLMResponseCache, replay
+from semantic_cache import SemanticCache
+from metrics import (
+    ACTIVE_STREAMS, CHAT_REQUEST_SECONDS, LLM_REQUEST_SECONDS,
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS, STAGE_SECONDS, STREAM_CANCELLED_TOKENS, TOOL_ERRORS
+)
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class AIAgent:
     """AI智能助手"""
     
     def __init__(self):
-        self.memory = ConversationBufferMemory()
+        self.sessions = SessionStore()
         self._chat_model = None
         self.tool_manager = ToolManager()
+        self.intent_detector = IntentDetector(self.tool_manager)
+        self.context_builder = ContextBuilder(self._summarize)
+        self.prompt_builder = PromptBuilder(self.tool_manager, self.context_builder)
+        self.response_cache = LLMResponseCache()
+        self.semantic_cache = SemanticCache()
+        # 完整回复的平均token数（指数移动平均），用于估计取消生成节省的token
+        self.average_response_tokens: Optional[float] = None
     
     @property
     def chat_model(self):
@@ -28,7 +50,8 @@ class AIAgent:
                 model=settings.DEEPSEEK_MODEL,
                 temperature=settings.DEEPSEEK_TEMPERATURE,
                 max_tokens=settings.DEEPSEEK_MAX_TOKENS,
-                api_key=settings.DEEPSEEK_API_KEY
+                api_key=settings.DEEPSEEK_API_KEY,
+                api_base=settings.DEEPSEEK_API_BASE
             )
         return self._chat_model
     
@@ -42,68 +65,71 @@ class AIAgent:
                 result.append({"role": "assistant", "content": msg.content})
         return result
     
-    def _convert_memory_to_history(self) -> List[Dict[str, str]]:
+    def _convert_memory_to_history(self, session: Session) -> List[Dict[str, str]]:
         """获取对话历史"""
-        history = self.memory.chat_memory.messages
-        return self._convert_messages_to_dict(history)
+        return self._convert_messages_to_dict(session.messages)
+    
+    async def _get_session(self, session_id: Optional[str]) -> Session:
+        """获取会话（未指定时使用默认会话，首次访问时从存储加载历史）"""
+        return await self.sessions.load(session_id or settings.DEFAULT_SESSION_ID)
+    
+    async def _summarize(self, summary: str, messages: List) -> str:
+        """把较早的对话增量并入滚动摘要"""
+        prompt = f"""请把下面的新增对话合并进已有的对话摘要，保留关键事实、用户偏好和未完成的问题，不超过{settings.CONTEXT_SUMMARY_MAX_TOKENS}字，只输出摘要本身。
+
+已有摘要:
+{summary or "（无）"}
+
+新增对话:
+{render_messages(messages)}"""
+        response = await self.chat_model.ainvoke([("human", prompt)])
+        return response.content
     
-    async def chat(self, user_message: str, use_tools: bool = True) -> Dict[str, Any]:
+    def _use_function_calling(self, use_tools: bool, tool_mode: Optional[str]) -> bool:
+        """是否使用模型原生工具调用（否则使用关键词检测）"""
+        return use_tools and (tool_mode or settings.AGENT_TOOL_MODE) == "function_calling"
+    
+    async def chat(
+        self,
+        user_message: str,
+        use_tools: bool = True,
+        session_id: Optional[str] = None,
+        tool_mode: Optional[str] = None
+    ) -> Dict[str, Any]:
         """聊天方法"""
+        started = time.perf_counter()
         try:
-            # 获取对话历史
-            history = self.memory.chat_memory.messages
-            
-            # 如果启用工具，先检测并执行工具调用
-            tools_used = []
-            if use_tools:
-                tools_used = await self._detect_and_execute_tools(user_message, "")
-            
-            # 构建完整的对话上下文
-            context = ""
-            for msg in history:
-                if isinstance(msg, HumanMessage):
-                    context += f"用户: {msg.content}\n"
-                elif isinstance(msg, AIMessage):
-                    context += f"助手: {msg.content}\n"
-            
-            # 添加工具信息到上下文
-            if use_tools:
-                tools_info = "可用工具:\n"
-                for tool in self.tool_manager.get_available_tools():
-                    tools_info += f"- {tool['name']}: {tool['description']}\n"
-                context += f"\n{tools_info}\n"
+            # 获取会话
+            session = await self._get_session(session_id)
+            function_calling = self._use_function_calling(use_tools, tool_mode)
             
-            # 如果有工具结果，添加到上下文中
-            if tools_used:
-                context += "\n工具执行结果:\n"
-                for tool in tools_used:
-                    context += f"- {tool['tool']}: {tool['result']}\n"
-                context += "\n"
-            
-            # 添加当前用户消息
-            context += f"用户: {user_message}\n助手:"
-            
-            # 构建包含工具结果的提示词
-            system_prompt = """你是一个智能助手，可以使用各种工具来帮助用户。当用户询问需要工具支持的问题时，请基于工具执行结果来回答。
-
-如果检测到用户需要工具支持（如计算、查询时间、天气、翻译等），请使用工具结果来提供准确的回答。
-
-请用友好、自然的语气回答，并在适当时候使用工具结果。"""
+            # 关键词模式下先规划工具调用；首轮问题先查语义缓存
+            tool_calls = self._plan_tool_calls(user_message) if use_tools and not function_calling else []
+            semantic_key = self._semantic_key(session, user_message, tool_calls, use_tools, function_calling)
+            semantic_hit = self.semantic_cache.get(semantic_key)
             
-            # 调用ChatDeepSeek
-            messages = [
-                ("system", system_prompt),
-                ("human", context)
-            ]
-            response = await self.chat_model.ainvoke(messages)
-            ai_response = response.content
+            if semantic_hit is not None:
+                ai_response, tools_used = semantic_hit["response"], semantic_hit["tools_used"]
+            else:
+                tools_used = await self._execute_planned_tools(tool_calls)
+                
+                # 构建提示词（历史对话增量渲染，工具目录已缓存）
+                messages = await self._build_prompt(session, user_message, tools_used, use_tools and not function_calling)
+                if function_calling:
+                    source = self._measure_llm_stream(self._function_calling_stream(messages, tools_used), "function_calling")
+                    ai_response = "".join([content async for content in source])
+                else:
+                    # 首轮请求可复用相同提示词的缓存回复
+                    cache_key = self.response_cache.key_for(session, messages, function_calling)
+                    ai_response = await self.response_cache.get_or_invoke(cache_key, lambda: self._invoke(messages))
+                self.semantic_cache.set(semantic_key, ai_response, tools_used)
             
             # 保存到记忆
-            self.memory.chat_memory.add_user_message(user_message)
-            self.memory.chat_memory.add_ai_message(ai_response)
+            session.add_user_message(user_message)
+            session.add_ai_message(ai_response)
             
             # 获取更新后的对话历史
-            conversation_history = self._convert_memory_to_history()
+            conversation_history = self._convert_memory_to_history(session)
             
             return {
                 "response": ai_response,
@@ -112,213 +138,443 @@ class AIAgent:
             }
         except Exception as e:
             raise Exception(f"AI服务处理错误: {str(e)}")
+        finally:
+            CHAT_REQUEST_SECONDS.labels("chat").observe(time.perf_counter() - started)
     
-    async def chat_stream(self, user_message: str, use_tools: bool = True):
-        """流式聊天方法"""
+    async def chat_stream(
+        self,
+        user_message: str,
+        use_tools: bool = True,
+        session_id: Optional[str] = None,
+        tool_mode: Optional[str] = None
+    ):
+        """流式聊天方法
+        
+        STREAM_PIPELINE_ENABLED 时先发送ack帧，工具结果到达即以tool_result帧推送，
+        工具执行期间并行构建提示词前缀（历史上下文可能需要生成摘要、工具目录），
+        全部工具完成后只需追加工具结果即可发起模型请求（提示词包含工具结果，模型请求无法更早开始）；
+        原生工具调用模式下，模型规划期间按关键词检测结果预先执行工具，模型请求相同的调用时直接复用。
+        客户端断开导致生成器被取消或关闭时，进行中的工具调用和模型请求随之取消。
+        """
+        started = time.perf_counter()
+        ACTIVE_STREAMS.inc()
+        pipelined = settings.STREAM_PIPELINE_ENABLED
+        prefetched: Dict[str, asyncio.Task] = {}
+        prefix: Optional[List[str]] = None
+        cached = None
+        parts: List[str] = []
+        generated = False
         try:
-            # 获取对话历史
-            history = self.memory.chat_memory.messages
-            
-            # 如果启用工具，先检测并执行工具调用
-            tools_used = []
-            if use_tools:
-                tools_used = await self._detect_and_execute_tools(user_message, "")
+            if pipelined:
+                yield sse_event({'type': 'ack'})
             
-            # 构建完整的对话上下文
-            context = ""
-            for msg in history:
-                if isinstance(msg, HumanMessage):
-                    context += f"用户: {msg.content}\n"
-                elif isinstance(msg, AIMessage):
-                    context += f"助手: {msg.content}\n"
+            # 获取会话
+            session = await self._get_session(session_id)
+            function_calling = self._use_function_calling(use_tools, tool_mode)
             
-            # 添加工具信息到上下文
-            if use_tools:
-                tools_info = "可用工具:\n"
-                for tool in self.tool_manager.get_available_tools():
-                    tools_info += f"- {tool['name']}: {tool['description']}\n"
-                context += f"\n{tools_info}\n"
+            # 关键词模式下先规划工具调用；首轮问题先查语义缓存
+            tool_calls = self._plan_tool_calls(user_message) if use_tools and not function_calling else []
+            semantic_key = self._semantic_key(session, user_message, tool_calls, use_tools, function_calling)
+            semantic_hit = self.semantic_cache.get(semantic_key)
             
-            # 如果有工具结果，添加到上下文中
-            if tools_used:
-                context += "\n工具执行结果:\n"
-                for tool in tools_used:
-                    context += f"- {tool['tool']}: {tool['result']}\n"
-                context += "\n"
-            
-            # 添加当前用户消息
-            context += f"用户: {user_message}\n助手:"
-            
-            # 构建包含工具结果的提示词
-            system_prompt = """你是一个智能助手，可以使用各种工具来帮助用户。当用户询问需要工具支持的问题时，请基于工具执行结果来回答。
-
-如果检测到用户需要工具支持（如计算、查询时间、天气、翻译等），请使用工具结果来提供准确的回答。
-
-请用友好、自然的语气回答，并在适当时候使用工具结果。"""
+            cache_key = None
+            if semantic_hit is not None:
+                cached, tools_used = semantic_hit["response"], semantic_hit["tools_used"]
+            else:
+                if not pipelined:
+                    tools_used = await self._execute_planned_tools(tool_calls)
+                elif function_calling:
+                    # 模型规划期间预先执行关键词检测到的工具
+                    tools_used = []
+                    for call in self._plan_tool_calls(user_message):
+                        key = self.tool_manager.call_key(call["tool"], call["parameters"])
+                        if key not in prefetched:
+                            prefetched[key] = asyncio.create_task(self._run_tool_call(call))
+                else:
+                    # 工具结果到达即推送，同时构建提示词前缀
+                    tools_used = []
+                    prefix_task = asyncio.create_task(self._build_prompt_prefix(session, use_tools))
+                    try:
+                        async for frame in self._stream_tool_results(tool_calls, tools_used):
+                            yield frame
+                        prefix = await prefix_task
+                    finally:
+                        prefix_task.cancel()
+                
+                # 构建提示词（历史对话增量渲染，工具目录已缓存）
+                if prefix is not None:
+                    messages = self.prompt_builder.complete(prefix, user_message, tools_used)
+                else:
+                    messages = await self._build_prompt(session, user_message, tools_used, use_tools and not function_calling)
+                cache_key = self.response_cache.key_for(session, messages, function_calling)
+                cached = self.response_cache.get(cache_key)
             
             # 保存用户消息到记忆
-            self.memory.chat_memory.add_user_message(user_message)
-            
-            # 调用ChatDeepSeek进行流式输出
-            messages = [
-                ("system", system_prompt),
-                ("human", context)
-            ]
+            session.add_user_message(user_message)
             
-            # 使用astream方法进行流式输出
-            full_response = ""
-            async for chunk in self.chat_model.astream(messages):
-                if hasattr(chunk, 'content') and chunk.content:
-                    content = chunk.content
-                    full_response += content
-                    # 发送每个字符
-                    for char in content:
-                        yield f"data: {json.dumps({'content': char, 'type': 'content'})}\n\n"
-                        await asyncio.sleep(0.01)  # 控制输出速度
+            # 使用astream方法进行流式输出，模型块到达即转发（可按大小/时间窗口合并）
+            if cached is not None:
+                source = replay(cached)
+            elif function_calling:
+                source = self._measure_llm_stream(
+                    self._function_calling_stream(messages, tools_used, prefetched if pipelined else None),
+                    "function_calling"
+                )
+            else:
+                source = self._measure_llm_stream(self._stream_text(messages), "stream")
+            async for content in coalesce_chunks(source):
+                parts.append(content)
+                yield sse_event({'content': content, 'type': 'content'})
+            full_response = "".join(parts)
+            generated = True
+            if cached is None:
+                self.response_cache.set(cache_key, full_response)
+                self._observe_response_tokens(estimate_tokens(full_response))
+            if semantic_hit is None:
+                self.semantic_cache.set(semantic_key, full_response, tools_used)
             
             # 保存AI回复到记忆
-            self.memory.chat_memory.add_ai_message(full_response)
+            session.add_ai_message(full_response)
             
             # 如果有工具使用，发送工具使用信息
             if tools_used:
-                yield f"data: {json.dumps({'tools_used': tools_used, 'type': 'tools'})}\n\n"
+                yield sse_event({'tools_used': tools_used, 'type': 'tools'})
             
             # 发送完成信号
-            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            yield sse_event({'type': 'done'})
             
+        except (asyncio.CancelledError, GeneratorExit):
+            if cached is None and not generated:
+                self._record_cancelled_tokens(estimate_tokens("".join(parts)))
+            raise
         except Exception as e:
             error_msg = f"AI服务处理错误: {str(e)}"
-            yield f"data: {json.dumps({'content': error_msg, 'type': 'error'})}\n\n"
+            yield sse_event({'content': error_msg, 'type': 'error'})
+        finally:
+            # 取消模型没有用到的预取工具调用
+            for task in prefetched.values():
+                task.cancel()
+            ACTIVE_STREAMS.dec()
+            CHAT_REQUEST_SECONDS.labels("stream").observe(time.perf_counter() - started)
+    
+    def _observe_response_tokens(self, tokens: int):
+        if self.average_response_tokens is None:
+            self.average_response_tokens = float(tokens)
+        else:
+            self.average_response_tokens += 0.1 * (tokens - self.average_response_tokens)
+    
+    def _record_cancelled_tokens(self, generated: int):
+        """记录取消时模型已生成的token数，以及按平均回复长度估计的未生成（节省）的token数"""
+        STREAM_CANCELLED_TOKENS.labels("generated").inc(generated)
+        if self.average_response_tokens is not None:
+            STREAM_CANCELLED_TOKENS.labels("saved").inc(max(0.0, self.average_response_tokens - generated))
     
-    async def _detect_and_execute_tools(self, user_message: str, ai_response: str) -> List[Dict[str, Any]]:
-        """检测并执行工具调用"""
-        tools_used = []
+    async def _build_prompt(
+        self,
+        session: Session,
+        user_message: str,
+        tools_used: List[Dict[str, Any]],
+        describe_tools: bool
+    ) -> List:
+        """构建提示词（记录耗时）"""
+        with STAGE_SECONDS.labels("prompt_build").time():
+            return await self.prompt_builder.build(session, user_message, tools_used, describe_tools)
+    
+    async def _build_prompt_prefix(self, session: Session, describe_tools: bool) -> List[str]:
+        """构建与工具结果无关的提示词前缀（记录耗时）"""
+        with STAGE_SECONDS.labels("prompt_build").time():
+            return await self.prompt_builder.build_prefix(session, describe_tools)
+    
+    async def _invoke(self, messages: List) -> str:
+        """非流式调用模型（记录耗时）"""
+        with LLM_REQUEST_SECONDS.labels("invoke").time():
+            response = await self.chat_model.ainvoke(messages)
+        return response.content
+    
+    async def _measure_llm_stream(self, source, mode: str):
+        """转发模型输出块，记录首块等待时间和总耗时"""
+        started = time.perf_counter()
+        first = True
+        try:
+            async for content in source:
+                if first:
+                    LLM_TIME_TO_FIRST_TOKEN_SECONDS.labels(mode).observe(time.perf_counter() - started)
+                    first = False
+                yield content
+        finally:
+            LLM_REQUEST_SECONDS.labels(mode).observe(time.perf_counter() - started)
+    
+    async def _stream_text(self, messages: List):
+        """逐块读取模型输出的文本"""
+        async for chunk in self.chat_model.astream(messages):
+            if hasattr(chunk, 'content') and chunk.content:
+                yield chunk.content
+    
+    async def chat_batch(self, items: List[Dict[str, Any]], concurrency: Optional[int] = None):
+        """批量聊天：每条消息独立（不使用会话记忆），按完成顺序逐条产出结果
         
-        # 检测计算器调用
-        if any(keyword in user_message.lower() for keyword in ['计算', '算', '等于', '+', '-', '*', '/']):
-            try:
-                import re
-                # 改进的数学表达式匹配模式
-                math_pattern = r'(\d+[\+\-\*\/\s\(\)\d\.]+)'
-                matches = re.findall(math_pattern, user_message)
-                if matches:
-                    expression = matches[0].strip()
-                    result = await self.tool_manager.execute_tool("calculator", {"expression": expression})
-                    if result.success:
-                        tools_used.append({
-                            "tool": "calculator",
-                            "parameters": {"expression": expression},
-                            "result": result.result
-                        })
-            except Exception as e:
-                print(f"计算器工具执行错误: {e}")
+        先为全部消息规划工具调用，整个批次中相同的工具调用只执行一次；
+        工具调用受每个工具的并发上限（TOOL_CONCURRENCY_LIMITS）约束，每条消息的工具全局截止时间
+        从它的工具开始执行时计算；模型调用数受并发上限约束。
+        """
+        limit = min(concurrency or settings.BATCH_LLM_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+        semaphore = asyncio.Semaphore(max(1, limit))
+        shared_tasks: Dict[str, asyncio.Task] = {}
+        started: Dict[str, asyncio.Event] = {}
+        plans = [
+            self._plan_tool_calls(item["message"]) if item.get("use_tools", True) else []
+            for item in items
+        ]
         
-        # 检测天气查询
-        if any(keyword in user_message.lower() for keyword in ['天气', '气温', '温度']):
+        async def run_item(index: int) -> Dict[str, Any]:
+            item = items[index]
+            result = {"index": index, "id": item.get("id")}
             try:
-                import re
-                city_pattern = r'([北京|上海|广州|深圳|杭州|南京|成都|武汉|西安|重庆|天津|青岛|大连|厦门|苏州|无锡|宁波|长沙|郑州|济南|哈尔滨|沈阳|长春|石家庄|太原|呼和浩特|合肥|福州|南昌|南宁|海口|贵阳|昆明|拉萨|兰州|西宁|银川|乌鲁木齐]+)'
-                matches = re.findall(city_pattern, user_message)
-                if matches:
-                    city = matches[0]
-                    result = await self.tool_manager.execute_tool("weather", {"city": city})
-                    if result.success:
-                        tools_used.append({
-                            "tool": "weather",
-                            "parameters": {"city": city},
-                            "result": result.result
-                        })
+                tool_calls = plans[index]
+                tool_results = await self._gather_tool_calls(tool_calls, shared_tasks, started)
+                tools_used = [
+                    {"tool": call["tool"], "parameters": call["parameters"], "result": tool_result.result}
+                    for call, tool_result in zip(tool_calls, tool_results)
+                    if tool_result.success
+                ]
+                session = Session(f"batch-{index}", settings.SESSION_MAX_MESSAGES)
+                messages = await self.prompt_builder.build(
+                    session, item["message"], tools_used, item.get("use_tools", True)
+                )
+                async with semaphore:
+                    with LLM_REQUEST_SECONDS.labels("batch").time():
+                        response = await self.chat_model.ainvoke(messages)
+                result.update({"response": response.content, "tools_used": tools_used})
             except Exception as e:
-                print(f"天气工具执行错误: {e}")
+                result["error"] = f"AI服务处理错误: {str(e)}"
+            return result
         
-        # 检测时间查询
-        if any(keyword in user_message.lower() for keyword in ['时间', '几点', '日期', '今天', '现在']):
-            try:
-                result = await self.tool_manager.execute_tool("time", {})
+        tasks = [asyncio.create_task(run_item(index)) for index in range(len(items))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks + list(shared_tasks.values()):
+                task.cancel()
+    
+    async def _function_calling_stream(
+        self,
+        messages: List,
+        tools_used: List[Dict[str, Any]],
+        prefetched: Optional[Dict[str, asyncio.Task]] = None
+    ):
+        """模型原生工具调用：由模型决定需要哪些工具，逐块输出回答
+        
+        模型在同一轮请求多个工具时并发执行；成功的工具结果追加到tools_used。
+        传入prefetched时复用其中已预先开始的相同调用（由调用方负责取消）。
+        """
+        model = self.chat_model.bind_tools(self.tool_manager.get_tool_schemas())
+        conversation = list(messages)
+        for _ in range(settings.FUNCTION_CALLING_MAX_ROUNDS):
+            response = None
+            async for chunk in model.astream(conversation):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    yield chunk.content
+            if response is None or not response.tool_calls:
+                return
+            
+            conversation.append(response)
+            calls = [{"tool": call["name"], "parameters": call["args"]} for call in response.tool_calls]
+            results = await self._gather_tool_calls(calls, prefetched)
+            for tool_call, call, result in zip(response.tool_calls, calls, results):
                 if result.success:
                     tools_used.append({
-                        "tool": "time",
-                        "parameters": {},
+                        "tool": call["tool"],
+                        "parameters": call["parameters"],
                         "result": result.result
                     })
-            except Exception as e:
-                print(f"时间工具执行错误: {e}")
+                content = result.result if result.success else {"error": result.error}
+                conversation.append(ToolMessage(
+                    content=json.dumps(content, ensure_ascii=False, default=str),
+                    tool_call_id=tool_call["id"]
+                ))
         
-        # 检测翻译需求
-        if any(keyword in user_message.lower() for keyword in ['翻译', 'translate', '英文', '中文', '日文', '韩文', '法文', '德文', '西班牙文', '俄文']):
-            try:
-                import re
-                
-                # 检测目标语言
-                target_lang = "en"  # 默认翻译为英文
-                if any(lang in user_message.lower() for lang in ['中文', '汉语', 'chinese']):
-                    target_lang = "zh"
-                elif any(lang in user_message.lower() for lang in ['日文', '日语', 'japanese']):
-                    target_lang = "ja"
-                elif any(lang in user_message.lower() for lang in ['韩文', '韩语', 'korean']):
-                    target_lang = "ko"
-                elif any(lang in user_message.lower() for lang in ['法文', '法语', 'french']):
-                    target_lang = "fr"
-                elif any(lang in user_message.lower() for lang in ['德文', '德语', 'german']):
-                    target_lang = "de"
-                elif any(lang in user_message.lower() for lang in ['西班牙文', '西班牙语', 'spanish']):
-                    target_lang = "es"
-                elif any(lang in user_message.lower() for lang in ['俄文', '俄语', 'russian']):
-                    target_lang = "ru"
-                
-                # 提取要翻译的文本（在引号中的内容）
-                text_pattern = r'["""]([^"""]+)["""]'
-                matches = re.findall(text_pattern, user_message)
-                
-                if matches:
-                    text_to_translate = matches[0]
-                    result = await self.tool_manager.execute_tool("translate", {
-                        "text": text_to_translate,
-                        "target_lang": target_lang
+        # 达到最大轮数后不再提供工具，直接生成回答
+        async for content in self._stream_text(conversation):
+            yield content
+    
+    async def _execute_planned_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """执行已规划的工具调用（记录耗时）"""
+        if not tool_calls:
+            return []
+        with STAGE_SECONDS.labels("tool_execution").time():
+            return await self._execute_tool_calls(tool_calls)
+    
+    def _semantic_key(
+        self,
+        session: Session,
+        user_message: str,
+        tool_calls: List[Dict[str, Any]],
+        use_tools: bool,
+        function_calling: bool
+    ):
+        """计算语义缓存的查询键（不满足缓存条件时为None）"""
+        tool_keys = [self.tool_manager.call_key(call["tool"], call["parameters"]) for call in tool_calls]
+        return self.semantic_cache.key_for(session, user_message, tool_keys, use_tools, function_calling)
+    
+    def _plan_tool_calls(self, user_message: str) -> List[Dict[str, Any]]:
+        """根据用户消息规划需要执行的工具调用（只检测，不执行）"""
+        with STAGE_SECONDS.labels("intent_detection").time():
+            return self.intent_detector.plan(user_message)
+    
+    async def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """并发执行已规划的工具调用，只保留成功的结果（按规划顺序）"""
+        results = await self._gather_tool_calls(tool_calls)
+        return self._collect_tools_used(tool_calls, results)
+    
+    @staticmethod
+    def _collect_tools_used(tool_calls: List[Dict[str, Any]], results: List[ToolResult]) -> List[Dict[str, Any]]:
+        """按规划顺序整理成功的工具结果"""
+        return [
+            {"tool": call["tool"], "parameters": call["parameters"], "result": result.result}
+            for call, result in zip(tool_calls, results)
+            if result.success
+        ]
+    
+    async def _stream_tool_results(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        tools_used: List[Dict[str, Any]]
+    ):
+        """流水线模式：并发执行工具，每个工具完成即产出tool_result帧
+        
+        成功的结果按规划顺序追加到tools_used。
+        """
+        results: List[Optional[ToolResult]] = [None] * len(tool_calls)
+        if tool_calls:
+            with STAGE_SECONDS.labels("tool_execution").time():
+                async for index, result in self._iter_tool_calls(tool_calls):
+                    results[index] = result
+                    yield sse_event({
+                        'type': 'tool_result',
+                        'tool': tool_calls[index]["tool"],
+                        'parameters': tool_calls[index]["parameters"],
+                        'success': result.success,
+                        'result': result.result if result.success else None,
+                        'error': result.error
                     })
-                    if result.success:
-                        tools_used.append({
-                            "tool": "translate",
-                            "parameters": {
-                                "text": text_to_translate,
-                                "target_lang": target_lang
-                            },
-                            "result": result.result
-                        })
-            except Exception as e:
-                print(f"翻译工具执行错误: {e}")
+        tools_used.extend(self._collect_tools_used(tool_calls, results))
+    
+    async def _run_tool_call(self, call: Dict[str, Any]) -> ToolResult:
+        """执行单个工具调用（独立超时）"""
+        return await asyncio.wait_for(
+            self.tool_manager.execute_tool(call["tool"], call["parameters"]),
+            timeout=settings.TOOL_CALL_TIMEOUT
+        )
+    
+    async def _gather_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        shared_tasks: Optional[Dict[str, asyncio.Task]] = None,
+        started: Optional[Dict[str, asyncio.Event]] = None
+    ) -> List[ToolResult]:
+        """并发执行工具调用，返回与输入一一对应的结果"""
+        results: List[Optional[ToolResult]] = [None] * len(tool_calls)
+        async for index, result in self._iter_tool_calls(tool_calls, shared_tasks, started):
+            results[index] = result
+        return results
+    
+    async def _iter_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        shared_tasks: Optional[Dict[str, asyncio.Task]] = None,
+        started: Optional[Dict[str, asyncio.Event]] = None
+    ):
+        """并发执行工具调用，按完成顺序产出 (序号, 结果)
         
-        # 检测网络搜索需求
-        if any(keyword in user_message.lower() for keyword in ['搜索', '查找', '查询', 'search', '查找', '了解', '联网', '上网']):
-            try:
-                import re
-                
-                # 提取搜索关键词
-                # 移除常见的搜索指示词
-                search_query = user_message
-                search_indicators = ['搜索', '查找', '查询', 'search', '查找', '了解', '什么是', '什么是', '如何', '怎么']
-                
-                for indicator in search_indicators:
-                    search_query = search_query.replace(indicator, '').strip()
-                
-                # 如果搜索查询不为空，执行搜索
-                if search_query and len(search_query) > 2:
-                    result = await self.tool_manager.execute_tool("web_search", {"query": search_query})
-                    if result.success:
-                        tools_used.append({
-                            "tool": "web_search",
-                            "parameters": {"query": search_query},
-                            "result": result.result
-                        })
-            except Exception as e:
-                print(f"网络搜索工具执行错误: {e}")
+        每个工具有独立超时，整体受全局截止时间约束；超时或异常的工具产出失败结果。
+        传入shared_tasks时相同的调用复用同一个任务（由调用方负责取消）。
+        同时传入started（调用键 -> 开始事件）时新任务在工具并发上限内执行，
+        全局截止时间从其中第一个工具取得执行名额时计算，排队等待的时间不计入。
+        """
+        if not tool_calls:
+            return
         
-        return tools_used
+        if shared_tasks is None:
+            tasks = [asyncio.create_task(self._run_tool_call(call)) for call in tool_calls]
+            owned = set(tasks)
+        else:
+            tasks = []
+            keys = []
+            for call in tool_calls:
+                key = self.tool_manager.call_key(call["tool"], call["parameters"])
+                if key not in shared_tasks:
+                    if started is None:
+                        shared_tasks[key] = asyncio.create_task(self._run_tool_call(call))
+                    else:
+                        started[key] = asyncio.Event()
+                        shared_tasks[key] = asyncio.create_task(
+                            self.tool_manager.execute_limited(call["tool"], call["parameters"], started[key])
+                        )
+                tasks.append(shared_tasks[key])
+                keys.append(key)
+            owned = set()
+            if started is not None:
+                await self._wait_first_started([started[key] for key in keys if key in started])
+        indexes: Dict[asyncio.Task, List[int]] = {}
+        for index, task in enumerate(tasks):
+            indexes.setdefault(task, []).append(index)
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.TOOL_TOTAL_TIMEOUT
+        pending = set(indexes)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    for index in indexes[task]:
+                        yield index, self._tool_outcome(tool_calls[index], task)
+            for task in pending:
+                for index in indexes[task]:
+                    yield index, self._tool_failure(tool_calls[index], "工具执行超时（超过全局截止时间）", "timeout")
+        finally:
+            for task in owned:
+                task.cancel()
+    
+    @staticmethod
+    async def _wait_first_started(events: List[asyncio.Event]):
+        """等待其中任意一个工具开始执行（没有需要等待的事件时立即返回）"""
+        if not events or any(event.is_set() for event in events):
+            return
+        waiters = [asyncio.create_task(event.wait()) for event in events]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+    
+    def _tool_outcome(self, call: Dict[str, Any], task: asyncio.Task) -> ToolResult:
+        """读取已完成的工具任务结果，超时或异常时转为失败结果"""
+        try:
+            return task.result()
+        except asyncio.TimeoutError:
+            return self._tool_failure(call, "工具执行超时", "timeout")
+        except Exception as e:
+            return self._tool_failure(call, f"工具执行错误: {e}", "error")
+    
+    def _tool_failure(self, call: Dict[str, Any], error: str, reason: str) -> ToolResult:
+        """记录工具失败并返回失败结果"""
+        TOOL_ERRORS.labels(call["tool"], reason).inc()
+        logger.warning("工具调用失败", extra={"tool": call["tool"], "error": error})
+        return ToolResult(tool_name=call["tool"], result=None, success=False, error=error)
     
-    def clear_memory(self):
+    def clear_memory(self, session_id: Optional[str] = None):
         """清空记忆"""
-        self.memory.clear()
+        self.sessions.delete(session_id or settings.DEFAULT_SESSION_ID)
     
-    def get_conversation_history(self) -> List[Dict[str, str]]:
+    async def get_conversation_history(self, session_id: Optional[str] = None) -> List[Dict[str, str]]:
         """获取对话历史"""
-        return self._convert_memory_to_history() 
\ No newline at end of file
+        session = await self.sessions.load(session_id or settings.DEFAULT_SESSION_ID, create=False)
+        if session is None:
+            return []
+        return self._convert_memory_to_history(session) 
\ No newline at end of file
@@ -2,22 +2,43 @@
 FastAPI 应用主文件
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
+from contextlib import asynccontextmanager
 import json
+import uuid
+import logging
 
 # 导入配置和Agent
 from config import settings
 from agent import AIAgent
-from tools.base import ToolResult
+from tools.http_client import close_http_client
+from shared_state import close_shared_state
+from streaming import CancellableStreamingResponse, StreamLimiter
+from metrics import registry, STREAM_REJECTIONS
+from log import setup_logging, shutdown_logging, request_id_var
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # 数据模型
 class ChatMessage(BaseModel):
     message: str
     use_tools: Optional[bool] = True
+    session_id: Optional[str] = None
+    tool_mode: Optional[Literal["keyword", "function_calling"]] = None
+
+class ChatBatchItem(BaseModel):
+    message: str
+    use_tools: Optional[bool] = True
+    id: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    messages: List[ChatBatchItem]
+    concurrency: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
@@ -31,19 +52,34 @@ class ToolCall(BaseModel):
     tool_name: str
     parameters: Dict[str, Any]
 
+class ToolBatchRequest(BaseModel):
+    calls: List[ToolCall]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动对话持久化和工具后台任务，关闭时写完缓冲并释放共享资源"""
+    setup_logging()
+    await ai_agent.sessions.start()
+    await ai_agent.tool_manager.start()
+    yield
+    await ai_agent.tool_manager.close()
+    await ai_agent.sessions.close()
+    await close_http_client()
+    close_shared_state()
+    shutdown_logging()
+
 # 创建应用
 app = FastAPI(
     title=settings.APP_TITLE,
     description=settings.APP_DESCRIPTION,
     version=settings.APP_VERSION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # 设置JSON编码
 from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
-import json
 
 # 自定义JSON响应类
 class UTF8JSONResponse(JSONResponse):
@@ -67,9 +103,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局AI Agent实例
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """为每个请求分配请求ID（沿用客户端传入的X-Request-ID），写入日志上下文和响应头"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+def log_chat_request(chat_message: "ChatMessage", session_id: str, stream: bool):
+    """记录收到的聊天请求（默认只记录长度，不记录消息原文）"""
+    fields = {
+        "session_id": session_id,
+        "stream": stream,
+        "message_chars": len(chat_message.message),
+        "sampled": True
+    }
+    if settings.LOG_MESSAGE_CONTENT:
+        fields["user_message"] = chat_message.message
+    logger.info("收到聊天请求", extra=fields)
+
+# 全局AI Agent实例（对话记忆按会话隔离）
 ai_agent = AIAgent()
 
+# 流式响应并发上限（按worker进程计）
+stream_limiter = StreamLimiter()
+
+def resolve_session_id(*candidates: Optional[str]) -> str:
+    """按优先级选取会话ID（请求体 > 查询参数 > 请求头），均未提供时使用默认会话"""
+    for candidate in candidates:
+        if candidate:
+            return candidate
+    return settings.DEFAULT_SESSION_ID
+
 @app.get("/")
 async def root():
     return {
@@ -82,30 +152,44 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "chat-agent-api"}
 
+@app.get("/metrics")
+async def metrics():
+    """运行指标（Prometheus文本格式）"""
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="指标未启用（METRICS_ENABLED=false）")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/chat/", response_model=ChatResponse)
-async def chat(chat_message: ChatMessage):
+async def chat(chat_message: ChatMessage, x_session_id: Optional[str] = Header(None)):
     try:
-        # 添加日志查看接收到的消息
-        print(f"收到用户消息: {chat_message.message}")
-        print(f"消息类型: {type(chat_message.message)}")
-        
         use_tools = chat_message.use_tools if chat_message.use_tools is not None else True
-        result = await ai_agent.chat(chat_message.message, use_tools)
+        session_id = resolve_session_id(chat_message.session_id, x_session_id)
+        log_chat_request(chat_message, session_id, stream=False)
+        result = await ai_agent.chat(chat_message.message, use_tools, session_id, chat_message.tool_mode)
         return ChatResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat/stream")
-async def chat_stream(chat_message: ChatMessage):
-    """流式聊天端点"""
+async def chat_stream(chat_message: ChatMessage, x_session_id: Optional[str] = Header(None)):
+    """流式聊天端点
+    
+    同时进行的流式响应达到上限时（排队等待超时后）返回429；客户端断开或长时间不读取时取消生成。
+    """
+    if not await stream_limiter.acquire():
+        STREAM_REJECTIONS.inc()
+        raise HTTPException(
+            status_code=429,
+            detail="同时进行的流式响应过多，请稍后重试",
+            headers={"Retry-After": str(stream_limiter.retry_after())}
+        )
     try:
-        # 添加日志查看接收到的消息
-        print(f"[流式] 收到用户消息: {chat_message.message}")
-        print(f"[流式] 消息类型: {type(chat_message.message)}")
-        
         use_tools = chat_message.use_tools if chat_message.use_tools is not None else True
-        return StreamingResponse(
-            ai_agent.chat_stream(chat_message.message, use_tools),
+        session_id = resolve_session_id(chat_message.session_id, x_session_id)
+        log_chat_request(chat_message, session_id, stream=True)
+        return CancellableStreamingResponse(
+            ai_agent.chat_stream(chat_message.message, use_tools, session_id, chat_message.tool_mode),
+            on_close=stream_limiter.release,
             media_type="text/plain",
             headers={
                 "Cache-Control": "no-cache",
@@ -114,20 +198,50 @@ async def chat_stream(chat_message: ChatMessage):
             }
         )
     except Exception as e:
+        stream_limiter.release()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch")
+async def chat_batch(batch: ChatBatchRequest):
+    """批量聊天端点：每条消息独立处理，按完成顺序以NDJSON逐行返回"""
+    if len(batch.messages) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"批量消息数超过上限 {settings.BATCH_MAX_ITEMS}"
+        )
+    items = [
+        {
+            "message": item.message,
+            "use_tools": item.use_tools if item.use_tools is not None else True,
+            "id": item.id
+        }
+        for item in batch.messages
+    ]
+    
+    async def stream():
+        async for result in ai_agent.chat_batch(items, batch.concurrency):
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/chat/clear", response_model=ClearResponse)
-async def clear_conversation():
+async def clear_conversation(
+    session_id: Optional[str] = Query(None),
+    x_session_id: Optional[str] = Header(None)
+):
     try:
-        ai_agent.clear_memory()
+        ai_agent.clear_memory(resolve_session_id(session_id, x_session_id))
         return ClearResponse(message="对话历史已清空")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chat/history")
-async def get_conversation_history():
+async def get_conversation_history(
+    session_id: Optional[str] = Query(None),
+    x_session_id: Optional[str] = Header(None)
+):
     try:
-        history = ai_agent.get_conversation_history()
+        history = await ai_agent.get_conversation_history(resolve_session_id(session_id, x_session_id))
         return {"conversation_history": history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -141,6 +255,30 @@ async def get_available_tools():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/tools/schemas")
+async def get_tool_schemas():
+    """获取工具调用schema（OpenAI函数调用格式）"""
+    try:
+        return {"tools": ai_agent.tool_manager.get_tool_schemas()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tools/cache/stats")
+async def get_tool_cache_stats():
+    """获取工具结果缓存的命中/未命中统计"""
+    try:
+        return ai_agent.tool_manager.get_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/tools/upstreams")
+async def get_tool_upstreams():
+    """获取网络工具上游的熔断状态、当前超时和耗时分位数"""
+    try:
+        return ai_agent.tool_manager.get_upstream_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/tools/execute")
 async def execute_tool(tool_call: ToolCall):
     """执行工具"""
@@ -148,4 +286,20 @@ async def execute_tool(tool_call: ToolCall):
         result = await ai_agent.tool_manager.execute_tool(tool_call.tool_name, tool_call.parameters)
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/tools/execute_batch")
+async def execute_tool_batch(batch: ToolBatchRequest):
+    """批量执行工具：重复调用只执行一次，结果按输入顺序返回"""
+    if len(batch.calls) > settings.TOOL_BATCH_MAX_CALLS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"批量工具调用数超过上限 {settings.TOOL_BATCH_MAX_CALLS}"
+        )
+    try:
+        results = await ai_agent.tool_manager.execute_many(
+            [(call.tool_name, call.parameters) for call in batch.calls]
+        )
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+性能基准测试脚本（在backend目录下以 python -m benchmarks.<脚本名> 运行）
+"""
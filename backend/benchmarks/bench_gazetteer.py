@@ -0,0 +1,124 @@
+"""
+城市地名索引基准测试
+
+分别对随仓库发布的数据文件和合成的大规模数据文件（默认5万个城市、约15万个名称）测量：
+索引构建时间、索引文件大小、打开耗时、常驻内存增量，以及在一组消息中查找城市（最长匹配）和
+按名称精确查找的单次耗时。对照组是把全部名称加载成Python字典、按子串逐个查字典的实现。
+
+运行: python -m benchmarks.bench_gazetteer
+"""
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from config import settings
+from gazetteer import City, build_index, normalize_name, read_source, Gazetteer
+from benchmarks.bench_intent import CORPUS
+from benchmarks.load_test import process_rss_mb
+
+
+class DictGazetteer:
+    """对照组：名称全部加载成字典，从每个位置起按长度从长到短逐个查字典"""
+
+    def __init__(self, source_path: str):
+        self.names: Dict[str, City] = {}
+        for city_id, country, latitude, longitude, names in read_source(source_path):
+            city = City(city_id, names[0], country, latitude, longitude)
+            for name in names:
+                self.names.setdefault(normalize_name(name), city)
+        self.max_length = max(len(name) for name in self.names)
+
+    def lookup(self, name: str) -> Optional[City]:
+        return self.names.get(normalize_name(name))
+
+    def find(self, text: str) -> List[City]:
+        text = normalize_name(text)
+        cities = []
+        position = 0
+        while position < len(text):
+            for end in range(min(len(text), position + self.max_length), position + 1, -1):
+                city = self.names.get(text[position:end])
+                if city is not None:
+                    cities.append(city)
+                    position = end
+                    break
+            else:
+                position += 1
+        return cities
+
+
+def synthesize(path: str, cities: int, seed: int = 1):
+    """生成合成数据：每个城市一个2~4字的中文名、一个中文别名和一个英文名"""
+    rng = random.Random(seed)
+    alphabet = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+    syllables = ["an", "bei", "cheng", "dong", "feng", "gang", "hai", "jiang", "kou", "lin",
+                 "ming", "nan", "ping", "qing", "shan", "tai", "wan", "xi", "yang", "zhou"]
+    with open(path, "w", encoding="utf-8") as output:
+        for city_id in range(1, cities + 1):
+            name = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 4)))
+            alias = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 3)))
+            english = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+            latitude, longitude = rng.uniform(-60, 70), rng.uniform(-180, 180)
+            output.write(f"{city_id}\tZZ\t{latitude:.2f}\t{longitude:.2f}\t{name}|{alias}|{english}\n")
+
+
+def per_call_us(function, arguments: List[str], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for argument in arguments:
+            function(argument)
+    return (time.perf_counter() - started) / (repeat * len(arguments)) * 1e6
+
+
+def measure(label: str, source_path: str, index_path: str, args):
+    started = time.perf_counter()
+    name_count = build_index(source_path, index_path)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    gc.collect()
+    rss_before = process_rss_mb(os.getpid())
+    started = time.perf_counter()
+    gazetteer = Gazetteer(index_path)
+    open_ms = (time.perf_counter() - started) * 1000
+    names = [normalize_name(name) for *_, names in read_source(source_path) for name in names[:1]]
+    sample = random.Random(2).sample(names, min(len(names), 1000))
+    find_us = per_call_us(gazetteer.find, CORPUS, args.repeat)
+    lookup_us = per_call_us(gazetteer.lookup, sample, max(1, args.repeat // 10))
+    gc.collect()
+    mmap_rss = process_rss_mb(os.getpid()) - rss_before
+
+    rss_before = process_rss_mb(os.getpid())
+    started = time.perf_counter()
+    baseline = DictGazetteer(source_path)
+    load_ms = (time.perf_counter() - started) * 1000
+    baseline_find_us = per_call_us(baseline.find, CORPUS, args.repeat)
+    baseline_lookup_us = per_call_us(baseline.lookup, sample, max(1, args.repeat // 10))
+    gc.collect()
+    dict_rss = process_rss_mb(os.getpid()) - rss_before
+
+    print(f"\n[{label}] {gazetteer.city_count} 个城市，{name_count} 个名称，"
+          f"索引 {os.path.getsize(index_path) / 1024:.0f} KB，构建 {build_ms:.0f} ms")
+    print(f"{'实现':<22}{'加载(ms)':>10}{'内存增量(MB)':>14}{'消息查找(us)':>14}{'精确查找(us)':>14}")
+    print(f"{'内存映射索引':<16}{open_ms:>10.1f}{mmap_rss:>14.1f}{find_us:>14.1f}{lookup_us:>14.2f}")
+    print(f"{'Python字典':<18}{load_ms:>10.1f}{dict_rss:>14.1f}{baseline_find_us:>14.1f}{baseline_lookup_us:>14.2f}")
+    gazetteer.close()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"消息查找：{len(CORPUS)} 条消息各 {args.repeat} 次；精确查找：随机抽取的城市名")
+        measure("随仓库发布的数据", settings.GAZETTEER_DATA_FILE, os.path.join(directory, "bundled.idx"), args)
+        synthetic_path = os.path.join(directory, "synthetic.tsv")
+        synthesize(synthetic_path, args.synthetic_cities)
+        measure("合成数据", synthetic_path, os.path.join(directory, "synthetic.idx"), args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="城市地名索引基准测试")
+    parser.add_argument("--synthetic-cities", type=int, default=50000, help="合成数据的城市数")
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
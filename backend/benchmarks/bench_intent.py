@@ -0,0 +1,104 @@
+"""
+意图检测基准测试
+
+在一组贴近真实的消息上比较旧的逐关键词扫描实现与编译后的单次扫描检测器的单条消息耗时。
+
+运行: python -m benchmarks.bench_intent
+"""
+import argparse
+import re
+import time
+from intent import IntentDetector
+from tools.manager import ToolManager
+
+
+CORPUS = [
+    "你好，今天心情不错",
+    "帮我计算 25 * 4 + 10",
+    "(15 + 23) * 2 等于多少？",
+    "北京今天天气怎么样？",
+    "上海明天气温多少度",
+    "现在几点了？",
+    "今天是几号，星期几",
+    '把"你好世界"翻译成英文',
+    '请把"good morning"翻译成中文',
+    '"谢谢"用日语怎么说',
+    "搜索Python编程教程",
+    "了解一下人工智能技术的发展历史",
+    "什么是量子计算？帮我查找相关资料",
+    "广州和深圳哪个城市更适合年轻人工作",
+    "给我讲个笑话吧",
+    "我想去成都旅游，那边温度怎么样，顺便搜索一下美食推荐",
+    "Can you search the latest news about large language models?",
+    "写一首关于春天的诗",
+    "3.14 * 2 / 7 - 1 算一下",
+    "杭州西湖附近有什么好玩的地方，帮我联网查一下",
+]
+
+
+def legacy_plan(user_message):
+    """旧实现：每个工具一组 any(keyword in ...) 扫描，每次调用重新 import re 并匹配正则"""
+    calls = []
+    if any(keyword in user_message.lower() for keyword in ['计算', '算', '等于', '+', '-', '*', '/']):
+        import re
+        matches = re.findall(r'(\d+[\+\-\*\/\s\(\)\d\.]+)', user_message)
+        if matches:
+            calls.append(("calculator", matches[0].strip()))
+    if any(keyword in user_message.lower() for keyword in ['天气', '气温', '温度']):
+        import re
+        city_pattern = r'([北京|上海|广州|深圳|杭州|南京|成都|武汉|西安|重庆|天津|青岛|大连|厦门|苏州|无锡|宁波|长沙|郑州|济南|哈尔滨|沈阳|长春|石家庄|太原|呼和浩特|合肥|福州|南昌|南宁|海口|贵阳|昆明|拉萨|兰州|西宁|银川|乌鲁木齐]+)'
+        matches = re.findall(city_pattern, user_message)
+        if matches:
+            calls.append(("weather", matches[0]))
+    if any(keyword in user_message.lower() for keyword in ['时间', '几点', '日期', '今天', '现在']):
+        calls.append(("time", None))
+    if any(keyword in user_message.lower() for keyword in ['翻译', 'translate', '英文', '中文', '日文', '韩文', '法文', '德文', '西班牙文', '俄文']):
+        import re
+        target_lang = "en"
+        for code, names in [("zh", ['中文', '汉语', 'chinese']), ("ja", ['日文', '日语', 'japanese']),
+                            ("ko", ['韩文', '韩语', 'korean']), ("fr", ['法文', '法语', 'french']),
+                            ("de", ['德文', '德语', 'german']), ("es", ['西班牙文', '西班牙语', 'spanish']),
+                            ("ru", ['俄文', '俄语', 'russian'])]:
+            if any(lang in user_message.lower() for lang in names):
+                target_lang = code
+                break
+        matches = re.findall(r'["""]([^"""]+)["""]', user_message)
+        if matches:
+            calls.append(("translate", (matches[0], target_lang)))
+    if any(keyword in user_message.lower() for keyword in ['搜索', '查找', '查询', 'search', '查找', '了解', '联网', '上网']):
+        search_query = user_message
+        for indicator in ['搜索', '查找', '查询', 'search', '查找', '了解', '什么是', '什么是', '如何', '怎么']:
+            search_query = search_query.replace(indicator, '').strip()
+        if search_query and len(search_query) > 2:
+            calls.append(("web_search", search_query))
+    return calls
+
+
+def bench(func, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in corpus:
+            func(message)
+    return (time.perf_counter() - start) / (rounds * len(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="意图检测基准测试")
+    parser.add_argument("--rounds", type=int, default=2000, help="语料重复轮数")
+    args = parser.parse_args()
+
+    detector = IntentDetector(ToolManager())
+    legacy = bench(legacy_plan, CORPUS, args.rounds)
+    compiled = bench(detector.plan, CORPUS, args.rounds)
+    # 不含参数提取的纯检测耗时
+    detect_only = bench(detector.detect, CORPUS, args.rounds)
+
+    print(f"语料: {len(CORPUS)} 条消息 x {args.rounds} 轮")
+    print(f"{'实现':<16} {'us/消息':>10}")
+    print(f"{'旧实现':<16} {legacy * 1e6:>10.2f}")
+    print(f"{'编译检测+参数':<16} {compiled * 1e6:>10.2f}")
+    print(f"{'编译检测(仅扫描)':<16} {detect_only * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
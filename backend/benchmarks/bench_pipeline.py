@@ -0,0 +1,104 @@
+"""
+流式流水线基准测试
+
+用本地 OpenWeatherMap 桩服务和模拟模型比较串行模式与流水线模式（STREAM_PIPELINE_ENABLED）
+下 /chat/stream 的首字节时间、首个内容块时间和总耗时。长会话场景需要先生成对话摘要，
+流水线模式下提示词前缀（含摘要）与工具执行并行；提示词包含工具结果，模型请求在工具全部完成后发起。
+
+运行: python -m benchmarks.bench_pipeline
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from config import settings
+from agent import AIAgent
+from tools.http_client import AsyncHTTPClient, set_http_client
+from benchmarks.stub_upstreams import OpenWeatherMapStub
+
+
+class Chunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeModel:
+    """模拟模型：流式输出前等待ttft秒；非流式调用（生成摘要）等待summary_latency秒"""
+
+    def __init__(self, ttft: float, summary_latency: float, tokens: int = 20):
+        self.ttft = ttft
+        self.summary_latency = summary_latency
+        self.tokens = tokens
+
+    async def ainvoke(self, messages, **kwargs):
+        await asyncio.sleep(self.summary_latency)
+        return Chunk("用户之前聊了很多话题。")
+
+    async def astream(self, messages, **kwargs):
+        await asyncio.sleep(self.ttft)
+        for _ in range(self.tokens):
+            await asyncio.sleep(0.005)
+            yield Chunk("晴朗")
+
+
+async def measure(agent: AIAgent, message: str, session_id: str):
+    """返回(首字节时间, 首个内容块时间, 总耗时)"""
+    started = time.perf_counter()
+    first_byte = first_content = None
+    async for frame in agent.chat_stream(message, session_id=session_id):
+        now = time.perf_counter() - started
+        if first_byte is None:
+            first_byte = now
+        if first_content is None and json.loads(frame[6:])["type"] == "content":
+            first_content = now
+    return first_byte, first_content, time.perf_counter() - started
+
+
+def fill_history(agent: AIAgent, session_id: str, turns: int):
+    """预先写入足以触发摘要的历史对话"""
+    session = agent.sessions.get(session_id)
+    for index in range(turns):
+        session.add_user_message(f"第{index}个问题：" + "请详细介绍一下这个话题的背景" * 10)
+        session.add_ai_message(f"第{index}个回答：" + "这个话题的背景比较复杂，需要分几个方面说明" * 10)
+
+
+async def main(args):
+    settings.CONVERSATION_STORE = "memory"
+    settings.OPENWEATHER_API_KEY = "bench"
+    settings.OPENWEATHER_API_URL = "http://stub/data/2.5/weather"
+    stub = OpenWeatherMapStub(latency=args.tool_latency)
+    set_http_client(AsyncHTTPClient(transport=httpx.ASGITransport(app=stub.app)))
+
+    agent = AIAgent()
+    agent.tool_manager.cache = None
+    agent._chat_model = FakeModel(args.ttft, args.summary_latency)
+    message = "北京今天天气怎么样？"
+
+    print(f"工具延迟 {args.tool_latency * 1000:.0f} ms，模型首token {args.ttft * 1000:.0f} ms，"
+          f"摘要 {args.summary_latency * 1000:.0f} ms，每组 {args.runs} 次取中位数")
+    print(f"{'场景':<10}{'模式':<8}{'首字节(ms)':>12}{'首内容块(ms)':>14}{'总耗时(ms)':>12}")
+    for scenario in ("首轮", "长会话"):
+        for mode, pipelined in (("串行", False), ("流水线", True)):
+            settings.STREAM_PIPELINE_ENABLED = pipelined
+            samples = []
+            for run in range(args.runs):
+                session_id = f"{scenario}-{mode}-{run}"
+                if scenario == "长会话":
+                    fill_history(agent, session_id, args.history_turns)
+                samples.append(await measure(agent, message, session_id))
+            first_byte, first_content, total = (statistics.median(column) * 1000 for column in zip(*samples))
+            print(f"{scenario:<10}{mode:<8}{first_byte:>12.1f}{first_content:>14.1f}{total:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式流水线基准测试")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="天气接口延迟（秒）")
+    parser.add_argument("--ttft", type=float, default=0.2, help="模型首token延迟（秒）")
+    parser.add_argument("--summary-latency", type=float, default=0.3, help="生成摘要的模型调用延迟（秒）")
+    parser.add_argument("--history-turns", type=int, default=20, help="长会话场景的历史轮数")
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,80 @@
+"""
+提示词构建基准测试
+
+比较旧的逐轮全量字符串拼接与PromptBuilder的增量构建在历史增长时的单轮耗时。
+
+运行: python -m benchmarks.bench_prompt_builder
+"""
+import argparse
+import asyncio
+import time
+from langchain.schema import HumanMessage, AIMessage
+from context import ContextBuilder
+from prompt import PromptBuilder, SYSTEM_PROMPT
+from session import Session
+from tools.manager import ToolManager
+
+
+USER_TEXT = "帮我看看明天北京的天气，顺便把'今天过得怎么样'翻译成英文"
+AI_TEXT = "明天北京晴，气温18到26度，适合出行。翻译结果：How was your day today?"
+
+
+def legacy_build(history, tool_manager, user_message):
+    """旧实现：每轮遍历全部历史并逐段拼接"""
+    context = ""
+    for msg in history:
+        if isinstance(msg, HumanMessage):
+            context += f"用户: {msg.content}\n"
+        elif isinstance(msg, AIMessage):
+            context += f"助手: {msg.content}\n"
+    tools_info = "可用工具:\n"
+    for tool in tool_manager.get_available_tools():
+        tools_info += f"- {tool['name']}: {tool['description']}\n"
+    context += f"\n{tools_info}\n"
+    context += f"用户: {user_message}\n助手:"
+    return [("system", SYSTEM_PROMPT), ("human", context)]
+
+
+def make_session(size: int) -> Session:
+    session = Session("bench", max_messages=size + 10)
+    for _ in range(size // 2):
+        session.add_user_message(USER_TEXT)
+        session.add_ai_message(AI_TEXT)
+    return session
+
+
+async def bench_size(size: int, turns: int, tool_manager: ToolManager):
+    """在size条历史消息的会话上连续构建turns轮，返回(旧实现, 新实现)的单轮平均耗时"""
+    session = make_session(size)
+    start = time.perf_counter()
+    for _ in range(turns):
+        legacy_build(session.messages, tool_manager, USER_TEXT)
+    legacy = (time.perf_counter() - start) / turns
+
+    session = make_session(size)
+    builder = PromptBuilder(tool_manager, ContextBuilder())
+    await builder.build(session, USER_TEXT, [])  # 预热：首次渲染历史
+    start = time.perf_counter()
+    for _ in range(turns):
+        await builder.build(session, USER_TEXT, [])
+        session.add_user_message(USER_TEXT)
+        session.add_ai_message(AI_TEXT)
+    incremental = (time.perf_counter() - start) / turns
+    return legacy, incremental
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="提示词构建基准测试")
+    parser.add_argument("--sizes", default="10,100,1000,5000,20000", help="历史消息数，逗号分隔")
+    parser.add_argument("--turns", type=int, default=200, help="每个规模连续构建的轮数")
+    args = parser.parse_args()
+
+    tool_manager = ToolManager()
+    print(f"{'历史消息数':>10} {'旧实现(us/轮)':>14} {'增量构建(us/轮)':>16}")
+    for size in [int(value) for value in args.sizes.split(",")]:
+        legacy, incremental = await bench_size(size, args.turns, tool_manager)
+        print(f"{size:>10} {legacy * 1e6:>14.1f} {incremental * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""
+上游容错基准测试
+
+对包了故障注入的本地 OpenWeatherMap 桩服务调用天气工具，比较不同容错配置：
+
+1. 长尾延迟：少量请求额外变慢，比较无容错、自适应超时、自适应超时 + 对冲请求的延迟分位数
+2. 上游挂起：请求全部卡住，比较无容错与熔断 + 过期缓存的延迟、成功率和上游请求数
+
+运行: python -m benchmarks.bench_resilience
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from config import settings
+from tools.cache import TTLCache, ToolResultCache
+from tools.http_client import AsyncHTTPClient, set_http_client
+from tools.manager import ToolManager
+from tools.resilience import UpstreamGuard
+from benchmarks.stub_upstreams import FaultInjection, OpenWeatherMapStub
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+async def drive(manager: ToolManager, cities: List[str], concurrency: int) -> Dict[str, float]:
+    """以固定并发查询天气，返回延迟分位数（毫秒）和成功/过期结果数"""
+    latencies = []
+    succeeded = stale = 0
+    queue = iter(cities)
+
+    async def worker():
+        nonlocal succeeded, stale
+        for city in queue:
+            started = time.perf_counter()
+            result = await manager.execute_tool("weather", {"city": city})
+            latencies.append((time.perf_counter() - started) * 1000)
+            if result.success:
+                succeeded += 1
+                stale += bool(result.result.get("stale"))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return {
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "ok": succeeded / len(cities) * 100,
+        "stale": stale,
+    }
+
+
+def make_manager(resilient: bool, hedging: bool = False, cache: ToolResultCache = None) -> ToolManager:
+    guards = {"weather": UpstreamGuard("weather", hedging=hedging)} if resilient else {}
+    return ToolManager(cache=cache, guards=guards)
+
+
+async def tail_latency(faults: FaultInjection, args):
+    print(f"\n[长尾延迟] 基础延迟 {args.latency * 1000:.0f} ms，{args.slow_rate:.0%} 的请求额外慢 "
+          f"{args.slow_latency:.1f} s，{args.requests} 个请求，并发 {args.concurrency}")
+    print(f"{'配置':<22}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'成功率':>8}{'上游请求':>10}")
+    for label, resilient, hedging in (
+        ("无容错", False, False),
+        ("自适应超时", True, False),
+        ("自适应超时+对冲", True, True),
+    ):
+        faults.slow_rate = 0.0
+        manager = make_manager(resilient, hedging)
+        # 预热：积累耗时样本
+        await drive(manager, [f"预热{index}" for index in range(50)], args.concurrency)
+        faults.slow_rate = args.slow_rate
+        faults.slow_latency = args.slow_latency
+        faults.requests = 0
+        report = await drive(manager, [f"城市{index}" for index in range(args.requests)], args.concurrency)
+        print(f"{label:<22}{report['p50']:>10.1f}{report['p99']:>10.1f}{report['max']:>10.1f}"
+              f"{report['ok']:>7.0f}%{faults.requests:>10}")
+
+
+async def outage(faults: FaultInjection, args):
+    cities = [f"城市{index % 20}" for index in range(args.outage_requests)]
+    print(f"\n[上游挂起] 每个请求卡住 {args.hang:.0f} s（相当于等到HTTP超时），"
+          f"{len(cities)} 个请求查询20个城市（缓存均已过期），并发 {args.concurrency}")
+    print(f"{'配置':<22}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'成功率':>8}{'过期结果':>10}{'上游请求':>10}")
+    for label, resilient in (("无容错", False), ("熔断+过期缓存", True)):
+        faults.slow_rate = 0.0
+        cache = ToolResultCache(backend=TTLCache(1000), ttls={"weather": 0.5}, stale_ttl=3600)
+        manager = make_manager(resilient, cache=cache)
+        await drive(manager, [f"城市{index}" for index in range(20)] * 3, args.concurrency)
+        await asyncio.sleep(0.6)
+        faults.slow_rate = 1.0
+        faults.slow_latency = args.hang
+        faults.requests = 0
+        report = await drive(manager, cities, args.concurrency)
+        print(f"{label:<22}{report['p50']:>10.1f}{report['p99']:>10.1f}{report['max']:>10.1f}"
+              f"{report['ok']:>7.0f}%{report['stale']:>10}{faults.requests:>10}")
+
+
+async def main(args):
+    settings.OPENWEATHER_API_KEY = "bench"
+    settings.OPENWEATHER_API_URL = "http://stub/data/2.5/weather"
+    faults = FaultInjection(OpenWeatherMapStub(latency=args.latency).app, seed=1)
+    set_http_client(AsyncHTTPClient(transport=httpx.ASGITransport(app=faults)))
+    await tail_latency(faults, args)
+    await outage(faults, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="上游容错基准测试")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--outage-requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="天气接口基础延迟（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="长尾场景中变慢请求的比例")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="变慢请求的额外延迟（秒）")
+    parser.add_argument("--hang", type=float, default=settings.HTTP_TIMEOUT, help="挂起场景中每个请求卡住的时间（秒）")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+语义缓存阈值评估
+
+用一组人工标注的问题对（same=True 表示可以复用同一个回答）计算相似度，
+按不同阈值统计命中率（应命中的问题对中命中的比例）和误命中数（不应命中却命中），
+分别给出只比较相似度、以及数字和否定词也必须一致（当前实现）两种判定的结果。
+误命中意味着用别的问题的回答答复用户，阈值应取误命中为0时命中率最高的值。
+
+运行: python -m benchmarks.bench_semantic_cache
+"""
+import argparse
+from typing import List, Tuple
+
+from config import settings
+from semantic_cache import HashingVectorizer, guard_terms
+
+# (问题A, 问题B, 是否可以复用同一个回答)
+LABELLED_PAIRS: List[Tuple[str, str, bool]] = [
+    # 改写、语序、标点和大小写变化
+    ("什么是机器学习", "机器学习是什么？", True),
+    ("什么是深度学习", "深度学习是什么", True),
+    ("Python怎么读取文件", "Python如何读取文件", True),
+    ("如何学习英语", "怎么学习英语", True),
+    ("介绍一下量子计算", "请介绍一下量子计算", True),
+    ("什么是区块链？", "区块链是什么", True),
+    ("What is machine learning?", "what is machine learning", True),
+    ("How do I learn Python", "How can I learn Python?", True),
+    ("推荐几本科幻小说", "推荐几本科幻小说吧", True),
+    ("光合作用的原理是什么", "光合作用是什么原理", True),
+    ("怎么提高睡眠质量", "如何提高睡眠质量？", True),
+    ("什么是云计算", "云计算是什么意思", True),
+    ("怎样减肥最有效", "怎么减肥最有效", True),
+    # 正反问句与一般问句意思相同，但否定词个数不同，不会命中（宁可少命中）
+    ("25岁学编程晚吗", "25岁学编程晚不晚", True),
+    # 数字不同
+    ("25岁的人适合学编程吗", "35岁的人适合学编程吗", False),
+    ("月薪8000怎么理财", "月薪20000怎么理财", False),
+    ("3天的北京旅游攻略", "5天的北京旅游攻略", False),
+    ("三十岁怎么规划职业", "四十岁怎么规划职业", False),
+    ("Python 2和Python 3的区别", "Python 3和Python 4的区别", False),
+    ("top 10 programming languages", "top 5 programming languages", False),
+    # 否定
+    ("跑步对膝盖好吗", "跑步对膝盖不好吗", False),
+    ("为什么猫喜欢吃鱼", "为什么猫不喜欢吃鱼", False),
+    ("我想学Python，推荐教程", "我不想学Python，推荐教程", False),
+    ("孕妇可以喝咖啡吗", "孕妇不可以喝咖啡吗", False),
+    ("Why do people like coffee", "Why don't people like coffee", False),
+    ("Is Python a compiled language", "Is Python not a compiled language", False),
+    # 话题不同
+    ("如何学习英语", "如何学习日语", False),
+    ("什么是机器学习", "什么是机器翻译", False),
+    ("Python怎么读取文件", "Python怎么写入文件", False),
+    ("推荐几本科幻小说", "推荐几本推理小说", False),
+    ("北京有哪些好吃的", "上海有哪些好吃的", False),
+    ("猫为什么怕水", "狗为什么怕水", False),
+    ("怎么学习吉他", "怎么学习钢琴", False),
+    ("如何学习Java", "如何学习Python", False),
+    ("什么是云计算", "什么是边缘计算", False),
+    ("How do I learn Python", "How do I learn Rust", False),
+]
+
+
+def evaluate(pairs, scores, threshold: float, guarded: bool) -> Tuple[float, int]:
+    """返回 (应命中问题对的命中率, 误命中数)"""
+    hits = false_hits = positives = 0
+    for (first, second, same), score in zip(pairs, scores):
+        hit = score >= threshold and (not guarded or guard_terms(first) == guard_terms(second))
+        positives += same
+        hits += hit and same
+        false_hits += hit and not same
+    return hits / positives, false_hits
+
+
+def main(args):
+    vectorizer = HashingVectorizer(settings.SEMANTIC_CACHE_DIM)
+    scores = [float(vectorizer.encode(first) @ vectorizer.encode(second)) for first, second, _ in LABELLED_PAIRS]
+    if args.verbose:
+        for (first, second, same), score in sorted(zip(LABELLED_PAIRS, scores), key=lambda item: -item[1]):
+            guard = "一致" if guard_terms(first) == guard_terms(second) else "不同"
+            print(f"{score:6.3f}  {'应命中' if same else '不应命中':<6}  数字/否定{guard}  {first} | {second}")
+        print()
+
+    positives = sum(same for *_, same in LABELLED_PAIRS)
+    print(f"{len(LABELLED_PAIRS)} 个标注问题对（{positives} 对应命中），当前阈值 {settings.SEMANTIC_CACHE_THRESHOLD}")
+    print(f"{'阈值':>6}{'只比较相似度':>18}{'数字和否定词一致':>22}")
+    print(f"{'':>6}{'命中率':>10}{'误命中':>8}{'命中率':>12}{'误命中':>8}")
+    for step in range(60, 96, 5):
+        threshold = step / 100
+        recall, false_hits = evaluate(LABELLED_PAIRS, scores, threshold, guarded=False)
+        guarded_recall, guarded_false_hits = evaluate(LABELLED_PAIRS, scores, threshold, guarded=True)
+        print(f"{threshold:>6.2f}{recall:>10.0%}{false_hits:>8}{guarded_recall:>12.0%}{guarded_false_hits:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="语义缓存阈值评估")
+    parser.add_argument("--verbose", action="store_true", help="逐对输出相似度")
+    main(parser.parse_args())
@@ -0,0 +1,73 @@
+"""
+流式输出基准测试
+
+用模拟的模型输出比较旧的逐字符SSE帧 + sleep(0.01) 与新的按块转发/合并模式的
+最后一个字节到达时间和发送字节数。
+
+运行: python -m benchmarks.bench_stream
+"""
+import argparse
+import asyncio
+import json
+import time
+from streaming import coalesce_chunks, sse_event
+
+
+async def fake_model(chars: int, chunk_size: int, chunk_delay: float):
+    """模拟模型输出：每隔chunk_delay秒输出chunk_size个字符"""
+    text = ("流式输出基准测试文本，" * (chars // 10 + 1))[:chars]
+    for index in range(0, chars, chunk_size):
+        await asyncio.sleep(chunk_delay)
+        yield text[index:index + chunk_size]
+
+
+async def legacy_stream(source):
+    """旧实现：每个字符一帧，并且每个字符sleep 0.01秒"""
+    async for content in source:
+        for char in content:
+            yield f"data: {json.dumps({'content': char, 'type': 'content'})}\n\n"
+            await asyncio.sleep(0.01)
+    yield f"data: {json.dumps({'type': 'done'})}\n\n"
+
+
+async def new_stream(source, max_chars: int, max_delay: float):
+    """新实现：模型块到达即转发，可选按大小/时间窗口合并"""
+    async for content in coalesce_chunks(source, max_chars, max_delay):
+        yield sse_event({'content': content, 'type': 'content'})
+    yield sse_event({'type': 'done'})
+
+
+async def measure(stream):
+    """返回(最后一个字节到达时间, 发送字节数, 帧数)"""
+    start = time.perf_counter()
+    total_bytes = 0
+    frames = 0
+    async for frame in stream:
+        total_bytes += len(frame.encode("utf-8"))
+        frames += 1
+    return time.perf_counter() - start, total_bytes, frames
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="流式输出基准测试")
+    parser.add_argument("--chars", type=int, default=1000, help="模型输出字符数")
+    parser.add_argument("--chunk-size", type=int, default=4, help="每个模型块的字符数")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="模型块间隔（秒）")
+    args = parser.parse_args()
+
+    def source():
+        return fake_model(args.chars, args.chunk_size, args.chunk_delay)
+
+    modes = [
+        ("旧实现(逐字符+sleep)", legacy_stream(source())),
+        ("按块转发", new_stream(source(), 0, 0)),
+        ("合并(64字符/50ms)", new_stream(source(), 64, 0.05)),
+    ]
+    print(f"{'模式':<22} {'最后字节(s)':>12} {'字节数':>10} {'帧数':>8}")
+    for name, stream in modes:
+        elapsed, total_bytes, frames = await measure(stream)
+        print(f"{name:<22} {elapsed:>12.3f} {total_bytes:>10} {frames:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+"""
+流式响应取消与背压基准测试
+
+在本进程内启动 uvicorn，用假模型（固定间隔逐块输出）比较原来的 StreamingResponse 端点与
+现在的 /chat/stream（断开即取消、发送超时、并发上限）：
+
+1. 客户端读到几帧后断开：断开之后模型还被读取了多少块、多久后模型请求被取消。
+   分别在 uvicorn 默认的ASGI 2.3 和模拟的 2.4 规范下测量（2.4 下服务器只在发送失败时报告断开）
+2. 客户端读到几帧后不再读取（连接保持）：断开前模型被读取的块数（缓冲在进程和套接字中），
+   以及模型请求是否在客户端断开之前就被取消（原来的端点合并输出块时缓冲不设上限）
+3. 并发上限：同时发起超过上限的流式请求，统计429数量、429的响应时间和完成的请求数
+
+最后输出取消次数、拒绝次数和取消时已生成 / 估计节省的token数指标。
+
+运行: python -m benchmarks.bench_stream_cancel
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+from typing import Dict, List
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessageChunk
+
+from config import settings
+from streaming import StreamLimiter
+from metrics import registry
+from benchmarks.load_test import free_port, percentile
+
+
+class CountingModel:
+    """逐块输出的假模型，记录被读取的块数和结束方式"""
+
+    def __init__(self):
+        self.chunk_delay = 0.02
+        self.chunks = 200
+        self.chunk_chars = 10
+        self.reset()
+
+    def reset(self):
+        self.pulled = 0
+        self.outcome = "running"
+        self.ended_at = None
+
+    async def astream(self, messages, **kwargs):
+        try:
+            for index in range(self.chunks):
+                await asyncio.sleep(self.chunk_delay)
+                self.pulled += 1
+                yield AIMessageChunk(content="字" * self.chunk_chars)
+            self.outcome = "finished"
+        except (asyncio.CancelledError, GeneratorExit):
+            self.outcome = "cancelled"
+            raise
+        finally:
+            self.ended_at = time.perf_counter()
+
+
+def with_spec_version(app, version: str):
+    """改写scope中的ASGI规范版本（模拟只在发送失败时报告断开的服务器）"""
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http":
+            scope = dict(scope, asgi=dict(scope.get("asgi", {}), spec_version=version))
+        await app(scope, receive, send)
+    return wrapped
+
+
+def make_legacy_app(appmod) -> FastAPI:
+    """原来的端点：直接把生成器交给 StreamingResponse"""
+    legacy = FastAPI()
+    legacy.middleware("http")(appmod.assign_request_id)
+
+    @legacy.post("/chat/stream")
+    async def chat_stream(chat_message: appmod.ChatMessage):
+        return StreamingResponse(
+            appmod.ai_agent.chat_stream(chat_message.message, False, chat_message.session_id),
+            media_type="text/event-stream"
+        )
+
+    return legacy
+
+
+async def serve(app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task, f"http://127.0.0.1:{port}/chat/stream"
+
+
+async def read_frames(client: httpx.AsyncClient, url: str, frames: int, session: str):
+    """读取若干帧后断开"""
+    async with client.stream("POST", url, json={"message": "你好", "use_tools": False, "session_id": session}) as response:
+        received = 0
+        async for line in response.aiter_lines():
+            if line.startswith("data: "):
+                received += 1
+                if received >= frames:
+                    break
+
+
+async def read_then_stall(url: str, frames: int, session: str, stall: float, receive_buffer: int):
+    """读取若干帧后停止读取并保持连接 stall 秒
+
+    用固定大小接收缓冲区的原始套接字（关闭内核自动调整），避免本机回环连接的大缓冲掩盖服务端的缓冲。
+    """
+    parsed = httpx.URL(url)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (parsed.host, parsed.port))
+    reader, writer = await asyncio.open_connection(sock=sock, limit=receive_buffer)
+    body = json.dumps({"message": "你好", "use_tools": False, "session_id": session}).encode()
+    writer.write(
+        f"POST {parsed.path} HTTP/1.1\r\nHost: {parsed.host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    received = 0
+    while received < frames:
+        received += (await reader.read(receive_buffer)).count(b"data: ")
+    await asyncio.sleep(stall)
+    writer.close()
+
+
+async def disconnect(model: CountingModel, apps: Dict[str, object], args):
+    print(f"\n[客户端断开] 模型每 {model.chunk_delay * 1000:.0f} ms 输出一块，共 {model.chunks} 块；"
+          f"客户端读到 {args.frames} 帧后断开，观察 {args.observe:.0f} s")
+    print(f"{'端点':<20}{'ASGI':>6}{'断开后读取块数':>16}{'模型请求':>12}{'取消耗时(ms)':>14}")
+    async with httpx.AsyncClient(timeout=None) as client:
+        for label, app in apps.items():
+            for version in ("2.3", "2.4"):
+                server, task, url = await serve(with_spec_version(app, version))
+                model.reset()
+                await read_frames(client, url, args.frames, f"disconnect-{label}-{version}")
+                closed_at, pulled = time.perf_counter(), model.pulled
+                await asyncio.sleep(args.observe)
+                cancel_ms = (model.ended_at - closed_at) * 1000 if model.outcome == "cancelled" else float("nan")
+                print(f"{label:<20}{version:>6}{model.pulled - pulled:>16}{model.outcome:>12}{cancel_ms:>14.1f}")
+                server.should_exit = True
+                await task
+
+
+async def stalled(model: CountingModel, apps: Dict[str, object], args):
+    model.chunk_delay, model.chunks, model.chunk_chars = 0.001, 20000, 1000
+    print(f"\n[客户端停止读取] 模型每 {model.chunk_delay * 1000:.0f} ms 输出 {model.chunk_chars} 字，"
+          f"客户端读到 {args.frames} 帧后不再读取并保持连接 {args.stall:.0f} s；"
+          f"发送超时 {args.send_timeout:g} s，合并窗口 {settings.STREAM_COALESCE_MS} ms")
+    print(f"{'端点':<20}{'读取块数':>10}{'读取字节(MB)':>14}{'断开前模型请求':>16}")
+    async with httpx.AsyncClient(timeout=None) as client:
+        for label, app in apps.items():
+            # 原来的端点合并输出块时缓冲不设上限
+            settings.STREAM_SEND_BUFFER = 0 if app is apps["StreamingResponse"] else args.send_buffer
+            server, task, url = await serve(app)
+            model.reset()
+            await read_then_stall(url, args.frames, f"stalled-{label}", args.stall, args.receive_buffer)
+            snapshot = {"pulled": model.pulled, "outcome": model.outcome}
+            megabytes = snapshot["pulled"] * model.chunk_chars * 3 / 1024 / 1024
+            print(f"{label:<20}{snapshot['pulled']:>10}{megabytes:>14.1f}{snapshot['outcome']:>16}")
+            server.should_exit = True
+            await task
+
+
+async def concurrency_cap(model: CountingModel, appmod, args):
+    model.chunk_delay, model.chunks, model.chunk_chars = 0.02, 50, 10
+    appmod.stream_limiter = StreamLimiter(limit=args.limit, queue_timeout=0)
+    print(f"\n[并发上限] 上限 {args.limit}，同时发起 {args.streams} 个流式请求（每个约 "
+          f"{model.chunk_delay * model.chunks:.0f} s）")
+    server, task, url = await serve(appmod.app)
+    latencies: Dict[int, List[float]] = {}
+
+    async def request(client: httpx.AsyncClient, index: int):
+        started = time.perf_counter()
+        async with client.stream("POST", url, json={"message": "你好", "use_tools": False, "session_id": f"cap-{index}"}) as response:
+            if response.status_code == 200:
+                async for _ in response.aiter_lines():
+                    pass
+            latencies.setdefault(response.status_code, []).append((time.perf_counter() - started) * 1000)
+
+    limits = httpx.Limits(max_connections=args.streams)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        await asyncio.gather(*[request(client, index) for index in range(args.streams)])
+    for status, values in sorted(latencies.items()):
+        print(f"HTTP {status}: {len(values):>4} 个，p50 {percentile(values, 50):>8.1f} ms，p99 {percentile(values, 99):>8.1f} ms")
+    server.should_exit = True
+    await task
+
+
+async def main(args):
+    settings.STREAM_SEND_TIMEOUT_SECONDS = args.send_timeout
+    settings.STREAM_COALESCE_MS = args.coalesce_ms
+    import app as appmod
+
+    model = CountingModel()
+    appmod.ai_agent._chat_model = model
+    appmod.stream_limiter = StreamLimiter(limit=0)
+    apps = {"StreamingResponse": make_legacy_app(appmod), "/chat/stream": appmod.app}
+    await disconnect(model, apps, args)
+    await stalled(model, apps, args)
+    await concurrency_cap(model, appmod, args)
+
+    print("\n" + "\n".join(
+        line for line in registry.render().splitlines() if line.startswith("chat_stream_")
+    ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式响应取消与背压基准测试")
+    parser.add_argument("--frames", type=int, default=5, help="客户端断开/停止读取前读到的帧数")
+    parser.add_argument("--observe", type=float, default=2.0, help="断开后观察模型的时间（秒）")
+    parser.add_argument("--stall", type=float, default=5.0, help="客户端停止读取后保持连接的时间（秒）")
+    parser.add_argument("--send-timeout", type=float, default=2.0, help="发送超时（秒）")
+    parser.add_argument("--coalesce-ms", type=int, default=50, help="合并窗口（毫秒）")
+    parser.add_argument("--receive-buffer", type=int, default=65536, help="停止读取的客户端的套接字接收缓冲区（字节）")
+    parser.add_argument("--send-buffer", type=int, default=settings.STREAM_SEND_BUFFER, help="合并输出块时的缓冲块数上限")
+    parser.add_argument("--limit", type=int, default=20, help="并发流式响应上限")
+    parser.add_argument("--streams", type=int, default=60, help="同时发起的流式请求数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""
+翻译批处理基准测试
+
+对本地 MyMemory 桩服务并发发起翻译请求，比较逐条请求（旧实现）与
+微批合并 + 译文缓存后的耗时和上游请求数。
+
+运行: python -m benchmarks.bench_translate
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from config import settings
+from tools.http_client import AsyncHTTPClient, get_http_client, set_http_client
+from tools.translator import TranslatorTool
+from benchmarks.stub_upstreams import MyMemoryStub
+
+
+async def legacy_translate(text: str, target_lang: str):
+    """旧实现：每条文本一次上游请求"""
+    params = {"q": text, "langpair": f"zh-CN|{target_lang}"}
+    response = await get_http_client().get(settings.MYMEMORY_API_URL, params=params)
+    return response.json()["responseData"]["translatedText"]
+
+
+async def run(label: str, stub: MyMemoryStub, coroutines):
+    stub.requests = 0
+    started = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  上游请求 {stub.requests:5d}")
+
+
+async def main(requests: int, unique: int, latency: float):
+    stub = MyMemoryStub(latency=latency)
+    set_http_client(AsyncHTTPClient(transport=httpx.ASGITransport(app=stub.app)))
+    texts = [f"测试文本{index % unique}" for index in range(requests)]
+
+    print(f"并发请求 {requests}，不同文本 {unique}，上游延迟 {latency * 1000:.0f} ms，"
+          f"上游限速 {settings.TRANSLATE_RATE_LIMIT}/s")
+    await run("legacy (逐条请求)", stub, [legacy_translate(text, "en") for text in texts])
+
+    tool = TranslatorTool()
+    await run("batched (冷缓存)", stub, [tool.execute(text=text, target_lang="en") for text in texts])
+    await run("batched (热缓存)", stub, [tool.execute(text=text, target_lang="en") for text in texts])
+    await run("texts 参数 (新实例)", stub, [TranslatorTool().execute(texts=texts, target_lang="en")])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="翻译批处理基准测试")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--unique", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.unique, args.latency))
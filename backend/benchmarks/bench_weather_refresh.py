@@ -0,0 +1,127 @@
+"""
+热门城市天气刷新基准测试
+
+用本地 OpenWeatherMap 桩服务模拟一段时间内的天气查询（热门城市按Zipf分布，另有一部分冷门城市），
+比较只有缓存、加上stale-while-revalidate、再加上后台刷新三种配置的查询延迟（全部 / 热门城市）、
+缓存命中率和上游请求数。
+时间按比例缩短：缓存TTL、重新验证窗口和刷新周期都以秒为单位缩小；前 warmup 秒的查询不计入统计。
+
+运行: python -m benchmarks.bench_weather_refresh
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import httpx
+
+from config import settings
+from tools.cache import TTLCache, ToolResultCache
+from tools.http_client import AsyncHTTPClient, set_http_client
+from tools.manager import ToolManager
+from tools.refresher import WeatherRefresher
+from benchmarks.stub_upstreams import FaultInjection, OpenWeatherMapStub
+
+CITIES = settings.WEATHER_REFRESH_SEED_CITIES
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def make_workload(args) -> List[str]:
+    """热门城市按Zipf分布抽样，cold_ratio 的查询落在冷门城市"""
+    rng = random.Random(1)
+    weights = [1 / rank for rank in range(1, len(CITIES) + 1)]
+    total = int(args.duration * args.rate)
+    return [
+        f"冷门城市{rng.randrange(args.cold_cities)}" if rng.random() < args.cold_ratio
+        else rng.choices(CITIES, weights)[0]
+        for _ in range(total)
+    ]
+
+
+async def run(label: str, workload: List[str], faults: FaultInjection, args, revalidate: bool, refresh: bool):
+    cache = ToolResultCache(
+        backend=TTLCache(10000),
+        ttls={"weather": args.ttl},
+        stale_ttl=args.ttl * 10,
+        revalidate_windows={"weather": args.ttl if revalidate else 0}
+    )
+    manager = ToolManager(cache=cache, guards={})
+    manager.refresher = None
+    if refresh:
+        manager.refresher = WeatherRefresher(
+            manager,
+            interval=args.interval,
+            refresh_ahead=args.interval * 2,
+            max_per_cycle=args.max_per_cycle
+        )
+        await manager.refresher.start()
+
+    latencies = []
+    hot_latencies = []
+    hot = set(CITIES)
+    tasks = []
+    started = time.perf_counter()
+    warmup = int(args.warmup * args.rate)
+
+    async def query(city: str, measured: bool):
+        begin = time.perf_counter()
+        await manager.execute_tool("weather", {"city": city})
+        latency = (time.perf_counter() - begin) * 1000
+        if not measured:
+            return
+        latencies.append(latency)
+        if city in hot:
+            hot_latencies.append(latency)
+
+    for index, city in enumerate(workload):
+        # 按固定速率发出查询（开环负载）
+        delay = started + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if index == warmup:
+            faults.requests = 0
+            stats_before = dict(cache.get_stats()["tools"]["weather"])
+        tasks.append(asyncio.create_task(query(city, index >= warmup)))
+    await asyncio.gather(*tasks)
+    await manager.close()
+
+    stats = cache.get_stats()["tools"]["weather"]
+    hits = sum(stats[field] - stats_before.get(field, 0) for field in ("hits", "revalidated"))
+    print(f"{label:<26}{percentile(latencies, 50):>9.1f}{percentile(latencies, 90):>9.1f}"
+          f"{percentile(latencies, 99):>9.1f}{percentile(hot_latencies, 99):>13.1f}"
+          f"{hits / len(latencies) * 100:>9.1f}%{faults.requests:>10}")
+
+
+async def main(args):
+    settings.OPENWEATHER_API_KEY = "bench"
+    settings.OPENWEATHER_API_URL = "http://stub/data/2.5/weather"
+    faults = FaultInjection(OpenWeatherMapStub(latency=args.latency).app)
+    set_http_client(AsyncHTTPClient(transport=httpx.ASGITransport(app=faults)))
+    workload = make_workload(args)
+
+    print(f"{len(workload)} 次查询（统计预热 {args.warmup:.0f} 秒之后的部分），{args.duration:.0f} 秒，{args.rate:.0f} 次/秒，"
+          f"{len(CITIES)} 个热门城市（Zipf）+ {args.cold_ratio:.0%} 冷门城市；"
+          f"上游延迟 {args.latency * 1000:.0f} ms，缓存TTL {args.ttl:g} s，刷新周期 {args.interval:g} s")
+    print(f"{'配置':<24}{'p50(ms)':>9}{'p90(ms)':>9}{'p99(ms)':>9}{'热门p99(ms)':>13}{'命中率':>9}{'上游请求':>10}")
+    await run("只有缓存", workload, faults, args, revalidate=False, refresh=False)
+    await run("缓存+SWR", workload, faults, args, revalidate=True, refresh=False)
+    await run("缓存+SWR+后台刷新", workload, faults, args, revalidate=True, refresh=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="热门城市天气刷新基准测试")
+    parser.add_argument("--duration", type=float, default=40.0, help="模拟时长（秒）")
+    parser.add_argument("--warmup", type=float, default=10.0, help="不计入统计的预热时长（秒）")
+    parser.add_argument("--rate", type=float, default=50.0, help="每秒查询数")
+    parser.add_argument("--latency", type=float, default=0.3, help="天气接口延迟（秒）")
+    parser.add_argument("--ttl", type=float, default=10.0, help="天气缓存TTL（秒）")
+    parser.add_argument("--interval", type=float, default=1.0, help="后台刷新周期（秒）")
+    parser.add_argument("--max-per-cycle", type=int, default=10, help="每个周期最多刷新的城市数")
+    parser.add_argument("--cold-ratio", type=float, default=0.05, help="冷门城市查询比例")
+    parser.add_argument("--cold-cities", type=int, default=200, help="冷门城市数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,245 @@
+"""
+端到端负载测试
+
+启动本地上游桩服务（假DeepSeek、OpenWeatherMap、MyMemory、DuckDuckGo）和 app:app，
+以指定并发压测 /chat/、/chat/stream 和 /tools/execute，输出延迟分位数（p50/p95/p99）、
+吞吐量、流式首字延迟和服务进程内存。全部请求只访问本机，可完全离线运行。
+
+运行: python -m benchmarks.load_test --concurrency 32 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.stub_upstreams import upstream_env
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_MESSAGES = [
+    "北京今天天气怎么样？",
+    "帮我计算 (15 + 23) * 2",
+    "把'今天过得怎么样'翻译成英文",
+    "搜索 Python 异步编程教程",
+    "现在几点了？",
+    "你好，介绍一下你自己",
+]
+
+TOOL_CALLS = [
+    {"tool_name": "calculator", "parameters": {"expression": "(15 + 23) * 2"}},
+    {"tool_name": "weather", "parameters": {"city": "上海"}},
+    {"tool_name": "translate", "parameters": {"text": "你好世界", "target_lang": "en"}},
+    {"tool_name": "web_search", "parameters": {"query": "FastAPI"}},
+    {"tool_name": "time", "parameters": {}},
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法分位数"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def process_rss_mb(pid: int) -> float:
+    """进程及其子进程（uvicorn worker）的常驻内存（MB）"""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / 1024 / 1024
+    except ImportError:
+        pass
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return total / 1024
+
+
+async def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未就绪: {url}")
+
+
+class Scenario:
+    """一种压测场景：run(client, i) 发送第i个请求，返回延迟、首字延迟（仅流式）和是否成功"""
+
+    def __init__(self, name: str, sessions: int):
+        self.name = name
+        self.sessions = sessions
+
+    async def run(self, client: httpx.AsyncClient, index: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        ttft = None
+        if self.name == "chat":
+            response = await client.post("/chat/", json=self._chat_body(index))
+            ok = response.status_code == 200
+        elif self.name == "stream":
+            ok = False
+            async with client.stream("POST", "/chat/stream", json=self._chat_body(index)) as response:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    frame = json.loads(line[6:])
+                    if frame.get("type") == "content" and ttft is None:
+                        ttft = time.perf_counter() - started
+                    elif frame.get("type") == "done":
+                        ok = True
+                    elif frame.get("type") == "error":
+                        break
+        else:
+            response = await client.post("/tools/execute", json=TOOL_CALLS[index % len(TOOL_CALLS)])
+            ok = response.status_code == 200 and response.json().get("success", False)
+        return {"latency": time.perf_counter() - started, "ttft": ttft, "ok": ok}
+
+    def _chat_body(self, index: int) -> Dict[str, Any]:
+        return {
+            "message": CHAT_MESSAGES[index % len(CHAT_MESSAGES)],
+            "session_id": f"bench-{index % self.sessions}",
+        }
+
+
+async def drive(base_url: str, scenario: Scenario, requests: int, concurrency: int) -> Dict[str, Any]:
+    """以固定并发发送requests个请求"""
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for index in counter:
+                try:
+                    results.append(await scenario.run(client, index))
+                except httpx.HTTPError:
+                    results.append({"latency": 0.0, "ttft": None, "ok": False})
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results if r["ok"]]
+    ttfts = [r["ttft"] for r in results if r["ok"] and r["ttft"] is not None]
+    return {
+        "scenario": scenario.name,
+        "requests": len(results),
+        "errors": sum(1 for r in results if not r["ok"]),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "ttft_p50": percentile(ttfts, 50) if ttfts else None,
+        "ttft_p95": percentile(ttfts, 95) if ttfts else None,
+    }
+
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable] + args,
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def main(args):
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    data_dir = tempfile.mkdtemp(prefix="load_test_")
+
+    stub = start_process([
+        "-m", "benchmarks.stub_upstreams", "--port", str(stub_port),
+        "--llm-latency", str(args.llm_latency), "--token-rate", str(args.token_rate),
+        "--tokens", str(args.tokens), "--tool-latency", str(args.tool_latency),
+    ], {})
+    app_env = {
+        **upstream_env(stub_url),
+        "CONVERSATION_DB_PATH": os.path.join(data_dir, "conversations.db"),
+        "SHARED_STATE_DB_PATH": os.path.join(data_dir, "shared_state.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+    if args.workers > 1:
+        app_env.setdefault("SHARED_STATE_BACKEND", "sqlite")
+    app = start_process([
+        "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ], app_env)
+
+    try:
+        await wait_ready(f"{stub_url}/health")
+        await wait_ready(f"{app_url}/health")
+        print(f"并发 {args.concurrency}，每场景 {args.requests} 个请求，worker {args.workers}，"
+              f"模型首token {args.llm_latency * 1000:.0f} ms / {args.token_rate:g} token/s / {args.tokens} token，"
+              f"工具上游 {args.tool_latency * 1000:.0f} ms")
+        print(f"服务内存（启动后）: {process_rss_mb(app.pid):.1f} MB")
+        print(f"{'场景':<8}{'请求':>7}{'错误':>6}{'吞吐(req/s)':>13}{'p50(ms)':>10}{'p95(ms)':>10}"
+              f"{'p99(ms)':>10}{'首字p50':>10}{'首字p95':>10}{'内存(MB)':>10}")
+        for name in args.scenarios.split(","):
+            report = await drive(app_url, Scenario(name, args.sessions), args.requests, args.concurrency)
+            print(f"{report['scenario']:<8}{report['requests']:>7}{report['errors']:>6}"
+                  f"{report['throughput']:>13.1f}{format_ms(report['p50']):>10}{format_ms(report['p95']):>10}"
+                  f"{format_ms(report['p99']):>10}{format_ms(report['ttft_p50']):>10}"
+                  f"{format_ms(report['ttft_p95']):>10}{process_rss_mb(app.pid):>10.1f}")
+    finally:
+        for process in (app, stub):
+            process.terminate()
+        for process in (app, stub):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端负载测试（本地桩服务，无需联网）")
+    parser.add_argument("--scenarios", default="chat,stream,tools", help="逗号分隔：chat、stream、tools")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=300, help="每个场景的请求数")
+    parser.add_argument("--sessions", type=int, default=50, help="聊天请求轮流使用的会话数")
+    parser.add_argument("--workers", type=int, default=1, help="app的worker进程数")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
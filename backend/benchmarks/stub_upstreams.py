@@ -0,0 +1,276 @@
+"""
+本地上游桩服务
+
+模拟外部API的响应格式和延迟，基准测试和手动验证时无需访问真实网络。
+既可以配合 httpx.ASGITransport 在进程内使用：
+
+    from tools.http_client import AsyncHTTPClient, set_http_client
+    stub = MyMemoryStub(latency=0.2)
+    set_http_client(AsyncHTTPClient(transport=httpx.ASGITransport(app=stub.app)))
+
+也可以作为独立服务运行（DeepSeek、OpenWeatherMap、MyMemory、DuckDuckGo 挂在不同路径下）：
+
+    python -m benchmarks.stub_upstreams --port 9100 --llm-latency 0.3 --token-rate 50
+
+    DEEPSEEK_API_BASE=http://127.0.0.1:9100/deepseek/v1
+    OPENWEATHER_API_URL=http://127.0.0.1:9100/openweather/data/2.5/weather
+    MYMEMORY_API_URL=http://127.0.0.1:9100/mymemory/get
+    DUCKDUCKGO_API_URL=http://127.0.0.1:9100/duckduckgo/
+
+FaultInjection 可以包在任意桩服务外面，按概率返回错误或增加延迟，用于验证熔断、超时和对冲请求。
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import zlib
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FaultInjection:
+    """故障注入ASGI中间件
+
+    error_rate 的请求直接返回 status_code，slow_rate 的请求额外等待 slow_latency 秒；
+    outage 为True时全部请求失败。属性可以在运行中修改。
+    """
+
+    def __init__(
+        self,
+        app,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+        status_code: int = 503,
+        seed: Optional[int] = None
+    ):
+        self.app = app
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.status_code = status_code
+        self.outage = False
+        self.requests = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.requests += 1
+        if self.outage or self._random.random() < self.error_rate:
+            self.injected_errors += 1
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": [(b"content-type", b"text/plain")]
+            })
+            await send({"type": "http.response.body", "body": b"injected fault"})
+            return
+        if self._random.random() < self.slow_rate:
+            await asyncio.sleep(self.slow_latency)
+        await self.app(scope, receive, send)
+
+
+class MyMemoryStub:
+    """MyMemory 翻译API桩：把每一行加上目标语言前缀作为译文，并记录请求数"""
+
+    def __init__(self, latency: float = 0.0, max_query_bytes: int = 500):
+        self.latency = latency
+        self.max_query_bytes = max_query_bytes
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/get", self.translate, methods=["GET"])
+
+    async def translate(self, q: str = Query(...), langpair: str = Query(...)):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if len(q.encode("utf-8")) > self.max_query_bytes:
+            return {
+                "responseData": {"translatedText": ""},
+                "responseStatus": 403,
+                "responseDetails": "QUERY LENGTH LIMIT EXCEEDED"
+            }
+        source_lang, _, target_lang = langpair.partition("|")
+        translated = "\n".join(f"[{target_lang}] {line}" for line in q.split("\n"))
+        return {
+            "responseData": {
+                "translatedText": translated,
+                "detectedLanguage": {"language": source_lang, "confidence": 1.0}
+            },
+            "responseStatus": 200
+        }
+
+
+class FakeDeepSeek:
+    """DeepSeek（OpenAI兼容）聊天补全API桩
+
+    latency 秒后输出第一个token，之后按 token_rate 个/秒 输出，共 tokens 个token；
+    token_rate 为0时全部token立即输出。
+    """
+
+    def __init__(self, latency: float = 0.2, token_rate: float = 50, tokens: int = 40):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/v1/chat/completions", self.completions, methods=["POST"])
+
+    def _tokens(self):
+        return ["基准", "测试", "回复", "，"] * (self.tokens // 4) + ["。"] * (self.tokens % 4)
+
+    async def completions(self, request: Request):
+        self.requests += 1
+        body = await request.json()
+        model = body.get("model", "deepseek-chat")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": 0, "completion_tokens": self.tokens, "total_tokens": self.tokens}
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.latency + (self.tokens / self.token_rate if self.token_rate > 0 else 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(self._tokens())},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        async def stream():
+            def chunk(delta: Dict, finish_reason=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            await asyncio.sleep(self.latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for index, token in enumerate(self._tokens()):
+                if index and self.token_rate > 0:
+                    await asyncio.sleep(1 / self.token_rate)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+class OpenWeatherMapStub:
+    """OpenWeatherMap 当前天气API桩：按城市名或坐标生成稳定的伪随机天气"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/data/2.5/weather", self.weather, methods=["GET"])
+
+    async def weather(self, q: Optional[str] = None, lat: Optional[float] = None, lon: Optional[float] = None):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        name = q if q is not None else f"{lat},{lon}"
+        seed = zlib.crc32(name.encode("utf-8"))
+        return {
+            "name": name,
+            "main": {"temp": round(seed % 400 / 10 - 5, 1), "humidity": seed % 60 + 30},
+            "weather": [{"description": ["晴", "多云", "小雨", "阴"][seed % 4]}],
+            "wind": {"speed": round(seed % 100 / 10, 1)}
+        }
+
+
+class DuckDuckGoStub:
+    """DuckDuckGo 即时答案API桩"""
+
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.requests = 0
+        self.app = FastAPI()
+        self.app.add_api_route("/", self.search, methods=["GET"])
+
+    async def search(self, q: str = Query(...)):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return JSONResponse({
+            "Abstract": f"{q} 的摘要（桩服务）",
+            "RelatedTopics": [{"Text": f"{q} 相关主题 {index}"} for index in range(5)]
+        })
+
+
+def create_upstream_app(
+    llm_latency: float = 0.2,
+    token_rate: float = 50,
+    tokens: int = 40,
+    tool_latency: float = 0.05,
+    error_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_latency: float = 2.0
+) -> FastAPI:
+    """把全部桩服务挂到同一个应用下（故障注入只作用于天气、翻译和搜索接口）"""
+    def faulty(stub_app):
+        if error_rate or slow_rate:
+            return FaultInjection(stub_app, error_rate, slow_rate, slow_latency)
+        return stub_app
+
+    app = FastAPI()
+    app.mount("/deepseek", FakeDeepSeek(llm_latency, token_rate, tokens).app)
+    app.mount("/openweather", faulty(OpenWeatherMapStub(tool_latency).app))
+    app.mount("/mymemory", faulty(MyMemoryStub(tool_latency).app))
+    app.mount("/duckduckgo", faulty(DuckDuckGoStub(tool_latency).app))
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def upstream_env(base_url: str) -> Dict[str, str]:
+    """指向桩服务的环境变量"""
+    return {
+        "DEEPSEEK_API_KEY": "stub",
+        "DEEPSEEK_API_BASE": f"{base_url}/deepseek/v1",
+        "OPENWEATHER_API_KEY": "stub",
+        "OPENWEATHER_API_URL": f"{base_url}/openweather/data/2.5/weather",
+        "MYMEMORY_API_URL": f"{base_url}/mymemory/get",
+        "DUCKDUCKGO_API_URL": f"{base_url}/duckduckgo/",
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地上游桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="模型首个token延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=50, help="模型输出速率（token/秒，0为立即输出）")
+    parser.add_argument("--tokens", type=int, default=40, help="每次回复的token数")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="天气/翻译/搜索接口延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="天气/翻译/搜索接口返回503的比例")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="天气/翻译/搜索接口额外变慢的比例")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="变慢请求的额外延迟（秒）")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_upstream_app(
+            args.llm_latency, args.token_rate, args.tokens, args.tool_latency,
+            args.error_rate, args.slow_rate, args.slow_latency
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning"
+    )
@@ -21,13 +21,182 @@ class Settings:
     
     # DeepSeek API配置
     DEEPSEEK_API_KEY: str = os.getenv("DEEPSEEK_API_KEY", "")
+    DEEPSEEK_API_BASE: str = os.getenv("DEEPSEEK_API_BASE", "https://api.deepseek.com/v1")
     DEEPSEEK_MODEL: str = "deepseek-chat"
-    DEEPSEEK_TEMPERATURE: float = 0.7
+    DEEPSEEK_TEMPERATURE: float = float(os.getenv("DEEPSEEK_TEMPERATURE", "0.7"))  # 启用模型回复缓存时需不高于 LLM_CACHE_MAX_TEMPERATURE
     DEEPSEEK_MAX_TOKENS: int = 1000
     
+    # 上下文窗口配置
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # 原样保留的历史对话token预算
+    CONTEXT_SUMMARY_MAX_TOKENS: int = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))  # 滚动摘要的token上限
+    CONTEXT_MIN_RECENT_MESSAGES: int = int(os.getenv("CONTEXT_MIN_RECENT_MESSAGES", "4"))  # 至少原样保留的近期消息数
+    
     # 外部API配置
     OPENWEATHER_API_KEY: str = os.getenv("OPENWEATHER_API_KEY", "")
     GOOGLE_TRANSLATE_API_KEY: str = os.getenv("GOOGLE_TRANSLATE_API_KEY", "")
+    OPENWEATHER_API_URL: str = os.getenv("OPENWEATHER_API_URL", "http://api.openweathermap.org/data/2.5/weather")
+    DUCKDUCKGO_API_URL: str = os.getenv("DUCKDUCKGO_API_URL", "https://api.duckduckgo.com/")
+    
+    # HTTP客户端配置（所有网络工具共享的连接池）
+    HTTP_TIMEOUT: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+    
+    # 会话配置
+    DEFAULT_SESSION_ID: str = "default"
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))  # 最大会话数
+    SESSION_TTL_SECONDS: float = float(os.getenv("SESSION_TTL_SECONDS", "3600"))  # 会话空闲过期时间（秒）
+    SESSION_MAX_MESSAGES: int = int(os.getenv("SESSION_MAX_MESSAGES", "100"))  # 单会话保留的最大消息数
+    
+    # 对话持久化配置（sqlite: 追加日志写入本地数据库; memory: 只保存在内存中）
+    CONVERSATION_STORE: str = os.getenv("CONVERSATION_STORE", "sqlite")
+    CONVERSATION_DB_PATH: str = os.getenv(
+        "CONVERSATION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "conversations.db")
+    )
+    CONVERSATION_WRITE_BATCH_SIZE: int = int(os.getenv("CONVERSATION_WRITE_BATCH_SIZE", "100"))  # 单次批量写入的最大记录数
+    CONVERSATION_FLUSH_INTERVAL_MS: int = int(os.getenv("CONVERSATION_FLUSH_INTERVAL_MS", "200"))  # 写后缓冲的最长等待时间（毫秒）
+    CONVERSATION_RETENTION_DAYS: float = float(os.getenv("CONVERSATION_RETENTION_DAYS", "30"))  # 超过该天数无新消息的会话在压缩时删除（0为永久保留）
+    CONVERSATION_COMPACT_INTERVAL_SECONDS: float = float(os.getenv("CONVERSATION_COMPACT_INTERVAL_SECONDS", "3600"))  # 压缩间隔（秒，0为不自动压缩）
+    
+    # 共享状态配置（memory: 单进程; sqlite: 同一台机器上的多个worker共享工具缓存、会话版本号等）
+    SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "memory")
+    SHARED_STATE_DB_PATH: str = os.getenv(
+        "SHARED_STATE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "shared_state.db")
+    )
+    
+    # 服务启动配置（start.py --prod 时使用）
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))  # worker进程数，默认等于CPU核数
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: float = float(os.getenv("SERVER_GRACEFUL_SHUTDOWN_SECONDS", "30"))  # 关闭时等待进行中请求的最长时间
+    
+    # 流式输出配置（均为0时模型输出块到达即转发）
+    STREAM_COALESCE_CHARS: int = int(os.getenv("STREAM_COALESCE_CHARS", "0"))  # 缓冲达到该字符数时发送
+    STREAM_COALESCE_MS: int = int(os.getenv("STREAM_COALESCE_MS", "0"))  # 距上次发送超过该毫秒数时发送
+    STREAM_PIPELINE_ENABLED: bool = os.getenv("STREAM_PIPELINE_ENABLED", "false").lower() == "true"  # 流水线模式：先发ack帧，工具结果到达即推送
+    
+    # 流式响应并发与背压（按worker进程计）
+    MAX_CONCURRENT_STREAMS: int = int(os.getenv("MAX_CONCURRENT_STREAMS", "100"))  # 同时进行的流式响应上限，0表示不限制
+    STREAM_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("STREAM_QUEUE_TIMEOUT_SECONDS", "0"))  # 达到上限时排队等待名额的最长时间，0表示立即返回429
+    STREAM_QUEUE_MAX: int = int(os.getenv("STREAM_QUEUE_MAX", "100"))  # 最多同时排队的请求数，超出直接返回429
+    STREAM_SEND_BUFFER: int = int(os.getenv("STREAM_SEND_BUFFER", "32"))  # 合并输出块时每个流式响应最多缓冲的模型输出块数，缓冲满时暂停读取模型输出，0表示不限制
+    STREAM_SEND_TIMEOUT_SECONDS: float = float(os.getenv("STREAM_SEND_TIMEOUT_SECONDS", "30"))  # 客户端不读取导致单帧发送超过该时间即取消生成，0表示不限制
+    
+    # 模型回复缓存（只缓存无历史对话的首轮请求，相同提示词直接复用回复）
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))  # 最多缓存的回复数（LRU淘汰）
+    LLM_CACHE_TTL_SECONDS: float = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))  # 回复缓存有效期（秒）
+    LLM_CACHE_MAX_TEMPERATURE: float = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))  # 模型温度（DEEPSEEK_TEMPERATURE）不高于该值时才缓存
+    LLM_CACHE_REPLAY_CHUNK_CHARS: int = int(os.getenv("LLM_CACHE_REPLAY_CHUNK_CHARS", "20"))  # 流式回放缓存回复时每块的字符数
+    
+    # 语义缓存（首轮问题与已缓存问题足够相似时直接复用回答，需要numpy）
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))  # 余弦相似度阈值（由 benchmarks/bench_semantic_cache.py 的标注问题对选定）
+    SEMANTIC_CACHE_CAPACITY: int = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "5000"))  # 最多缓存的问题数（淘汰最久未命中的）
+    SEMANTIC_CACHE_DIM: int = int(os.getenv("SEMANTIC_CACHE_DIM", "512"))  # 哈希向量维度
+    SEMANTIC_CACHE_TTL_SECONDS: float = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))  # 回答有效期（秒）
+    SEMANTIC_CACHE_BYPASS_TOOLS: list = ["weather", "time"]  # 结果随时间变化的工具，用到时不走语义缓存
+    
+    # 工具执行配置
+    AGENT_TOOL_MODE: str = os.getenv("AGENT_TOOL_MODE", "keyword")  # keyword: 关键词检测; function_calling: 模型原生工具调用
+    FUNCTION_CALLING_MAX_ROUNDS: int = int(os.getenv("FUNCTION_CALLING_MAX_ROUNDS", "3"))  # 原生工具调用的最大轮数
+    TOOL_CALL_TIMEOUT: float = float(os.getenv("TOOL_CALL_TIMEOUT", "8"))  # 单个工具超时（秒）
+    TOOL_TOTAL_TIMEOUT: float = float(os.getenv("TOOL_TOTAL_TIMEOUT", "12"))  # 全部工具的全局截止时间（秒）
+    
+    # 上游容错配置（只作用于下列网络工具，状态按worker进程统计）
+    TOOL_RESILIENCE_ENABLED: bool = os.getenv("TOOL_RESILIENCE_ENABLED", "true").lower() == "true"
+    TOOL_RESILIENCE_TOOLS: list = ["weather", "translate", "web_search"]
+    TOOL_RATE_LIMITS: dict = {  # (每秒请求数, 突发数)；翻译在TranslatorTool内按合并后的上游请求限速
+        "weather": (10, 10),
+        "web_search": (5, 5)
+    }
+    TOOL_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("TOOL_BREAKER_FAILURE_THRESHOLD", "5"))  # 连续失败该次数后熔断
+    TOOL_BREAKER_RESET_SECONDS: float = float(os.getenv("TOOL_BREAKER_RESET_SECONDS", "30"))  # 熔断后每隔该时间放行一次试探请求
+    TOOL_ADAPTIVE_TIMEOUT_MIN: float = float(os.getenv("TOOL_ADAPTIVE_TIMEOUT_MIN", "1"))  # 自适应超时下限（秒），上限为TOOL_CALL_TIMEOUT
+    TOOL_ADAPTIVE_TIMEOUT_MULTIPLIER: float = float(os.getenv("TOOL_ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))  # 超时 = 近期p99耗时 × 该系数
+    TOOL_LATENCY_WINDOW: int = int(os.getenv("TOOL_LATENCY_WINDOW", "200"))  # 统计耗时分位数的近期请求数
+    TOOL_LATENCY_MIN_SAMPLES: int = int(os.getenv("TOOL_LATENCY_MIN_SAMPLES", "20"))  # 样本少于该数时不启用自适应超时和对冲
+    TOOL_HEDGING_ENABLED: bool = os.getenv("TOOL_HEDGING_ENABLED", "false").lower() == "true"  # 慢请求是否发对冲请求
+    TOOL_HEDGE_QUANTILE: float = float(os.getenv("TOOL_HEDGE_QUANTILE", "0.95"))  # 耗时超过该分位数时发对冲请求
+    TOOL_STALE_TTL_SECONDS: float = float(os.getenv("TOOL_STALE_TTL_SECONDS", "86400"))  # 缓存过期后仍可在上游故障时返回的时长
+    
+    # 批量工具执行配置
+    TOOL_BATCH_MAX_CALLS: int = int(os.getenv("TOOL_BATCH_MAX_CALLS", "500"))  # 单个批量请求的最大工具调用数
+    TOOL_DEFAULT_CONCURRENCY: int = int(os.getenv("TOOL_DEFAULT_CONCURRENCY", "20"))  # 未单独配置的工具并发上限
+    TOOL_CONCURRENCY_LIMITS: dict = {
+        "weather": 10,
+        "translate": 5,
+        "web_search": 5
+    }
+    
+    # 批量聊天配置
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))  # 单个批量请求的最大消息数
+    BATCH_LLM_CONCURRENCY: int = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))  # 默认的模型并发调用数
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))  # 请求可指定的并发上限
+    
+    # 计算器配置
+    CALCULATOR_MAX_DEPTH: int = 50        # 表达式最大嵌套深度
+    CALCULATOR_MAX_STEPS: int = 1000      # 单个表达式最大求值步数
+    CALCULATOR_MAX_EXPONENT: float = 1000  # 幂运算指数的绝对值上限
+    CALCULATOR_MAX_INT_BITS: int = 4096   # 整数结果的最大位数
+    CALCULATOR_CACHE_SIZE: int = 1024     # 表达式结果LRU缓存大小
+    
+    # 工具结果缓存配置（TTL单位为秒，未列出的工具不缓存）
+    TOOL_CACHE_ENABLED: bool = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+    TOOL_CACHE_MAX_ENTRIES: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "10000"))
+    TOOL_CACHE_TTLS: dict = {
+        "weather": 600,          # 10分钟
+        "translate": 7 * 86400,  # 7天
+        "web_search": 3600       # 1小时
+    }
+    TOOL_CACHE_REVALIDATE_WINDOWS: dict = {  # 过期不超过该秒数的结果先返回，同时后台刷新
+        "weather": 600
+    }
+    
+    # 天气后台刷新配置（查询最多的城市在缓存过期前主动刷新）
+    WEATHER_REFRESH_ENABLED: bool = os.getenv("WEATHER_REFRESH_ENABLED", "true").lower() == "true"  # 未配置天气API密钥时不启动
+    WEATHER_REFRESH_INTERVAL_SECONDS: float = float(os.getenv("WEATHER_REFRESH_INTERVAL_SECONDS", "60"))  # 刷新周期
+    WEATHER_REFRESH_AHEAD_SECONDS: float = float(os.getenv("WEATHER_REFRESH_AHEAD_SECONDS", "120"))  # 缓存剩余新鲜时间不足该值时刷新
+    WEATHER_REFRESH_MAX_PER_CYCLE: int = int(os.getenv("WEATHER_REFRESH_MAX_PER_CYCLE", "10"))  # 每个周期最多刷新的城市数（控制上游配额）
+    WEATHER_REFRESH_HOT_SIZE: int = int(os.getenv("WEATHER_REFRESH_HOT_SIZE", "40"))  # 热门城市数
+    WEATHER_REFRESH_DECAY: float = float(os.getenv("WEATHER_REFRESH_DECAY", "0.9"))  # 每个周期查询次数的衰减系数
+    WEATHER_REFRESH_MIN_SCORE: float = float(os.getenv("WEATHER_REFRESH_MIN_SCORE", "0.1"))  # 衰减后低于该值的城市移出统计
+    WEATHER_REFRESH_SEED_CITIES: list = [  # 初始热门城市（没有查询时随衰减移出）
+        '北京', '上海', '广州', '深圳', '杭州', '南京', '成都', '武汉', '西安', '重庆',
+        '天津', '青岛', '大连', '厦门', '苏州', '无锡', '宁波', '长沙', '郑州', '济南',
+        '哈尔滨', '沈阳', '长春', '石家庄', '太原', '呼和浩特', '合肥', '福州', '南昌', '南宁',
+        '海口', '贵阳', '昆明', '拉萨', '兰州', '西宁', '银川', '乌鲁木齐'
+    ]
+    
+    # 城市地名索引配置（数据文件更新后自动重建索引）
+    GAZETTEER_DATA_FILE: str = os.getenv(
+        "GAZETTEER_DATA_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "cities.tsv")
+    )
+    GAZETTEER_INDEX_FILE: str = os.getenv(
+        "GAZETTEER_INDEX_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.idx")
+    )
+    WEATHER_MAX_CITIES: int = int(os.getenv("WEATHER_MAX_CITIES", "5"))  # 一条消息中最多查询天气的城市数
+    
+    # 翻译配置（同一语言对的请求在窗口内合并成一次上游请求）
+    MYMEMORY_API_URL: str = os.getenv("MYMEMORY_API_URL", "https://api.mymemory.translated.net/get")
+    TRANSLATE_BATCH_WINDOW_MS: int = int(os.getenv("TRANSLATE_BATCH_WINDOW_MS", "20"))  # 微批收集窗口（毫秒）
+    TRANSLATE_BATCH_MAX_CHARS: int = int(os.getenv("TRANSLATE_BATCH_MAX_CHARS", "500"))  # 单次上游请求的文本上限（字节）
+    TRANSLATE_RATE_LIMIT: float = float(os.getenv("TRANSLATE_RATE_LIMIT", "5"))  # 上游请求速率（次/秒，0为不限制）
+    TRANSLATE_RATE_BURST: int = int(os.getenv("TRANSLATE_RATE_BURST", "5"))  # 允许的突发请求数
+    TRANSLATE_CACHE_MAX_ENTRIES: int = int(os.getenv("TRANSLATE_CACHE_MAX_ENTRIES", "10000"))  # 单条译文缓存条数
+    
+    # 日志配置
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json: 每行一条JSON; text: 便于本地阅读的文本
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # 高频日志（如每个请求一条）的采样率
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 日志队列上限，满时丢弃
+    LOG_MESSAGE_CONTENT: bool = os.getenv("LOG_MESSAGE_CONTENT", "false").lower() == "true"  # 是否记录用户消息原文
+    
+    # 指标配置（关闭时埋点为空操作）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
     
     # CORS配置
     ALLOWED_ORIGINS: list = [
@@ -0,0 +1,183 @@
+"""
+上下文窗口管理 - 按token预算保留近期对话，较早的对话折叠为滚动摘要
+"""
+import logging
+from bisect import bisect_left
+from typing import Awaitable, Callable, List, Optional, Tuple
+from langchain.schema import HumanMessage, AIMessage
+from session import Session
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数（中日韩字符按1个token计，其余约4个字符1个token）"""
+    cjk = 0
+    for char in text:
+        if '⺀' <= char <= '鿿' or '가' <= char <= '힯' or '＀' <= char <= '￯':
+            cjk += 1
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def render_messages(messages: List) -> str:
+    """把消息渲染为对话文本"""
+    lines = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            lines.append(f"用户: {msg.content}")
+        elif isinstance(msg, AIMessage):
+            lines.append(f"助手: {msg.content}")
+    return "\n".join(lines)
+
+
+# 摘要函数：输入(已有摘要, 新折叠的消息)，返回更新后的摘要
+Summarizer = Callable[[str, List], Awaitable[str]]
+
+
+class HistoryCache:
+    """会话历史的增量渲染缓存
+
+    每条消息只渲染、估算token一次；cum保存token前缀和，
+    任意区间的token数和窗口边界都可以在O(1)/O(log n)内得到。
+    下标均为绝对消息序号（含已被裁剪掉的消息）。
+    """
+
+    def __init__(self):
+        self.base = 0
+        self.lines: List[str] = []
+        self.cum: List[int] = [0]
+
+    @property
+    def end(self) -> int:
+        """已缓存消息的绝对结束序号"""
+        return self.base + len(self.lines)
+
+    def sync(self, session: Session):
+        """把会话中新增的消息追加进缓存"""
+        first = session.trimmed_count
+        messages = session.messages
+        if self.end < first or self.end > first + len(messages):
+            # 缓存落后于裁剪或会话被清空，重新开始
+            self.base, self.lines, self.cum = first, [], [0]
+
+        for msg in messages[self.end - first:]:
+            line = render_messages([msg])
+            self.lines.append(line)
+            self.cum.append(self.cum[-1] + estimate_tokens(msg.content))
+
+        # 已裁剪的部分超过一半时压缩，摊还O(1)
+        drop = first - self.base
+        if drop > 0 and drop * 2 >= len(self.lines):
+            offset = self.cum[drop]
+            self.lines = self.lines[drop:]
+            self.cum = [value - offset for value in self.cum[drop:]]
+            self.base = first
+
+    def tokens(self, start: int, end: int) -> int:
+        """区间[start, end)的token数"""
+        return self.cum[end - self.base] - self.cum[start - self.base]
+
+    def first_within(self, start: int, end: int, budget: int) -> int:
+        """[start, end]中使区间[i, end)的token数不超过budget的最小i"""
+        threshold = self.cum[end - self.base] - budget
+        index = bisect_left(self.cum, threshold, start - self.base, end - self.base)
+        return index + self.base
+
+    def render(self, start: int, end: int) -> str:
+        """渲染区间[start, end)的消息"""
+        return "\n".join(self.lines[start - self.base:end - self.base])
+
+
+class ContextBuilder:
+    """token预算感知的上下文构建器
+
+    最近的消息原样保留；超出预算时把最早的未折叠消息并入会话的滚动摘要。
+    摘要只在已有摘要的基础上增量更新，不会每轮从头重新生成。
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        token_budget: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+        min_recent_messages: Optional[int] = None
+    ):
+        self.summarizer = summarizer
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.summary_max_tokens = summary_max_tokens or settings.CONTEXT_SUMMARY_MAX_TOKENS
+        self.min_recent_messages = (
+            min_recent_messages if min_recent_messages is not None else settings.CONTEXT_MIN_RECENT_MESSAGES
+        )
+
+    async def build(self, session: Session) -> Tuple[str, str]:
+        """返回(滚动摘要, 渲染好的近期对话)"""
+        async with session.summary_lock:
+            cache = self._get_cache(session)
+            first = session.trimmed_count
+            start = first + session.summarized_count
+            end = cache.end
+            cut = self._find_cut(session, cache, start, end)
+            if cut > start:
+                trimmed_before = session.trimmed_count
+                folded = session.messages[start - first:cut - first]
+                session.summary = await self._fold(session.summary, folded)
+                # 生成摘要期间会话可能因超出上限被裁剪，需要修正折叠边界
+                session.summarized_count = max(0, cut - first - (session.trimmed_count - trimmed_before))
+                cache = self._get_cache(session)
+                start = session.trimmed_count + session.summarized_count
+                end = max(start, min(end, cache.end))
+            return session.summary, cache.render(start, end)
+
+    def _get_cache(self, session: Session) -> HistoryCache:
+        """获取并同步会话的历史缓存"""
+        if session.history_cache is None:
+            session.history_cache = HistoryCache()
+        session.history_cache.sync(session)
+        return session.history_cache
+
+    def _find_cut(self, session: Session, cache: HistoryCache, start: int, end: int) -> int:
+        """确定折叠边界：超出预算时折叠到预算的一半，避免每轮都触发摘要；
+        消息数超出会话上限时至少折叠超出的部分（折叠后才会被Session裁剪）"""
+        required = end - session.max_messages
+        if cache.tokens(start, end) <= self.token_budget and required <= start:
+            return start
+
+        latest_cut = max(start, end - self.min_recent_messages)
+        floor = min(max(start, required), latest_cut)
+        cut = max(min(cache.first_within(start, end, self.token_budget // 2), latest_cut), floor)
+
+        # 保证近期窗口从用户消息开始，避免拆散一轮问答；必须折叠时向后找
+        while cut > floor and not self._starts_turn(session, cut, end):
+            cut -= 1
+        if floor > start:
+            while cut < latest_cut and not self._starts_turn(session, cut, end):
+                cut += 1
+        return cut
+
+    @staticmethod
+    def _starts_turn(session: Session, index: int, end: int) -> bool:
+        """绝对序号index处是否是一轮问答的开始（用户消息）"""
+        return index >= end or isinstance(session.messages[index - session.trimmed_count], HumanMessage)
+
+    async def _fold(self, summary: str, messages: List) -> str:
+        """把新折叠的消息并入摘要"""
+        if self.summarizer is not None:
+            try:
+                new_summary = await self.summarizer(summary, messages)
+                if new_summary:
+                    return self._clip(new_summary)
+            except Exception as e:
+                logger.warning("对话摘要生成失败，使用截断摘要", extra={"error": str(e)})
+
+        # 兜底：直接拼接并截断
+        folded = render_messages(messages)
+        return self._clip(f"{summary}\n{folded}" if summary else folded)
+
+    def _clip(self, text: str) -> str:
+        """把摘要限制在token上限内（保留较新的内容）"""
+        text = text.strip()
+        while estimate_tokens(text) > self.summary_max_tokens and len(text) > 1:
+            excess = estimate_tokens(text) - self.summary_max_tokens
+            text = text[max(excess, 1):]
+        return text
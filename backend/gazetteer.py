@@ -0,0 +1,313 @@
+"""
+城市地名索引 - 中英文城市名及别名到城市（编号、国家、坐标）的映射
+
+数据文件（GAZETTEER_DATA_FILE，每行一个城市：编号、国家代码、纬度、经度、名称列表）在首次使用时
+编译成二进制索引文件（GAZETTEER_INDEX_FILE），之后以内存映射方式打开：名称不展开成Python对象，
+多个worker共享同一份页缓存。数据文件更新后自动重建索引。
+
+索引中的名称按规范化后的UTF-8字节排序。在消息中查找城市时从每个字符位置出发，
+在排序数组上逐字节二分缩小前缀范围，范围为空即停止，一遍扫描得到不重叠的最长匹配。
+
+内置数据（resources/cities.tsv）只收录约540个常用城市，
+完整数据可从GeoNames导出: python -m gazetteer --geonames cities15000.txt
+"""
+import os
+import re
+import mmap
+import struct
+import argparse
+import unicodedata
+from array import array
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from config import settings
+
+
+MAGIC = b"GAZ1"
+# 文件头：魔数、名称数、城市数、名称字节数、显示名称字节数
+HEADER = struct.Struct("<4sIIII")
+# 城市记录：编号、纬度、经度、国家代码
+CITY_RECORD = struct.Struct("<Iff2s2x")
+
+_WHITESPACE = re.compile(r"\s+")
+_ASCII_WORD = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789")
+# 中国城市自动加"市"后缀的别名（已带行政区划后缀的除外）
+_CITY_SUFFIX = "市"
+_ADMIN_SUFFIXES = ("市", "州", "盟", "县", "区")
+
+
+class City(NamedTuple):
+    """城市"""
+    id: int
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+
+
+def normalize_name(text: str) -> str:
+    """全角转半角、转小写、合并连续空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def _char_width(lead_byte: int) -> int:
+    """UTF-8首字节对应的字符字节数"""
+    if lead_byte < 0x80:
+        return 1
+    if lead_byte < 0xE0:
+        return 2
+    return 3 if lead_byte < 0xF0 else 4
+
+
+def _is_cjk(text: str) -> bool:
+    return all("一" <= char <= "鿿" for char in text)
+
+
+def read_source(path: str) -> Iterator[Tuple[int, str, float, float, List[str]]]:
+    """读取数据文件，逐行返回 (编号, 国家代码, 纬度, 经度, 名称列表)"""
+    with open(path, encoding="utf-8") as source:
+        for line_number, line in enumerate(source, 1):
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            try:
+                city_id, country, latitude, longitude, names = line.split("\t")
+                yield int(city_id), country, float(latitude), float(longitude), names.split("|")
+            except ValueError:
+                raise ValueError(f"{path}:{line_number}: 格式错误") from None
+
+
+def build_index(source_path: str, index_path: str) -> int:
+    """把数据文件编译成索引文件（先写临时文件再替换，多进程同时构建也安全），返回名称数
+
+    同一名称属于多个城市时保留数据文件中靠前的城市。
+    """
+    cities = []
+    keys: Dict[bytes, int] = {}
+    for city_id, country, latitude, longitude, names in read_source(source_path):
+        index = len(cities)
+        cities.append((city_id, names[0], country, latitude, longitude))
+        aliases = list(names)
+        if country == "CN":
+            aliases += [name + _CITY_SUFFIX for name in names if _is_cjk(name) and not name.endswith(_ADMIN_SUFFIXES)]
+        for name in aliases:
+            key = normalize_name(name).encode("utf-8")
+            # 单个字符的名称误匹配太多，不收录
+            if len(normalize_name(name)) > 1:
+                keys.setdefault(key, index)
+
+    sorted_keys = sorted(keys)
+    name_offsets = array("I", [0])
+    name_cities = array("I")
+    for key in sorted_keys:
+        name_offsets.append(name_offsets[-1] + len(key))
+        name_cities.append(keys[key])
+    names_blob = b"".join(sorted_keys)
+
+    display_offsets = array("I", [0])
+    records = []
+    for city_id, name, country, latitude, longitude in cities:
+        display_offsets.append(display_offsets[-1] + len(name.encode("utf-8")))
+        records.append(CITY_RECORD.pack(city_id, latitude, longitude, country.encode("ascii")[:2]))
+    display_blob = "".join(city[1] for city in cities).encode("utf-8")
+
+    directory = os.path.dirname(index_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as output:
+        output.write(HEADER.pack(MAGIC, len(sorted_keys), len(cities), len(names_blob), len(display_blob)))
+        output.write(name_offsets.tobytes())
+        output.write(name_cities.tobytes())
+        output.write(display_offsets.tobytes())
+        output.write(b"".join(records))
+        output.write(names_blob)
+        output.write(display_blob)
+    os.replace(temp_path, index_path)
+    return len(sorted_keys)
+
+
+class Gazetteer:
+    """内存映射的城市地名索引（只读）"""
+
+    def __init__(self, index_path: str):
+        with open(index_path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, name_count, city_count, names_size, display_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} 不是城市索引文件")
+        self.name_count = name_count
+        self.city_count = city_count
+
+        view = memoryview(self._mmap)
+        position = HEADER.size
+
+        def section(size: int) -> memoryview:
+            nonlocal position
+            start, position = position, position + size
+            return view[start:position]
+
+        self._name_offsets = section(4 * (name_count + 1)).cast("I")
+        self._name_cities = section(4 * name_count).cast("I")
+        self._display_offsets = section(4 * (city_count + 1)).cast("I")
+        self._records = section(CITY_RECORD.size * city_count)
+        self._names = section(names_size)
+        self._display = section(display_size)
+
+        # 首个字符对应的名称范围（名称按字节排序，首字符相同的名称相邻），查找时从这里开始缩小范围
+        self._first_char_ranges: Dict[bytes, Tuple[int, int]] = {}
+        for key_index in range(name_count):
+            start = self._name_offsets[key_index]
+            first = bytes(self._names[start:start + _char_width(self._names[start])])
+            low, _ = self._first_char_ranges.get(first, (key_index, key_index))
+            self._first_char_ranges[first] = (low, key_index + 1)
+
+    def close(self):
+        for buffer in (self._name_offsets, self._name_cities, self._display_offsets,
+                       self._records, self._names, self._display):
+            buffer.release()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self.name_count
+
+    def city(self, index: int) -> City:
+        """按内部序号读取城市记录"""
+        city_id, latitude, longitude, country = CITY_RECORD.unpack_from(self._records, index * CITY_RECORD.size)
+        start, end = self._display_offsets[index], self._display_offsets[index + 1]
+        name = bytes(self._display[start:end]).decode("utf-8")
+        return City(city_id, name, country.decode("ascii"), round(latitude, 4), round(longitude, 4))
+
+    def lookup(self, name: str) -> Optional[City]:
+        """按名称或别名精确查找城市"""
+        key = normalize_name(name).encode("utf-8")
+        if not key:
+            return None
+        match = self._longest_prefix(key, 0)
+        if match is None or match[1] != len(key):
+            return None
+        return self.city(match[0])
+
+    def find(self, text: str) -> List[City]:
+        """按出现顺序返回文本中提到的城市（不重叠的最长匹配）"""
+        data = normalize_name(text).encode("utf-8")
+        cities = []
+        position = 0
+        while position < len(data):
+            match = self._longest_prefix(data, position)
+            if match is not None and self._on_word_boundary(data, position, match[1]):
+                cities.append(self.city(match[0]))
+                position = match[1]
+                continue
+            position += 1
+            # 跳到下一个字符的起始字节
+            while position < len(data) and data[position] & 0xC0 == 0x80:
+                position += 1
+        return cities
+
+    def _longest_prefix(self, data: bytes, start: int) -> Optional[Tuple[int, int]]:
+        """返回以 data[start:] 为前缀的最长名称 (城市序号, 结束位置)，没有时返回None"""
+        depth = _char_width(data[start])
+        key_range = self._first_char_ranges.get(data[start:start + depth])
+        if key_range is None:
+            return None
+        low, high = key_range
+        offsets = self._name_offsets
+        names = self._names
+        best = None
+        while low < high:
+            # 范围内的名称前depth个字节都相同，长度恰好为depth的名称排在最前
+            if offsets[low + 1] - offsets[low] == depth:
+                best = (self._name_cities[low], start + depth)
+                low += 1
+            if low >= high or start + depth >= len(data):
+                break
+            byte = data[start + depth]
+            # 二分查找第depth个字节等于byte的子范围（范围内的名称长度都大于depth）
+            left, right = low, high
+            while left < right:
+                middle = (left + right) // 2
+                if names[offsets[middle] + depth] < byte:
+                    left = middle + 1
+                else:
+                    right = middle
+            low = left
+            right = high
+            while left < right:
+                middle = (left + right) // 2
+                if names[offsets[middle] + depth] <= byte:
+                    left = middle + 1
+                else:
+                    right = middle
+            high = left
+            depth += 1
+        return best
+
+    @staticmethod
+    def _on_word_boundary(data: bytes, start: int, end: int) -> bool:
+        """英文名称不能是更长单词的一部分（如 "bali" 不匹配 "balinese"）"""
+        if data[start] in _ASCII_WORD and start > 0 and data[start - 1] in _ASCII_WORD:
+            return False
+        if data[end - 1] in _ASCII_WORD and end < len(data) and data[end] in _ASCII_WORD:
+            return False
+        return True
+
+
+def load_gazetteer(source_path: Optional[str] = None, index_path: Optional[str] = None) -> Gazetteer:
+    """打开城市索引，索引不存在或比数据文件旧时先重建"""
+    source_path = source_path or settings.GAZETTEER_DATA_FILE
+    index_path = index_path or settings.GAZETTEER_INDEX_FILE
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(source_path):
+        build_index(source_path, index_path)
+    return Gazetteer(index_path)
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """获取全局城市索引（首次调用时加载）"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+    return _gazetteer
+
+
+def convert_geonames(cities_path: str, output_path: str, min_population: int = 0) -> int:
+    """把GeoNames城市数据（如cities15000.txt）转换成数据文件格式，返回城市数
+
+    名称取正式名、ASCII名以及别名中的中文名和纯ASCII名；编号使用GeoNames编号。
+    按人口从多到少排列，同名城市优先匹配人口多的一个。
+    """
+    rows = []
+    with open(cities_path, encoding="utf-8") as source:
+        for line in source:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 15:
+                continue
+            population = int(fields[14] or 0)
+            if population < min_population:
+                continue
+            names = []
+            chinese = [name for name in fields[3].split(",") if name and _is_cjk(name)]
+            ascii_names = [name for name in fields[3].split(",") if name and name.isascii() and name.replace(" ", "").isalpha()]
+            for name in chinese + [fields[1], fields[2]] + ascii_names:
+                if name and "|" not in name and name not in names:
+                    names.append(name)
+            rows.append((population, fields[0], fields[8], fields[4], fields[5], names))
+
+    rows.sort(key=lambda row: -row[0])
+    with open(output_path, "w", encoding="utf-8") as output:
+        output.write("# 由GeoNames数据生成：编号\t国家代码\t纬度\t经度\t名称\n")
+        for _, geoname_id, country, latitude, longitude, names in rows:
+            output.write("\t".join([geoname_id, country, latitude, longitude, "|".join(names)]) + "\n")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="城市地名数据转换")
+    parser.add_argument("--geonames", required=True, help="GeoNames城市数据文件（如cities15000.txt）")
+    parser.add_argument("--output", default=settings.GAZETTEER_DATA_FILE, help="输出的数据文件")
+    parser.add_argument("--min-population", type=int, default=0, help="只保留人口不少于该值的城市")
+    args = parser.parse_args()
+    count = convert_geonames(args.geonames, args.output, args.min_population)
+    print(f"已写入 {count} 个城市到 {args.output}")
@@ -0,0 +1,223 @@
+"""
+意图检测 - 由工具声明的触发词编译成单个正则，一次扫描得到全部工具意图和参数；
+天气查询的城市由城市地名索引（gazetteer.py）识别
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from tools.manager import ToolManager
+from gazetteer import Gazetteer, get_gazetteer
+from config import settings
+
+
+# 翻译目标语言（按优先级排列，同时出现多种语言时取靠前的）
+LANGUAGES = [
+    ("zh", ['中文', '汉语', 'chinese']),
+    ("ja", ['日文', '日语', 'japanese']),
+    ("ko", ['韩文', '韩语', 'korean']),
+    ("fr", ['法文', '法语', 'french']),
+    ("de", ['德文', '德语', 'german']),
+    ("es", ['西班牙文', '西班牙语', 'spanish']),
+    ("ru", ['俄文', '俄语', 'russian']),
+]
+DEFAULT_TARGET_LANG = "en"
+
+# 从搜索查询中移除的指示词
+SEARCH_INDICATORS = ['搜索', '查找', '查询', 'search', '了解', '什么是', '如何', '怎么']
+
+# 引号中的文本（作为翻译内容，不参与意图检测）；
+# 英文单引号两侧紧挨字母或数字时是撇号（What's、it's、l'eau），不作为引号
+QUOTE_PATTERN = r'"[^"]+"|“[^”]+”|(?<![A-Za-z0-9])\'[^\']+\'(?![A-Za-z0-9])|‘[^’]+’|「[^」]+」'
+# 数学表达式
+MATH_PATTERN = r'\d+[\+\-\*\/\s\(\)\d\.]+'
+MATH_OPERATORS = set('+-*/')
+
+
+def trie_pattern(literals: List[str]) -> str:
+    """把一组字面量编译成前缀树形式的正则（共享前缀只匹配一次，长词优先）"""
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def render(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = []
+        singles = []
+        for char in sorted(key for key in node if key):
+            child = node[char]
+            if list(child) == [""]:
+                singles.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + render(child))
+        if len(singles) == 1:
+            branches.append(singles[0])
+        elif singles:
+            branches.append("[" + "".join(singles) + "]")
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and not terminal else "(?:" + "|".join(branches) + ")"
+        return body + "?" if terminal else body
+
+    return render(trie)
+
+
+class Detection:
+    """单条消息的检测结果"""
+
+    def __init__(self):
+        self.tools: List[str] = []
+        self.expressions: List[str] = []
+        self.language_rank: Optional[int] = None
+        self.quotes: List[str] = []
+        self.strip_spans: List[Tuple[int, int]] = []
+
+    def trigger(self, tool_name: str):
+        if tool_name not in self.tools:
+            self.tools.append(tool_name)
+
+
+class IntentDetector:
+    """编译好的意图检测引擎
+
+    所有工具的触发词、语言名和搜索指示词合并成一个前缀树形式的正则
+    （长词优先），启动时编译一次；每条消息只用 finditer 扫描一遍。
+    触发天气查询时再用城市地名索引在消息中查找城市（最长匹配）。
+    """
+
+    def __init__(self, tool_manager: ToolManager, gazetteer: Optional[Gazetteer] = None):
+        self.tool_manager = tool_manager
+        self.gazetteer = gazetteer if gazetteer is not None else get_gazetteer()
+        self._version = -1
+        self._pattern: Optional[re.Pattern] = None
+        self._pattern_ignorecase: Optional[re.Pattern] = None
+        self._roles: Dict[str, List[Tuple[str, Any]]] = {}
+        self._operator_tools: Dict[str, List[str]] = {}
+        self._tool_order: List[str] = []
+        self._compile()
+
+    def _compile(self):
+        """根据当前注册的工具编译检测正则"""
+        roles: Dict[str, List[Tuple[str, Any]]] = {}
+
+        def add(literal: str, role: str, value: Any):
+            roles.setdefault(literal.lower(), []).append((role, value))
+
+        operator_tools: Dict[str, List[str]] = {}
+        for tool in self.tool_manager.tools.values():
+            for trigger in tool.triggers:
+                add(trigger, "tool", tool.name)
+                if trigger in MATH_OPERATORS:
+                    # 运算符可能被数学表达式整体匹配掉，单独记录
+                    operator_tools.setdefault(trigger, []).append(tool.name)
+        for rank, (_, names) in enumerate(LANGUAGES):
+            for name in names:
+                add(name, "language", rank)
+        for indicator in SEARCH_INDICATORS:
+            add(indicator, "strip", None)
+
+        keyword_pattern = trie_pattern(list(roles))
+        pattern = f"(?P<quote>{QUOTE_PATTERN})|(?P<math>{MATH_PATTERN})|(?P<keyword>{keyword_pattern})"
+        # 通常在转小写后的消息上做大小写敏感匹配（比IGNORECASE快）；
+        # 极少数转小写会改变长度的消息改用IGNORECASE，保证位置与原文一致
+        self._pattern = re.compile(pattern)
+        self._pattern_ignorecase = re.compile(pattern, re.IGNORECASE)
+        self._roles = roles
+        self._operator_tools = operator_tools
+        self._tool_order = list(self.tool_manager.tools)
+        self._version = self.tool_manager.version
+
+    def detect(self, message: str) -> Detection:
+        """扫描一遍消息，收集触发的工具和提取的参数"""
+        if self._version != self.tool_manager.version:
+            self._compile()
+
+        lowered = message.lower()
+        if len(lowered) == len(message):
+            matches = self._pattern.finditer(lowered)
+        else:
+            matches = self._pattern_ignorecase.finditer(message)
+
+        detection = Detection()
+        for match in matches:
+            kind = match.lastgroup
+            text = match.group()
+            if kind == "quote":
+                start, end = match.span()
+                detection.quotes.append(message[start + 1:end - 1])
+            elif kind == "math":
+                detection.expressions.append(text.strip())
+                for char in MATH_OPERATORS.intersection(text):
+                    for tool_name in self._operator_tools.get(char, []):
+                        detection.trigger(tool_name)
+            else:
+                for role, value in self._roles[text.lower()]:
+                    if role == "tool":
+                        detection.trigger(value)
+                    elif role == "language":
+                        if detection.language_rank is None or value < detection.language_rank:
+                            detection.language_rank = value
+                    elif role == "strip":
+                        detection.strip_spans.append(match.span())
+        return detection
+
+    def plan(self, message: str) -> List[Dict[str, Any]]:
+        """检测意图并生成工具调用计划（按工具注册顺序）"""
+        detection = self.detect(message)
+        tool_calls = []
+        for tool_name in self._tool_order:
+            if tool_name not in detection.tools:
+                continue
+            if tool_name == "weather":
+                # 每个城市一次查询（"上海和北京的天气"）
+                for city in self._find_cities(message):
+                    tool_calls.append({"tool": tool_name, "parameters": {"city": city}})
+                continue
+            parameters = self._extract_parameters(tool_name, message, detection)
+            if parameters is not None:
+                tool_calls.append({"tool": tool_name, "parameters": parameters})
+        return tool_calls
+
+    def _find_cities(self, message: str) -> List[str]:
+        """消息中出现的城市（按出现顺序去重，最多 WEATHER_MAX_CITIES 个）"""
+        names: List[str] = []
+        for city in self.gazetteer.find(message):
+            if city.name not in names:
+                names.append(city.name)
+        return names[:settings.WEATHER_MAX_CITIES]
+
+    def _extract_parameters(self, tool_name: str, message: str, detection: Detection) -> Optional[Dict[str, Any]]:
+        """从检测结果中提取工具参数，缺少必要参数时返回None"""
+        if tool_name == "calculator":
+            if detection.expressions:
+                return {"expression": detection.expressions[0]}
+            return None
+        if tool_name == "translate":
+            if not detection.quotes:
+                return None
+            target_lang = DEFAULT_TARGET_LANG
+            if detection.language_rank is not None:
+                target_lang = LANGUAGES[detection.language_rank][0]
+            if len(detection.quotes) > 1:
+                return {"texts": detection.quotes, "target_lang": target_lang}
+            return {"text": detection.quotes[0], "target_lang": target_lang}
+        if tool_name == "web_search":
+            query = self._strip_spans(message, detection.strip_spans).strip()
+            if query and len(query) > 2:
+                return {"query": query}
+            return None
+        return {}
+
+    @staticmethod
+    def _strip_spans(message: str, spans: List[Tuple[int, int]]) -> str:
+        """移除消息中的指定片段"""
+        if not spans:
+            return message
+        parts = []
+        position = 0
+        for start, end in spans:
+            parts.append(message[position:start])
+            position = end
+        parts.append(message[position:])
+        return "".join(parts)
@@ -0,0 +1,120 @@
+"""
+模型回复缓存 - 相同提示词直接复用回复
+
+键为最终消息列表与模型参数的哈希。只在结果可复用的场景启用：会话没有历史和摘要、
+不使用原生工具调用、模型温度不高于 LLM_CACHE_MAX_TEMPERATURE。工具结果已经拼进提示词，
+因此天气、时间等结果变化时键随之变化。
+"""
+import json
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from session import Session
+from tools.cache import TTLCache
+from metrics import LLM_CACHE_REQUESTS
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """进程内LRU + TTL的模型回复缓存，并合并同一键的并发未命中"""
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_temperature: Optional[float] = None
+    ):
+        self.enabled = settings.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.ttl = settings.LLM_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_temperature = settings.LLM_CACHE_MAX_TEMPERATURE if max_temperature is None else max_temperature
+        self.cache = TTLCache(max_entries or settings.LLM_CACHE_MAX_ENTRIES)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        if self.enabled and self.max_temperature < settings.DEEPSEEK_TEMPERATURE:
+            logger.warning(
+                "模型回复缓存已启用，但模型温度高于 LLM_CACHE_MAX_TEMPERATURE，不会缓存任何回复；"
+                "请同时调低 DEEPSEEK_TEMPERATURE 或调高 LLM_CACHE_MAX_TEMPERATURE",
+                extra={"temperature": settings.DEEPSEEK_TEMPERATURE, "max_temperature": self.max_temperature}
+            )
+
+    def key_for(self, session: Session, messages: List, function_calling: bool) -> Optional[str]:
+        """返回可缓存请求的键；不满足缓存条件时返回None"""
+        if not self.enabled:
+            return None
+        if function_calling or session.messages or session.summary or self.max_temperature < settings.DEEPSEEK_TEMPERATURE:
+            LLM_CACHE_REQUESTS.labels("bypass").inc()
+            return None
+        payload = json.dumps(
+            {
+                "model": settings.DEEPSEEK_MODEL,
+                "temperature": settings.DEEPSEEK_TEMPERATURE,
+                "max_tokens": settings.DEEPSEEK_MAX_TOKENS,
+                "messages": [list(message) for message in messages],
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """查询缓存的回复（key为None时不查询）"""
+        if key is None:
+            return None
+        response = self.cache.get(key)
+        LLM_CACHE_REQUESTS.labels("miss" if response is None else "hit").inc()
+        return response
+
+    def set(self, key: Optional[str], response: str):
+        """写入完整回复（空回复不缓存）"""
+        if key is not None and response:
+            self.cache.set(key, response, self.ttl)
+
+    async def get_or_invoke(self, key: Optional[str], invoke: Callable[[], Awaitable[str]]) -> str:
+        """命中时直接返回；未命中时调用模型，同一键的并发请求只调用一次"""
+        if key is None:
+            return await invoke()
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # 发起调用的请求被取消，由当前请求自己调用模型
+                return await invoke()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await invoke()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            self.set(key, response)
+            future.set_result(response)
+            return response
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+async def replay(response: str, chunk_chars: Optional[int] = None) -> AsyncIterator[str]:
+    """把缓存的完整回复按固定长度切块，供流式接口输出"""
+    chunk_chars = chunk_chars or settings.LLM_CACHE_REPLAY_CHUNK_CHARS
+    for start in range(0, len(response), chunk_chars):
+        yield response[start:start + chunk_chars]
@@ -0,0 +1,153 @@
+"""
+结构化日志 - 队列化的非阻塞日志管道
+
+业务代码只把日志记录放进有界队列（满了直接丢弃并计数），由后台线程格式化并写出，
+请求路径上不会因为stdout阻塞。每条日志带上当前请求ID；标记了 sampled 的高频日志
+按 LOG_SAMPLE_RATE 采样。
+
+    logger = logging.getLogger(__name__)
+    logger.info("收到聊天请求", extra={"session_id": session_id, "sampled": True})
+"""
+import sys
+import json
+import atexit
+import queue
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from config import settings
+
+
+# 当前请求ID（由app.py的中间件设置）
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord自带的属性，其余属性视为extra字段
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "sampled"}
+
+
+class ContextFilter(logging.Filter):
+    """在产生日志的协程中记录请求ID，并对高频日志采样"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            getattr(record, "sampled", False)
+            and record.levelno < logging.WARNING
+            and self.sample_rate < 1
+            and random.random() >= self.sample_rate
+        ):
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志而不是阻塞或报错"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只在当前线程展开消息和异常文本，格式化留给后台线程
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志输出一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于本地阅读的单行文本格式，extra字段以 key=value 附在末尾"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [
+            f"{key}={value}"
+            for key, value in record.__dict__.items()
+            if key not in _RESERVED and not key.startswith("_")
+        ]
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            fields.insert(0, f"request_id={request_id}")
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging():
+    """配置根日志器（重复调用无副作用）"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(ContextFilter(settings.LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.addHandler(_handler)
+    # 第三方库的逐请求日志太多，只保留警告
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    if _handler.dropped:
+        print(f"日志队列已满，共丢弃{_handler.dropped}条日志", file=sys.stderr)
+    _listener = None
+    _handler = None
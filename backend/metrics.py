@@ -0,0 +1,279 @@
+"""
+运行指标 - Prometheus文本格式的计数器、仪表和直方图
+
+METRICS_ENABLED 为 false 时所有指标都是空操作对象，埋点几乎没有开销。
+每个worker进程单独统计。
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+from config import settings
+
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Timer:
+    """计时上下文管理器，退出时把耗时记入直方图"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标"""
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values: str) -> "_Metric":
+        """获取指定标签值的子指标"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.description)
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], "_Metric"]]:
+        if self.labelnames:
+            return sorted(self._children.items())
+        return [((), self)]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for values, metric in self._series():
+            lines.extend(metric._render_samples(self.labelnames, values))
+        return lines
+
+    def _render_samples(self, names: Sequence[str], values: Sequence[str]) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def _render_samples(self, names, values):
+        return [f"{self.name}{_format_labels(names, values)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def _render_samples(self, names, values):
+        return [f"{self.name}{_format_labels(names, values)} {_format_value(self.value)}"]
+
+
+class Histogram(_Metric):
+    """直方图（固定分桶，输出累计计数、总和与样本数）"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.description, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        """用 with 语句计时"""
+        return _Timer(self)
+
+    def _render_samples(self, names, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            labels = _format_labels(names, values, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{labels} {self.count}")
+        return lines
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _NullMetric:
+    """指标关闭时使用的空操作对象"""
+
+    __slots__ = ()
+    _timer = _NullTimer()
+
+    def labels(self, *values):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return self._timer
+
+
+_NULL_METRIC = _NullMetric()
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric):
+        if not self.enabled:
+            return _NULL_METRIC
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labelnames))
+
+    def gauge(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        """输出Prometheus文本格式（0.0.4）"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+registry = MetricsRegistry(settings.METRICS_ENABLED)
+
+# 请求
+CHAT_REQUEST_SECONDS = registry.histogram("chat_request_seconds", "聊天请求总耗时（秒）", ["endpoint"])
+ACTIVE_STREAMS = registry.gauge("chat_active_streams", "进行中的流式响应数")
+STREAM_REJECTIONS = registry.counter("chat_stream_rejections_total", "超过并发上限被拒绝（429）的流式请求数")
+STREAM_CANCELLATIONS = registry.counter(
+    "chat_stream_cancellations_total", "中途取消的流式响应数（disconnect / send_timeout）", ["reason"]
+)
+STREAM_CANCELLED_TOKENS = registry.counter(
+    "chat_stream_cancelled_tokens_total", "取消的流式响应中模型已生成 / 估计未生成（节省）的输出token数", ["kind"]
+)
+
+# 处理阶段：intent_detection / tool_execution / prompt_build
+STAGE_SECONDS = registry.histogram("chat_stage_seconds", "聊天处理各阶段耗时（秒）", ["stage"])
+
+# 模型调用
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_time_to_first_token_seconds", "模型首个输出块的等待时间（秒）", ["mode"]
+)
+LLM_REQUEST_SECONDS = registry.histogram("llm_request_seconds", "模型调用总耗时（秒）", ["mode"])
+LLM_CACHE_REQUESTS = registry.counter("llm_cache_requests_total", "模型回复缓存查询次数（hit / miss / bypass）", ["result"])
+SEMANTIC_CACHE_REQUESTS = registry.counter("semantic_cache_requests_total", "语义缓存查询次数（hit / miss / bypass）", ["result"])
+
+# 工具
+TOOL_SECONDS = registry.histogram("tool_execution_seconds", "单个工具调用耗时（秒，含缓存命中）", ["tool"])
+TOOL_ERRORS = registry.counter("tool_errors_total", "工具调用失败次数", ["tool", "reason"])
+TOOL_CACHE_REQUESTS = registry.counter("tool_cache_requests_total", "工具结果缓存查询次数", ["tool", "result"])
+TOOL_UPSTREAM_EVENTS = registry.counter(
+    "tool_upstream_events_total", "上游容错事件次数（rejected / timeout / hedged / stale）", ["tool", "event"]
+)
+TOOL_CIRCUIT_OPEN = registry.gauge("tool_circuit_open", "上游熔断器是否打开（1为打开）", ["tool"])
+WEATHER_REFRESHES = registry.counter("weather_refreshes_total", "热门城市天气后台刷新次数（success / failure）", ["result"])
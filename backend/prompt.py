@@ -0,0 +1,88 @@
+"""
+提示词组装 - chat 与 chat_stream 共用
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from context import ContextBuilder
+from session import Session
+from tools.manager import ToolManager
+
+
+SYSTEM_PROMPT = """你是一个智能助手，可以使用各种工具来帮助用户。当用户询问需要工具支持的问题时，请基于工具执行结果来回答。
+
+如果检测到用户需要工具支持（如计算、查询时间、天气、翻译等），请使用工具结果来提供准确的回答。
+
+请用友好、自然的语气回答，并在适当时候使用工具结果。"""
+
+
+class PromptBuilder:
+    """增量提示词构建器
+
+    历史对话由ContextBuilder按会话增量渲染（每条消息只渲染一次），
+    工具目录按ToolManager的注册版本缓存，每轮只拼接本轮新增的内容。
+    """
+
+    def __init__(self, tool_manager: ToolManager, context_builder: ContextBuilder):
+        self.tool_manager = tool_manager
+        self.context_builder = context_builder
+        self._tool_catalog: Optional[str] = None
+        self._tool_catalog_version = -1
+
+    def tool_catalog(self) -> str:
+        """渲染可用工具目录（工具注册变化时才重新渲染）"""
+        if self._tool_catalog is None or self._tool_catalog_version != self.tool_manager.version:
+            lines = ["可用工具:"]
+            for tool in self.tool_manager.get_available_tools():
+                lines.append(f"- {tool['name']}: {tool['description']}")
+            self._tool_catalog = "\n".join(lines)
+            self._tool_catalog_version = self.tool_manager.version
+        return self._tool_catalog
+
+    async def build(
+        self,
+        session: Session,
+        user_message: str,
+        tools_used: List[Dict[str, Any]],
+        use_tools: bool = True
+    ) -> List[Tuple[str, str]]:
+        """构建发送给模型的消息列表"""
+        return self.complete(await self.build_prefix(session, use_tools), user_message, tools_used)
+
+    async def build_prefix(self, session: Session, use_tools: bool = True) -> List[str]:
+        """构建与本轮工具结果无关的部分（摘要、历史对话、工具目录），可以与工具执行并行"""
+        summary, history = await self.context_builder.build(session)
+
+        parts = []
+        # 较早的对话以摘要形式提供
+        if summary:
+            parts.append(f"之前的对话摘要: {summary}\n")
+        if history:
+            parts.append(history)
+
+        # 添加工具信息到上下文
+        if use_tools:
+            parts.append(f"\n{self.tool_catalog()}\n")
+        return parts
+
+    def complete(
+        self,
+        prefix: List[str],
+        user_message: str,
+        tools_used: List[Dict[str, Any]]
+    ) -> List[Tuple[str, str]]:
+        """在前缀后追加本轮的工具结果和用户消息"""
+        parts = list(prefix)
+
+        # 如果有工具结果，添加到上下文中
+        if tools_used:
+            parts.append("\n工具执行结果:")
+            for tool in tools_used:
+                parts.append(f"- {tool['tool']}: {tool['result']}")
+            parts.append("")
+
+        # 添加当前用户消息
+        parts.append(f"用户: {user_message}\n助手:")
+
+        return [
+            ("system", SYSTEM_PROMPT),
+            ("human", "\n".join(parts))
+        ]
@@ -0,0 +1,193 @@
+"""
+语义缓存 - 近似重复的首轮问题复用已有回答
+
+用户消息规范化后由哈希向量化器编码为定长向量（字符1~3元组，无需下载模型），
+存入NumPy矩阵；查询时与全部条目做一次矩阵乘法求余弦相似度，超过阈值即返回缓存的回答。
+只有规划出的工具调用完全相同（工具名 + 规范化参数）的条目才参与匹配，
+计算、翻译等参数不同的问题不会互相命中；天气、时间等结果随时间变化的工具直接绕过缓存。
+字符n元组对数字和否定词几乎不敏感（"25岁"与"35岁"、问题与其否定形式相似度都在0.85以上），
+因此消息中的数字和否定词个数也计入分组，必须完全一致才会匹配。
+字符n元组也分不清只差一两个字的不同问题（"猫为什么怕水"与"狗为什么怕水"为0.81），默认阈值0.85
+只命中语气词、标点、大小写之类的表面差异；需要命中改写句时应传入真正的语义编码器（vectorizer）。
+
+依赖NumPy（可选），未安装时语义缓存自动关闭。
+"""
+import re
+import time
+import zlib
+import logging
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+from session import Session
+from metrics import SEMANTIC_CACHE_REQUESTS
+from config import settings
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[\W_]+")
+# 阿拉伯数字和中文数字（单独的"一"多为量词用法，如"一下"、"一个"，不计入）
+_NUMBER = re.compile(r"\d+(?:\.\d+)?|[零一二两三四五六七八九十百千万亿]{2,}|[零二两三四五六七八九十百千万亿]")
+_NEGATION = re.compile(r"[不没沒非无無未别別勿莫]|\b(?:not|no|never|none|nothing|nobody)\b|n't")
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、转小写，去掉空白和标点"""
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def guard_terms(text: str) -> str:
+    """消息中必须完全一致才能互相命中的部分：按出现顺序的数字，以及否定词个数"""
+    text = unicodedata.normalize("NFKC", text).lower().replace("’", "'")
+    numbers = _NUMBER.findall(text)
+    return " ".join(numbers) + f"|neg={len(_NEGATION.findall(text))}"
+
+
+class HashingVectorizer:
+    """字符n元组哈希向量化器（带符号哈希，L2归一化）
+
+    crc32 在不同进程间结果一致，多worker编码出的向量可以互相比较。
+    """
+
+    NGRAM_WEIGHTS = ((1, 1.0), (2, 1.0), (3, 0.5))
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def encode(self, text: str) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = normalize_text(text)
+        for n, weight in self.NGRAM_WEIGHTS:
+            for start in range(len(text) - n + 1):
+                digest = zlib.crc32(text[start:start + n].encode("utf-8"))
+                vector[digest % self.dim] += weight if digest & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """定容向量索引：预分配矩阵，满了淘汰最久未命中的条目"""
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.groups = np.zeros(capacity, dtype=np.int64)
+        self.expires_at = np.full(capacity, -np.inf)
+        self.last_used = np.zeros(capacity)
+        self.payloads: List[Any] = [None] * capacity
+        self.size = 0
+
+    def add(self, vector: "np.ndarray", group: int, payload: Any, ttl: float):
+        """写入一个条目（group相同的条目之间才会匹配）"""
+        now = time.monotonic()
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            expired = np.flatnonzero(self.expires_at <= now)
+            slot = int(expired[0]) if expired.size else int(np.argmin(self.last_used))
+        self.vectors[slot] = vector
+        self.groups[slot] = group
+        self.expires_at[slot] = now + ttl
+        self.last_used[slot] = now
+        self.payloads[slot] = payload
+
+    def search(self, vector: "np.ndarray", group: int) -> Tuple[Optional[Any], float]:
+        """返回同组未过期条目中最相似的一个及其相似度"""
+        if not self.size:
+            return None, 0.0
+        now = time.monotonic()
+        scores = self.vectors[:self.size] @ vector
+        valid = (self.groups[:self.size] == group) & (self.expires_at[:self.size] > now)
+        scores = np.where(valid, scores, -np.inf)
+        slot = int(np.argmax(scores))
+        if not valid[slot]:
+            return None, 0.0
+        self.last_used[slot] = now
+        return self.payloads[slot], float(scores[slot])
+
+    def clear(self):
+        self.expires_at[:] = -np.inf
+        self.payloads = [None] * self.capacity
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class SemanticCache:
+    """首轮问题的语义缓存"""
+
+    def __init__(
+        self,
+        enabled: Optional[bool] = None,
+        threshold: Optional[float] = None,
+        capacity: Optional[int] = None,
+        dim: Optional[int] = None,
+        ttl: Optional[float] = None,
+        vectorizer=None
+    ):
+        self.enabled = settings.SEMANTIC_CACHE_ENABLED if enabled is None else enabled
+        if self.enabled and np is None:
+            logger.warning("未安装numpy，语义缓存已关闭")
+            self.enabled = False
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = settings.SEMANTIC_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.bypass_tools = set(settings.SEMANTIC_CACHE_BYPASS_TOOLS)
+        self.vectorizer = None
+        self.index = None
+        if self.enabled:
+            dim = dim or settings.SEMANTIC_CACHE_DIM
+            self.vectorizer = vectorizer or HashingVectorizer(dim)
+            self.index = VectorIndex(capacity or settings.SEMANTIC_CACHE_CAPACITY, dim)
+
+    def key_for(
+        self,
+        session: Session,
+        user_message: str,
+        tool_keys: List[str],
+        use_tools: bool,
+        function_calling: bool
+    ) -> Optional[Tuple["np.ndarray", int]]:
+        """返回可缓存请求的 (向量, 分组)；不满足缓存条件时返回None
+
+        tool_keys 为本轮规划出的工具调用去重键（"工具名:参数"），与 use_tools、
+        消息中的数字和否定词个数一起决定分组。
+        """
+        if not self.enabled:
+            return None
+        if (
+            function_calling
+            or session.messages
+            or session.summary
+            or any(key.split(":", 1)[0] in self.bypass_tools for key in tool_keys)
+        ):
+            SEMANTIC_CACHE_REQUESTS.labels("bypass").inc()
+            return None
+        group = zlib.crc32(
+            "\n".join([str(use_tools), guard_terms(user_message)] + sorted(tool_keys)).encode("utf-8")
+        )
+        return self.vectorizer.encode(user_message), group
+
+    def get(self, key: Optional[Tuple["np.ndarray", int]]) -> Optional[Dict[str, Any]]:
+        """查询相似度超过阈值的缓存回答"""
+        if key is None:
+            return None
+        payload, score = self.index.search(*key)
+        hit = payload is not None and score >= self.threshold
+        SEMANTIC_CACHE_REQUESTS.labels("hit" if hit else "miss").inc()
+        return payload if hit else None
+
+    def set(self, key: Optional[Tuple["np.ndarray", int]], response: str, tools_used: List[Dict[str, Any]]):
+        """写入回答（空回答不缓存）"""
+        if key is not None and response:
+            vector, group = key
+            self.index.add(vector, group, {"response": response, "tools_used": tools_used}, self.ttl)
+
+    def clear(self):
+        if self.index is not None:
+            self.index.clear()
@@ -0,0 +1,262 @@
+"""
+会话存储 - 按会话ID隔离的对话记忆
+"""
+import os
+import time
+import logging
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain.memory import ConversationBufferMemory
+from storage import ConversationStore, Record, WriteBehindQueue, create_conversation_store
+from shared_state import SharedStateBackend, get_shared_state
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """单个会话的对话记忆"""
+
+    def __init__(self, session_id: str, max_messages: int, writer: Optional[WriteBehindQueue] = None):
+        self.session_id = session_id
+        self.max_messages = max_messages
+        # 持久化队列（为None时只保存在内存中）
+        self.writer = writer
+        self.memory = ConversationBufferMemory()
+        # 滚动摘要：messages[:summarized_count] 已折叠进 summary
+        self.summary = ""
+        self.summarized_count = 0
+        self.summary_lock = asyncio.Lock()
+        self.trimmed_count = 0
+        # 增量渲染缓存（由ContextBuilder维护）
+        self.history_cache = None
+        # 已同步到的共享版本号（其他worker写入后版本号变化，内存中的副本需重新加载）
+        self.version = 0
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+
+    @property
+    def messages(self) -> List:
+        """会话中的全部消息"""
+        return self.memory.chat_memory.messages
+
+    def add_user_message(self, content: str):
+        """添加用户消息"""
+        self.memory.chat_memory.add_user_message(content)
+        self._persist("message", "user", content)
+        self._trim()
+
+    def add_ai_message(self, content: str):
+        """添加AI消息"""
+        self.memory.chat_memory.add_ai_message(content)
+        self._persist("message", "assistant", content)
+        self._trim()
+
+    def clear(self):
+        """清空会话记忆"""
+        self.memory.clear()
+        self.summary = ""
+        self.summarized_count = 0
+        self.history_cache = None
+        self._persist("clear")
+
+    def _persist(self, kind: str, role: Optional[str] = None, content: Optional[str] = None):
+        """把变更写入持久化队列"""
+        if self.writer is not None:
+            self.writer.submit(Record(self.session_id, kind, role, content, time.time()))
+
+    def _trim(self):
+        """超出单会话消息上限时丢弃最早的消息
+
+        只丢弃已折叠进摘要的消息；尚未折叠的由ContextBuilder在下一次构建上下文时折叠，之后再丢弃，
+        避免短消息组成的对话（一直没有超出token预算）丢失历史。
+        """
+        overflow = min(len(self.messages) - self.max_messages, self.summarized_count)
+        if overflow > 0:
+            del self.messages[:overflow]
+            self.summarized_count = max(0, self.summarized_count - overflow)
+            self.trimmed_count += overflow
+
+
+class SessionStore:
+    """会话存储（LRU + TTL淘汰，可选持久化）
+
+    启用持久化时，消息经写后队列批量写入存储；内存中没有的会话在首次访问时
+    才从存储加载，被淘汰的会话下次访问时重新加载。每批写入后递增共享状态中的
+    会话版本号，多worker部署时据此发现其他进程的写入并重新加载。
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        store: Optional[ConversationStore] = None,
+        shared_state: Optional[SharedStateBackend] = None
+    ):
+        self.max_sessions = max_sessions or settings.SESSION_MAX_SESSIONS
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SESSION_TTL_SECONDS
+        self.max_messages = max_messages or settings.SESSION_MAX_MESSAGES
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        if store is None:
+            store = create_conversation_store()
+        self.store = store
+        self.shared_state = shared_state if shared_state is not None else get_shared_state()
+        self.writer = WriteBehindQueue(store, on_written=self._on_written) if store is not None else None
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._compact_task: Optional[asyncio.Task] = None
+
+    def get(self, session_id: str) -> Session:
+        """获取内存中的会话，不存在则创建（不读取存储）"""
+        self._evict_expired()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._add(Session(session_id, self.max_messages, self.writer))
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_access = time.monotonic()
+        return session
+
+    async def load(self, session_id: str, create: bool = True) -> Optional[Session]:
+        """获取会话，内存中没有时从存储加载；create为False且会话不存在时返回None"""
+        self._evict_expired()
+        if self.store is None:
+            return self.get(session_id) if create or session_id in self._sessions else None
+        session = self._sessions.get(session_id)
+        if session is not None:
+            if session.version == await self._shared_version(session_id):
+                return self.get(session_id)
+            # 其他worker写入过该会话，丢弃内存副本后重新加载
+            self._sessions.pop(session_id, None)
+
+        # 同一会话的并发加载只读取一次存储
+        loading = self._loading.get(session_id)
+        if loading is None:
+            loading = asyncio.get_running_loop().create_future()
+            self._loading[session_id] = loading
+            try:
+                # 被淘汰的会话可能还有未写入的记录，先等写入完成
+                if self.writer.has_pending(session_id):
+                    await self.writer.flush()
+                version = await self._shared_version(session_id)
+                rows = await asyncio.to_thread(self.store.load, session_id, self.max_messages)
+                loading.set_result((version, rows))
+            except BaseException as e:
+                loading.set_exception(e)
+                raise
+            finally:
+                self._loading.pop(session_id, None)
+        version, rows = await loading
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not rows and not create:
+                return None
+            session = Session(session_id, self.max_messages)
+            for role, content in rows:
+                if role == "user":
+                    session.memory.chat_memory.add_user_message(content)
+                else:
+                    session.memory.chat_memory.add_ai_message(content)
+            session.version = version
+            session.writer = self.writer
+            self._add(session)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_access = time.monotonic()
+        return session
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """查看会话但不创建、不刷新访问时间"""
+        self._evict_expired()
+        return self._sessions.get(session_id)
+
+    def delete(self, session_id: str):
+        """删除会话（持久化时写入清空标记）"""
+        self._sessions.pop(session_id, None)
+        if self.writer is not None:
+            self.writer.submit(Record(session_id, "clear", None, None, time.time()))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def start(self):
+        """启动写后队列和定期压缩任务（应用启动时调用）"""
+        if self.store is None:
+            return
+        self.writer.start()
+        if settings.CONVERSATION_COMPACT_INTERVAL_SECONDS > 0:
+            self._compact_task = asyncio.create_task(self._compact_periodically())
+
+    async def close(self):
+        """写完缓冲中的记录并关闭存储（应用关闭时调用）"""
+        if self.store is None:
+            return
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            try:
+                await self._compact_task
+            except asyncio.CancelledError:
+                pass
+            self._compact_task = None
+        await self.writer.stop()
+        self.store.close()
+
+    async def compact(self) -> int:
+        """压缩存储中的对话日志，返回删除的记录数"""
+        if self.store is None:
+            return 0
+        await self.writer.flush()
+        return await asyncio.to_thread(
+            self.store.compact,
+            settings.CONVERSATION_RETENTION_DAYS * 86400,
+            self.max_messages
+        )
+
+    async def _shared_version(self, session_id: str) -> int:
+        return await self.shared_state.aget(f"session_version:{session_id}") or 0
+
+    async def _on_written(self, session_ids):
+        """一批记录写入存储后递增会话版本号"""
+        for session_id in session_ids:
+            version = await self.shared_state.aincr(f"session_version:{session_id}")
+            session = self._sessions.get(session_id)
+            # 期间没有其他worker写入时，内存副本仍是最新的
+            if session is not None and session.version == version - 1:
+                session.version = version
+
+    async def _compact_periodically(self):
+        interval = settings.CONVERSATION_COMPACT_INTERVAL_SECONDS
+        while True:
+            try:
+                # 多worker部署时每个周期只由抢到租约的进程执行压缩
+                deleted = 0
+                if await self.shared_state.aadd("lease:conversation_compact", os.getpid(), ttl=interval * 0.9):
+                    deleted = await self.compact()
+                if deleted:
+                    logger.info("对话日志压缩完成", extra={"deleted": deleted})
+            except Exception as e:
+                logger.exception("对话日志压缩失败")
+            await asyncio.sleep(interval)
+
+    def _add(self, session: Session) -> Session:
+        self._sessions[session.session_id] = session
+        self._evict_overflow()
+        return session
+
+    def _evict_expired(self):
+        """淘汰过期会话（按访问顺序从最久未访问的开始）"""
+        if self.ttl_seconds <= 0:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_access > deadline:
+                break
+            self._sessions.popitem(last=False)
+
+    def _evict_overflow(self):
+        """超出会话数上限时淘汰最久未访问的会话"""
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
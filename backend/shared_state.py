@@ -0,0 +1,297 @@
+"""
+跨进程共享状态 - 多worker部署时共享工具缓存、会话版本号和定时任务租约
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+from config import settings
+
+
+class SharedStateBackend(ABC):
+    """共享键值存储接口（语义参照Redis，值须可JSON序列化，ttl单位为秒）
+
+    事件循环中应使用 a 开头的异步方法：blocking 为True的实现（磁盘IO、等待其他进程的写锁）
+    在线程池中执行，不阻塞事件循环。
+    """
+
+    # 操作是否可能阻塞
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的值，不存在时返回None"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """写入值（对应 SET key value EX ttl）"""
+        pass
+
+    @abstractmethod
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """仅在键不存在时写入，返回是否写入成功（对应 SET key value NX EX ttl）"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        """删除键"""
+        pass
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1) -> int:
+        """原子递增计数器，返回递增后的值"""
+        pass
+
+    @abstractmethod
+    def count(self, prefix: str = "") -> int:
+        """统计指定前缀下未过期的键数"""
+        pass
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        """删除指定前缀下的全部键"""
+        pass
+
+    @abstractmethod
+    def trim(self, prefix: str, max_keys: int) -> int:
+        """删除指定前缀下的过期键，键数仍超过max_keys时删除最早过期的键，返回删除的键数"""
+        pass
+
+    def close(self):
+        """释放资源"""
+        pass
+
+    async def _call(self, method, *args, **kwargs):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self._call(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._call(self.set, key, value, ttl)
+
+    async def aadd(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._call(self.add, key, value, ttl)
+
+    async def adelete(self, key: str):
+        await self._call(self.delete, key)
+
+    async def aincr(self, key: str, amount: int = 1) -> int:
+        return await self._call(self.incr, key, amount)
+
+    async def atrim(self, prefix: str, max_keys: int) -> int:
+        return await self._call(self.trim, prefix, max_keys)
+
+
+class InMemorySharedState(SharedStateBackend):
+    """单进程实现（单worker部署时使用）"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Optional[float], Any]] = {}
+
+    def _live(self, key: str) -> Optional[Tuple[Optional[float], Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._live(key)
+        return None if entry is None else entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._entries[key] = (time.time() + ttl if ttl else None, value)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        entry = self._live(key)
+        value = (entry[1] if entry is not None else 0) + amount
+        self._entries[key] = (entry[0] if entry is not None else None, value)
+        return value
+
+    def count(self, prefix: str = "") -> int:
+        return sum(1 for key in list(self._entries) if key.startswith(prefix) and self._live(key) is not None)
+
+    def clear(self, prefix: str = ""):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def trim(self, prefix: str, max_keys: int) -> int:
+        keys = [key for key in list(self._entries) if key.startswith(prefix)]
+        live = [key for key in keys if self._live(key) is not None]
+        overflow = sorted(live, key=lambda key: self._entries[key][0] or float("inf"))[:max(len(live) - max_keys, 0)]
+        for key in overflow:
+            del self._entries[key]
+        return len(keys) - len(live) + len(overflow)
+
+
+class SQLiteSharedState(SharedStateBackend):
+    """基于SQLite（WAL模式）的跨进程实现，同一台机器上的多个worker共用一个数据库文件"""
+
+    blocking = True
+
+    # 每写入多少次清理一次过期键
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self._writes = 0
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def _maybe_purge(self):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, self._expiry(ttl))
+            )
+            self._maybe_purge()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+                WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?
+                """,
+                (key, data, self._expiry(ttl), now)
+            )
+            return cursor.rowcount > 0
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            # BEGIN IMMEDIATE 先拿写锁，读-改-写期间其他进程无法写入
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                    (key, time.time())
+                ).fetchone()
+                value = (json.loads(row[0]) if row is not None else 0) + amount
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), row[1] if row is not None else None)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def count(self, prefix: str = "") -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM kv WHERE substr(key, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (len(prefix), prefix, time.time())
+            ).fetchone()
+        return row[0]
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def trim(self, prefix: str, max_keys: int) -> int:
+        scope = "substr(key, 1, ?) = ?"
+        with self._lock:
+            deleted = self._conn.execute(
+                f"DELETE FROM kv WHERE {scope} AND expires_at IS NOT NULL AND expires_at <= ?",
+                (len(prefix), prefix, time.time())
+            ).rowcount
+            overflow = self._conn.execute(f"SELECT COUNT(*) FROM kv WHERE {scope}", (len(prefix), prefix)).fetchone()[0] - max_keys
+            if overflow > 0:
+                # 永不过期的键排在最后
+                deleted += self._conn.execute(
+                    f"""
+                    DELETE FROM kv WHERE key IN (
+                        SELECT key FROM kv WHERE {scope} ORDER BY expires_at IS NULL, expires_at LIMIT ?
+                    )
+                    """,
+                    (len(prefix), prefix, overflow)
+                ).rowcount
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_shared_state() -> SharedStateBackend:
+    """按配置创建共享状态后端"""
+    if settings.SHARED_STATE_BACKEND == "memory":
+        return InMemorySharedState()
+    if settings.SHARED_STATE_BACKEND == "sqlite":
+        return SQLiteSharedState(settings.SHARED_STATE_DB_PATH)
+    raise ValueError(f"未知的共享状态后端: {settings.SHARED_STATE_BACKEND}")
+
+
+# 全局共享状态实例
+_shared_state: Optional[SharedStateBackend] = None
+
+
+def get_shared_state() -> SharedStateBackend:
+    """获取全局共享状态"""
+    global _shared_state
+    if _shared_state is None:
+        _shared_state = create_shared_state()
+    return _shared_state
+
+
+def close_shared_state():
+    """关闭全局共享状态（应用关闭时调用）"""
+    global _shared_state
+    if _shared_state is not None:
+        _shared_state.close()
+        _shared_state = None
@@ -1,22 +1,64 @@
 """
 启动脚本
+
+开发模式（默认）: python start.py                 单进程，代码修改后自动重载
+生产模式:         python start.py --prod [--workers N]  多worker，无重载，优雅关闭
 """
+import os
+import argparse
 import uvicorn
 from config import settings
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="启动智能对话Agent API")
+    parser.add_argument("--prod", action="store_true", help="生产模式：多worker、关闭自动重载")
+    parser.add_argument("--workers", type=int, default=None, help=f"worker进程数（默认 {settings.SERVER_WORKERS}）")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    return parser.parse_args()
+
+
+def prepare_workers(workers: int):
+    """多worker时各进程需要共享状态和持久化对话，环境变量会传给worker进程"""
+    if workers <= 1:
+        return
+    if settings.SHARED_STATE_BACKEND == "memory":
+        os.environ["SHARED_STATE_BACKEND"] = "sqlite"
+        print("ℹ️  多worker模式：共享状态后端切换为 sqlite")
+    if settings.CONVERSATION_STORE == "memory":
+        print("⚠️  CONVERSATION_STORE=memory 时各worker的对话记忆互不可见，建议使用 sqlite")
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    workers = (args.workers or settings.SERVER_WORKERS) if args.prod else 1
+
     print("🚀 启动智能对话Agent API...")
     print(f"📝 应用标题: {settings.APP_TITLE}")
     print(f"📋 应用描述: {settings.APP_DESCRIPTION}")
     print(f"🔧 版本: {settings.APP_VERSION}")
-    print(f"🌐 文档地址: http://localhost:8000/docs")
-    print(f"📊 健康检查: http://localhost:8000/health")
+    print(f"⚙️  运行模式: {'生产' if args.prod else '开发'}（{workers} 个worker）")
+    print(f"🌐 文档地址: http://localhost:{args.port}/docs")
+    print(f"📊 健康检查: http://localhost:{args.port}/health")
     print("-" * 50)
-    
-    uvicorn.run(
-        "app:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+
+    if args.prod:
+        prepare_workers(workers)
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            reload=False,
+            timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info"
+        )
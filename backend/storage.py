@@ -0,0 +1,214 @@
+"""
+对话持久化 - 可插拔的存储后端（SQLite追加日志）和写后缓冲队列
+"""
+import os
+import time
+import logging
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Set, Tuple
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Record(NamedTuple):
+    """追加日志中的一条记录：kind为message（一条消息）或clear（清空标记）"""
+    session_id: str
+    kind: str
+    role: Optional[str]
+    content: Optional[str]
+    created_at: float
+
+
+class ConversationStore(ABC):
+    """对话存储后端接口（同步实现，由调用方放到线程池中执行）"""
+
+    @abstractmethod
+    def append(self, records: List[Record]):
+        """批量追加记录"""
+        pass
+
+    @abstractmethod
+    def load(self, session_id: str, limit: int) -> List[Tuple[str, str]]:
+        """读取会话最近一次清空之后的最多limit条消息，返回 (role, content) 列表"""
+        pass
+
+    @abstractmethod
+    def compact(self, retention_seconds: float, max_messages: int) -> int:
+        """压缩日志：丢弃清空标记之前的记录、过期会话和超出上限的旧消息，返回删除的记录数"""
+        pass
+
+    @abstractmethod
+    def close(self):
+        """关闭存储"""
+        pass
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite追加日志：只插入不更新，清空会话时写入一条clear标记"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                role TEXT,
+                content TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (session_id, id);
+        """)
+        self._conn.commit()
+
+    def append(self, records: List[Record]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO turns (session_id, kind, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                records
+            )
+
+    def load(self, session_id: str, limit: int) -> List[Tuple[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT role, content FROM turns
+                WHERE session_id = ? AND kind = 'message'
+                  AND id > COALESCE(
+                      (SELECT MAX(id) FROM turns WHERE session_id = ? AND kind = 'clear'), 0)
+                ORDER BY id DESC LIMIT ?
+                """,
+                (session_id, session_id, limit)
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    def compact(self, retention_seconds: float, max_messages: int) -> int:
+        with self._lock, self._conn:
+            deleted = 0
+            # 最近一次清空标记及之前的记录不再需要
+            deleted += self._conn.execute("""
+                DELETE FROM turns WHERE id <= (
+                    SELECT MAX(t.id) FROM turns t
+                    WHERE t.session_id = turns.session_id AND t.kind = 'clear')
+            """).rowcount
+            # 长时间没有新消息的会话整体删除
+            if retention_seconds > 0:
+                deleted += self._conn.execute("""
+                    DELETE FROM turns WHERE session_id IN (
+                        SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?)
+                """, (time.time() - retention_seconds,)).rowcount
+            # 每个会话只保留最近max_messages条（与内存中的上限一致）
+            deleted += self._conn.execute("""
+                DELETE FROM turns WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS position
+                        FROM turns)
+                    WHERE position > ?)
+            """, (max_messages,)).rowcount
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindQueue:
+    """写后缓冲：请求路径只入队，后台任务按批量/时间窗口在线程池中写入存储"""
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        on_written: Optional[Callable[[Set[str]], Awaitable[None]]] = None
+    ):
+        self.store = store
+        self.on_written = on_written
+        self.batch_size = batch_size or settings.CONVERSATION_WRITE_BATCH_SIZE
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.CONVERSATION_FLUSH_INTERVAL_MS / 1000
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Counter = Counter()
+
+    def start(self):
+        """启动后台写入任务（首次入队时也会自动启动）"""
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, record: Record):
+        """记录入队（不等待写入）"""
+        self.start()
+        self._pending[record.session_id] += 1
+        self._queue.put_nowait(record)
+
+    def has_pending(self, session_id: str) -> bool:
+        """会话是否还有尚未写入的记录"""
+        return self._pending[session_id] > 0
+
+    async def flush(self):
+        """等待已入队的记录全部写入"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def stop(self):
+        """写完剩余记录后停止后台任务"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self.store.append, batch)
+                if self.on_written is not None:
+                    await self.on_written({record.session_id for record in batch})
+            except Exception as e:
+                logger.error("对话记录写入失败", extra={"dropped": len(batch), "error": str(e)})
+            finally:
+                for record in batch:
+                    self._pending[record.session_id] -= 1
+                    if self._pending[record.session_id] <= 0:
+                        del self._pending[record.session_id]
+                    self._queue.task_done()
+
+
+def create_conversation_store() -> Optional[ConversationStore]:
+    """按配置创建对话存储，memory表示不持久化"""
+    if settings.CONVERSATION_STORE == "sqlite":
+        return SQLiteConversationStore(settings.CONVERSATION_DB_PATH)
+    if settings.CONVERSATION_STORE == "memory":
+        return None
+    raise ValueError(f"未知的对话存储类型: {settings.CONVERSATION_STORE}")
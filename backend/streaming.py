@@ -0,0 +1,216 @@
+"""
+流式输出工具函数
+"""
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from metrics import STREAM_CANCELLATIONS
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """编码一个SSE事件（保留非ASCII字符，避免\\uXXXX转义放大字节数）"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[str],
+    max_chars: Optional[int] = None,
+    max_delay: Optional[float] = None
+) -> AsyncIterator[str]:
+    """按大小/时间窗口合并模型输出的文本块
+
+    max_chars 为0且 max_delay 为0时直接透传每个块；否则缓冲区达到 max_chars
+    个字符或距离上次发送超过 max_delay 秒时发送一次。
+    """
+    max_chars = settings.STREAM_COALESCE_CHARS if max_chars is None else max_chars
+    max_delay = settings.STREAM_COALESCE_MS / 1000 if max_delay is None else max_delay
+
+    if max_chars <= 0 and max_delay <= 0:
+        async for text in source:
+            if text:
+                yield text
+        return
+
+    # 由后台任务读取上游，便于在等待期间按时间窗口发送；
+    # 队列有上限，客户端读得慢时缓冲满即暂停读取上游（背压）
+    queue: asyncio.Queue = asyncio.Queue(settings.STREAM_SEND_BUFFER)
+    done = object()
+
+    async def pump():
+        # 被取消时不再写入（队列可能已满且没有读取方）
+        try:
+            async for text in source:
+                await queue.put(text)
+            await queue.put(done)
+        except Exception as e:
+            await queue.put(e)
+
+    task = asyncio.create_task(pump())
+    buffer = []
+    buffered = 0
+    last_flush = time.monotonic()
+    try:
+        while True:
+            timeout = None
+            if buffer and max_delay > 0:
+                timeout = max(0.0, last_flush + max_delay - time.monotonic())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+
+            if item is done or isinstance(item, Exception):
+                if buffer:
+                    yield "".join(buffer)
+                if isinstance(item, Exception):
+                    raise item
+                return
+
+            if item:
+                buffer.append(item)
+                buffered += len(item)
+
+            expired = max_delay > 0 and time.monotonic() - last_flush >= max_delay
+            if buffer and ((max_chars > 0 and buffered >= max_chars) or expired or item is None):
+                yield "".join(buffer)
+                buffer = []
+                buffered = 0
+                last_flush = time.monotonic()
+    finally:
+        task.cancel()
+
+
+class StreamLimiter:
+    """流式响应并发上限
+
+    名额用完时最多排队等待 queue_timeout 秒（排队数不超过 queue_max），仍没有名额则拒绝。
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        queue_max: Optional[int] = None
+    ):
+        self.limit = settings.MAX_CONCURRENT_STREAMS if limit is None else limit
+        self.queue_timeout = settings.STREAM_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.queue_max = settings.STREAM_QUEUE_MAX if queue_max is None else queue_max
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(self.limit) if self.limit > 0 else None
+
+    async def acquire(self) -> bool:
+        """获取一个名额，拒绝时返回False"""
+        if self._semaphore is not None:
+            if self._semaphore.locked():
+                if self.queue_timeout <= 0 or self.waiting >= self.queue_max:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    return False
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._semaphore.acquire()
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def retry_after(self) -> int:
+        """建议客户端重试的等待秒数"""
+        return max(1, int(self.queue_timeout) or 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
+
+
+class CancellableStreamingResponse(StreamingResponse):
+    """客户端断开或长时间不读取时立即取消生成的流式响应
+
+    不论ASGI服务器的规范版本，都同时监听断开事件（2.4以上的服务器默认只在发送失败时才发现断开，
+    模型生成或工具执行期间不发送数据就一直发现不了）；单帧发送超过 send_timeout 秒也视为客户端已失联。
+    取消后显式关闭内容生成器，让它取消上游模型请求和进行中的工具调用；结束时调用 on_close。
+    """
+
+    def __init__(
+        self,
+        content: AsyncIterator[str],
+        send_timeout: Optional[float] = None,
+        on_close: Optional[Callable[[], None]] = None,
+        **kwargs
+    ):
+        super().__init__(content, **kwargs)
+        self.send_timeout = settings.STREAM_SEND_TIMEOUT_SECONDS if send_timeout is None else send_timeout
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        reason = None
+        error = None
+        finished = False
+
+        async def send_frame(message):
+            nonlocal finished
+            # 内容已全部生成，之后的断开不算取消
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            if self.send_timeout > 0:
+                with anyio.fail_after(self.send_timeout):
+                    await send(message)
+            else:
+                await send(message)
+
+        try:
+            async with anyio.create_task_group() as task_group:
+
+                async def stream():
+                    nonlocal reason, error
+                    try:
+                        await self.stream_response(send_frame)
+                    except TimeoutError:
+                        reason = "send_timeout"
+                    except OSError:
+                        reason = "disconnect"
+                    except Exception as e:
+                        error = e
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(stream)
+                await self.listen_for_disconnect(receive)
+                task_group.cancel_scope.cancel()
+                if not finished:
+                    reason = reason or "disconnect"
+        finally:
+            with anyio.CancelScope(shield=True):
+                if hasattr(self.body_iterator, "aclose"):
+                    await self.body_iterator.aclose()
+                if self.on_close is not None:
+                    self.on_close()
+        if error is not None:
+            raise error
+        if reason is not None:
+            STREAM_CANCELLATIONS.labels(reason).inc()
+            logger.info("流式响应已取消", extra={"reason": reason})
+        elif self.background is not None:
+            await self.background()
@@ -0,0 +1,82 @@
+"""
+批量聊天：工具调用去重、按完成顺序产出
+"""
+import asyncio
+
+import pytest
+
+from config import settings
+from tools.base import ToolResult
+
+
+class Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeModel:
+    """回复用户消息；消息中带"慢"字的回复延迟返回"""
+
+    async def ainvoke(self, messages, **kwargs):
+        prompt = messages[-1][1]
+        await asyncio.sleep(0.1 if "慢" in prompt else 0.01)
+        return Reply(prompt.rsplit("用户: ", 1)[-1].split("\n", 1)[0])
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_STORE", "memory")
+    from agent import AIAgent
+    agent = AIAgent()
+    agent._chat_model = FakeModel()
+    agent.tool_manager.cache = None
+    return agent
+
+
+def run_batch(agent, items, concurrency=None):
+    async def main():
+        return [result async for result in agent.chat_batch(items, concurrency)]
+    return asyncio.run(main())
+
+
+def test_identical_tool_calls_run_once(agent, monkeypatch):
+    calls = []
+
+    async def execute(expression):
+        calls.append(expression)
+        await asyncio.sleep(0.01)
+        return ToolResult(tool_name="calculator", result={"result": 2}, success=True)
+
+    monkeypatch.setattr(agent.tool_manager.tools["calculator"], "execute", execute)
+    results = run_batch(agent, [
+        {"message": "计算 1 + 1", "id": "a"},
+        {"message": "帮我算 1 + 1", "id": "b"},
+        {"message": "计算 2 + 3", "id": "c"},
+    ])
+    assert sorted(calls) == ["1 + 1", "2 + 3"]
+    assert all(result["tools_used"][0]["tool"] == "calculator" for result in results)
+
+
+def test_results_are_yielded_in_completion_order(agent):
+    results = run_batch(agent, [
+        {"message": "慢一点回答", "use_tools": False, "id": "slow"},
+        {"message": "你好", "use_tools": False, "id": "fast"},
+    ])
+    assert [result["id"] for result in results] == ["fast", "slow"]
+    assert [result["index"] for result in results] == [1, 0]
+    assert results[0]["response"] == "你好"
+
+
+def test_item_errors_do_not_fail_the_batch(agent, monkeypatch):
+    async def failing(messages, **kwargs):
+        if "坏" in messages[-1][1]:
+            raise RuntimeError("上游错误")
+        return Reply("好")
+
+    monkeypatch.setattr(agent._chat_model, "ainvoke", failing)
+    results = {result["id"]: result for result in run_batch(agent, [
+        {"message": "坏请求", "use_tools": False, "id": "bad"},
+        {"message": "好请求", "use_tools": False, "id": "good"},
+    ])}
+    assert "上游错误" in results["bad"]["error"]
+    assert results["good"]["response"] == "好"
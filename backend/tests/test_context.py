@@ -0,0 +1,83 @@
+"""
+上下文窗口：token预算、增量摘要折叠与消息裁剪
+"""
+import asyncio
+
+from context import ContextBuilder, estimate_tokens
+from session import Session
+
+
+class RecordingSummarizer:
+    """记录每次折叠的消息，摘要为已折叠消息内容的拼接"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, summary, messages):
+        contents = [message.content for message in messages]
+        self.calls.append((summary, contents))
+        return " ".join(filter(None, [summary] + contents))
+
+
+def converse(session: Session, builder: ContextBuilder, turns: int, length: int = 1):
+    async def main():
+        for turn in range(turns):
+            await builder.build(session)
+            session.add_user_message(f"问{turn}" + "字" * length)
+            session.add_ai_message(f"答{turn}" + "字" * length)
+        return await builder.build(session)
+    return asyncio.run(main())
+
+
+def test_under_budget_keeps_everything_verbatim():
+    summarizer = RecordingSummarizer()
+    session = Session("s", max_messages=100)
+    summary, history = converse(session, ContextBuilder(summarizer, token_budget=1000), 3)
+    assert summary == "" and not summarizer.calls
+    assert history.splitlines() == ["用户: 问0字", "助手: 答0字", "用户: 问1字", "助手: 答1字", "用户: 问2字", "助手: 答2字"]
+
+
+def test_over_budget_folds_oldest_messages_incrementally():
+    summarizer = RecordingSummarizer()
+    session = Session("s", max_messages=100)
+    builder = ContextBuilder(summarizer, token_budget=100, summary_max_tokens=10000, min_recent_messages=2)
+    summary, history = converse(session, builder, 20, length=10)
+
+    assert summarizer.calls
+    # 每次只折叠新增的消息，在已有摘要的基础上更新
+    folded = [content for _, contents in summarizer.calls for content in contents]
+    assert len(folded) == len(set(folded))
+    for (previous, _), (summary_in, _) in zip(summarizer.calls, summarizer.calls[1:]):
+        assert summary_in.startswith(previous)
+    # 近期窗口在预算内并从用户消息开始，摘要和窗口合起来覆盖全部对话
+    assert estimate_tokens(history) <= 100 + 20
+    assert history.startswith("用户: ")
+    for turn in range(20):
+        assert (f"问{turn}字" in summary) != (f"问{turn}字" in history)
+
+
+def test_summarizer_failure_falls_back_to_clipped_transcript():
+    async def broken(summary, messages):
+        raise RuntimeError("模型不可用")
+
+    session = Session("s", max_messages=100)
+    builder = ContextBuilder(broken, token_budget=50, summary_max_tokens=30, min_recent_messages=2)
+    summary, _ = converse(session, builder, 10, length=10)
+    assert summary and estimate_tokens(summary) <= 30
+
+
+def test_trimmed_sessions_render_consistently():
+    summarizer = RecordingSummarizer()
+    session = Session("s", max_messages=8)
+    builder = ContextBuilder(summarizer, token_budget=60, summary_max_tokens=10000, min_recent_messages=2)
+    summary, history = converse(session, builder, 40, length=5)
+
+    assert session.trimmed_count > 0
+    assert len(session.messages) <= session.max_messages + 2
+    rendered = history.splitlines()
+    assert rendered == [
+        f"{'用户' if index % 2 == 0 else '助手'}: {message.content}"
+        for index, message in enumerate(session.messages[session.summarized_count:])
+    ]
+    for turn in range(40):
+        assert f"问{turn}字" in summary + history
@@ -0,0 +1,62 @@
+"""
+批量工具执行：去重、按输入顺序返回、每个工具的并发上限
+"""
+import asyncio
+
+from config import settings
+from tools.base import ToolResult
+from tools.manager import ToolManager
+
+
+def make_manager(monkeypatch, delays):
+    manager = ToolManager(guards={})
+    manager.cache = None
+    calls = []
+    running = {"now": 0, "peak": 0}
+
+    async def execute(expression):
+        calls.append(expression)
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(delays.get(expression, 0.01))
+        running["now"] -= 1
+        return ToolResult(tool_name="calculator", result={"expression": expression}, success=True)
+
+    monkeypatch.setattr(manager.tools["calculator"], "execute", execute)
+    return manager, calls, running
+
+
+def test_results_follow_input_order_and_duplicates_run_once(monkeypatch):
+    manager, calls, _ = make_manager(monkeypatch, {"1+1": 0.05})
+    results = asyncio.run(manager.execute_many([
+        ("calculator", {"expression": "1+1"}),
+        ("calculator", {"expression": "2+2"}),
+        ("calculator", {"expression": " 1+1 "}),
+        ("unknown", {}),
+    ]))
+    assert sorted(calls) == ["1+1", "2+2"]
+    assert [result.result for result in results[:3]] == [
+        {"expression": "1+1"}, {"expression": "2+2"}, {"expression": "1+1"}
+    ]
+    assert not results[3].success and "不存在" in results[3].error
+
+
+def test_per_tool_concurrency_limit(monkeypatch):
+    monkeypatch.setitem(settings.TOOL_CONCURRENCY_LIMITS, "calculator", 3)
+    manager, calls, running = make_manager(monkeypatch, {})
+    results = asyncio.run(manager.execute_many([
+        ("calculator", {"expression": f"{index}+1"}) for index in range(12)
+    ]))
+    assert len(calls) == 12 and all(result.success for result in results)
+    assert running["peak"] == 3
+
+
+def test_slow_call_times_out_without_failing_others(monkeypatch):
+    monkeypatch.setattr(settings, "TOOL_CALL_TIMEOUT", 0.05)
+    manager, _, _ = make_manager(monkeypatch, {"9+9": 1})
+    results = asyncio.run(manager.execute_many([
+        ("calculator", {"expression": "9+9"}),
+        ("calculator", {"expression": "1+1"}),
+    ]))
+    assert results[0].error == "工具执行超时"
+    assert results[1].success
@@ -0,0 +1,57 @@
+"""
+计算器表达式求值的资源限制
+"""
+import pytest
+
+from tools.expression import ExpressionEvaluator, ExpressionError
+
+
+@pytest.fixture
+def evaluator():
+    return ExpressionEvaluator()
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("(15 + 23) * 2", 76),
+    ("sum([1, 2, 3])", 6),
+    ("max(1, 5, 3)", 5),
+    ("min((4, 2))", 2),
+    ("2 ** 10", 1024),
+])
+def test_valid_expressions(evaluator, expression, expected):
+    assert evaluator.evaluate(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "sum([1] * 10 ** 8)",
+    "[1] * 10 ** 10",
+    "(1, 2) * 3",
+    "-[1]",
+    "[1, 2]",
+    "sum([[1] * 3])",
+])
+def test_sequence_operands_rejected(evaluator, expression):
+    with pytest.raises(ExpressionError):
+        evaluator.evaluate(expression)
+
+
+@pytest.mark.parametrize("expression", ["(-8) ** (1 / 3)", "pow(-8, 0.5)"])
+def test_complex_result_rejected(evaluator, expression):
+    with pytest.raises(ExpressionError, match="实数"):
+        evaluator.evaluate(expression)
+
+
+def test_huge_power_rejected(evaluator):
+    with pytest.raises(ExpressionError):
+        evaluator.evaluate("9 ** 9 ** 9")
+
+
+@pytest.mark.parametrize("expression", ["round(5, -10 ** 9)", "round(5, 10 ** 7)", "round(1.5, 101)", "round(2, 0.5)"])
+def test_round_digits_limited(evaluator, expression):
+    with pytest.raises(ExpressionError, match="round"):
+        evaluator.evaluate(expression)
+
+
+def test_round_small_digits(evaluator):
+    assert evaluator.evaluate("round(3.14159, 2)") == 3.14
+    assert evaluator.evaluate("round(1234, -2)") == 1200
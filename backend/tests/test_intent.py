@@ -0,0 +1,41 @@
+"""
+意图检测：引号和英文撇号、多城市天气查询
+"""
+import pytest
+
+from intent import IntentDetector
+from tools.manager import ToolManager
+
+
+@pytest.fixture(scope="module")
+def detector():
+    return IntentDetector(ToolManager())
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("What's the weather in Beijing? It's cold", [{"tool": "weather", "parameters": {"city": "北京"}}]),
+    ("It's 3 + 4, isn't it", [{"tool": "calculator", "parameters": {"expression": "3 + 4"}}]),
+])
+def test_contractions_are_not_quotes(detector, message, expected):
+    assert detector.plan(message) == expected
+
+
+@pytest.mark.parametrize("message, text, target_lang", [
+    ("Translate 'good morning' to French", "good morning", "fr"),
+    ("Don't translate 'yes' to Japanese", "yes", "ja"),
+    ("翻译'hello'成法语", "hello", "fr"),
+    ("把“早上好”翻译成英文", "早上好", "en"),
+])
+def test_quoted_text_is_translated(detector, message, text, target_lang):
+    assert detector.plan(message) == [
+        {"tool": "translate", "parameters": {"text": text, "target_lang": target_lang}}
+    ]
+
+
+def test_weather_plans_one_call_per_city(detector, monkeypatch):
+    assert detector.plan("上海和北京的天气，北京冷吗") == [
+        {"tool": "weather", "parameters": {"city": "上海"}},
+        {"tool": "weather", "parameters": {"city": "北京"}},
+    ]
+    monkeypatch.setattr("intent.settings.WEATHER_MAX_CITIES", 2)
+    assert len(detector.plan("北京、上海、广州的天气")) == 2
@@ -0,0 +1,79 @@
+"""
+模型回复缓存：键和跳过规则、并发合并
+"""
+import asyncio
+import logging
+
+import pytest
+
+from config import settings
+from llm_cache import LLMResponseCache
+from session import Session
+
+MESSAGES = [("system", "你是一个智能助手"), ("human", "用户: 你好\n助手:")]
+
+
+@pytest.fixture
+def deterministic(monkeypatch):
+    monkeypatch.setattr(settings, "DEEPSEEK_TEMPERATURE", 0.0)
+
+
+def make_cache(**kwargs) -> LLMResponseCache:
+    return LLMResponseCache(enabled=True, max_entries=10, ttl=60, max_temperature=0, **kwargs)
+
+
+def test_same_prompt_same_key(deterministic):
+    cache = make_cache()
+    key = cache.key_for(Session("a", 10), MESSAGES, False)
+    assert key is not None
+    assert cache.key_for(Session("b", 10), list(MESSAGES), False) == key
+    assert cache.key_for(Session("a", 10), [MESSAGES[0], ("human", "用户: 再见\n助手:")], False) != key
+
+
+def test_key_includes_model_parameters(deterministic, monkeypatch):
+    cache = make_cache()
+    key = cache.key_for(Session("a", 10), MESSAGES, False)
+    monkeypatch.setattr(settings, "DEEPSEEK_MAX_TOKENS", settings.DEEPSEEK_MAX_TOKENS + 1)
+    assert cache.key_for(Session("a", 10), MESSAGES, False) != key
+
+
+def test_skip_rules(deterministic, monkeypatch):
+    cache = make_cache()
+    with_history = Session("a", 10)
+    with_history.memory.chat_memory.add_user_message("之前的问题")
+    with_summary = Session("b", 10)
+    with_summary.summary = "之前聊过天气"
+    assert cache.key_for(with_history, MESSAGES, False) is None
+    assert cache.key_for(with_summary, MESSAGES, False) is None
+    assert cache.key_for(Session("c", 10), MESSAGES, True) is None
+    assert LLMResponseCache(enabled=False).key_for(Session("d", 10), MESSAGES, False) is None
+    monkeypatch.setattr(settings, "DEEPSEEK_TEMPERATURE", 0.7)
+    assert cache.key_for(Session("e", 10), MESSAGES, False) is None
+
+
+def test_warns_when_temperature_blocks_cache(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "DEEPSEEK_TEMPERATURE", 0.7)
+    with caplog.at_level(logging.WARNING, logger="llm_cache"):
+        make_cache()
+    assert "LLM_CACHE_MAX_TEMPERATURE" in caplog.text
+
+
+def test_concurrent_misses_invoke_once_and_empty_replies_are_not_cached(deterministic):
+    cache = make_cache()
+    key = cache.key_for(Session("a", 10), MESSAGES, False)
+    calls = []
+
+    async def invoke():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "你好！"
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_invoke(key, invoke) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["你好！"] * 5
+    assert len(calls) == 1
+    assert cache.get(key) == "你好！"
+
+    cache.set("empty", "")
+    assert cache.get("empty") is None
@@ -0,0 +1,55 @@
+"""
+运行指标：Prometheus文本格式输出、标签与关闭时的空操作
+"""
+from metrics import MetricsRegistry
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "请求数", ["tool", "result"])
+    streams = registry.gauge("active_streams", "进行中的流")
+    requests.labels("weather", "miss").inc()
+    requests.labels("calculator", "hit").inc(2)
+    requests.labels("weather", "miss").inc()
+    streams.inc(3)
+    streams.dec()
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total 请求数",
+        "# TYPE requests_total counter",
+        'requests_total{tool="calculator",result="hit"} 2.0',
+        'requests_total{tool="weather",result="miss"} 2.0',
+        "# HELP active_streams 进行中的流",
+        "# TYPE active_streams gauge",
+        "active_streams 2.0",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("stage_seconds", "阶段耗时", ["stage"], buckets=[0.1, 1.0])
+    for value in (0.05, 0.1, 0.5, 3.0):
+        seconds.labels("prompt_build").observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'stage_seconds_bucket{stage="prompt_build",le="0.1"} 2',
+        'stage_seconds_bucket{stage="prompt_build",le="1.0"} 3',
+        'stage_seconds_bucket{stage="prompt_build",le="+Inf"} 4',
+        'stage_seconds_sum{stage="prompt_build"} 3.65',
+        'stage_seconds_count{stage="prompt_build"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "错误数", ["reason"]).labels('a"b\\c\nd').inc()
+    assert 'errors_total{reason="a\\"b\\\\c\\nd"} 1.0' in registry.render()
+
+
+def test_disabled_registry_is_a_no_op():
+    registry = MetricsRegistry(enabled=False)
+    seconds = registry.histogram("stage_seconds", "阶段耗时", ["stage"])
+    with seconds.labels("prompt_build").time():
+        pass
+    registry.counter("requests_total", "请求数").inc()
+    assert registry.render() == "\n"
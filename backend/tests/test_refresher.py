@@ -0,0 +1,66 @@
+"""
+热门城市统计和缓存后台刷新（stale-while-revalidate）
+"""
+import asyncio
+import time
+
+from tools.base import ToolResult
+from tools.cache import TTLCache, ToolResultCache
+from tools.manager import ToolManager
+from tools.refresher import WeatherRefresher
+
+
+def make_manager(monkeypatch):
+    manager = ToolManager(cache=ToolResultCache(backend=TTLCache(100), ttls={"weather": 600}), guards={})
+    calls = []
+
+    async def execute(city):
+        calls.append(city)
+        if city.lower() == "atlantis":
+            return ToolResult(tool_name="weather", result=None, success=False, error="获取天气信息失败: 404")
+        return ToolResult(tool_name="weather", result={"city": city, "temperature": 20}, success=True)
+
+    monkeypatch.setattr(manager.tools["weather"], "execute", execute)
+    manager.refresher = WeatherRefresher(manager)
+    return manager, calls
+
+
+def test_failed_lookups_never_become_hot(monkeypatch):
+    manager, calls = make_manager(monkeypatch)
+
+    async def main():
+        for _ in range(50):
+            await manager.execute_tool("weather", {"city": "Atlantis"})
+        await manager.execute_tool("weather", {"city": "Beijing"})
+
+    asyncio.run(main())
+    assert len(calls) == 50 + 1
+    assert "atlantis" not in manager.refresher.scores
+    assert "atlantis" not in manager.refresher.hot_cities()
+    assert manager.refresher.scores["北京"] >= 1
+
+
+def test_expired_entry_within_window_is_served_and_refreshed():
+    cache = ToolResultCache(backend=TTLCache(100), ttls={"weather": 0.05}, revalidate_windows={"weather": 60})
+    calls = []
+
+    async def upstream():
+        calls.append(time.monotonic())
+        await asyncio.sleep(0.02)
+        return ToolResult(tool_name="weather", result={"call": len(calls)}, success=True)
+
+    async def main():
+        await cache.get_or_execute("weather", {"city": "北京"}, upstream)
+        await asyncio.sleep(0.06)
+        served = await cache.get_or_execute("weather", {"city": "北京"}, upstream)
+        # 后台刷新完成前再次查询不会重复刷新
+        again = await cache.get_or_execute("weather", {"city": "北京"}, upstream)
+        await asyncio.sleep(0.05)
+        refreshed = await cache.get_or_execute("weather", {"city": "北京"}, upstream)
+        return served, again, refreshed
+
+    served, again, refreshed = asyncio.run(main())
+    assert served.result["call"] == 1 and again.result["call"] == 1
+    assert refreshed.result["call"] == 2
+    assert len(calls) == 2
+    assert cache.get_stats()["tools"]["weather"]["revalidated"] == 2
@@ -0,0 +1,87 @@
+"""
+请求ID：中间件分配/沿用请求ID，写入响应头和请求期间的日志
+"""
+import asyncio
+import json
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import settings
+from log import ContextFilter, JSONFormatter, request_id_var
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.addFilter(ContextFilter(sample_rate=1.0))
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def recorder():
+    handler = RecordingHandler()
+    root = logging.getLogger()
+    root.addHandler(handler)
+    yield handler
+    root.removeHandler(handler)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_STORE", "memory")
+    import app as app_module
+
+    async def chat(message, use_tools, session_id, tool_mode=None):
+        logging.getLogger("agent").info("处理中", extra={"session_id": session_id})
+        return {"response": "好", "conversation_history": [], "tools_used": []}
+
+    monkeypatch.setattr(app_module.ai_agent, "chat", chat)
+    return TestClient(app_module.app)
+
+
+def test_client_request_id_is_echoed_and_logged(client, recorder):
+    response = client.post("/chat/", json={"message": "你好"}, headers={"X-Request-ID": "req-123"})
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "req-123"
+    messages = {record.getMessage(): record.request_id for record in recorder.records}
+    assert messages["收到聊天请求"] == "req-123"
+    assert messages["处理中"] == "req-123"
+    # 请求结束后不残留在当前上下文
+    assert request_id_var.get() is None
+
+
+def test_request_id_is_generated_when_missing(client, recorder):
+    first = client.get("/health").headers["X-Request-ID"]
+    second = client.get("/health").headers["X-Request-ID"]
+    assert first and second and first != second
+
+
+def test_concurrent_tasks_keep_their_own_request_id(recorder):
+    logger = logging.getLogger("test_request_id")
+
+    async def handle(request_id: str, delay: float):
+        request_id_var.set(request_id)
+        await asyncio.sleep(delay)
+        logger.info(request_id)
+
+    async def main():
+        await asyncio.gather(handle("a", 0.02), handle("b", 0.01))
+
+    asyncio.run(main())
+    assert [(record.getMessage(), record.request_id) for record in recorder.records] == [("b", "b"), ("a", "a")]
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "收到聊天请求", None, None)
+    record.request_id = "req-123"
+    record.session_id = "s"
+    record.sampled = True
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["request_id"] == "req-123"
+    assert entry["session_id"] == "s"
+    assert "sampled" not in entry
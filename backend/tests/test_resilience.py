@@ -0,0 +1,48 @@
+"""
+上游熔断只统计上游故障
+"""
+import asyncio
+
+import httpx
+
+from tools.base import ToolResult, is_upstream_error
+from tools.resilience import UpstreamGuard
+
+
+def failing(status_code: int):
+    async def attempt():
+        return ToolResult(
+            tool_name="weather",
+            result=None,
+            success=False,
+            error=f"获取天气信息失败: {status_code}",
+            upstream_error=is_upstream_error(status_code)
+        )
+    return attempt
+
+
+def call_repeatedly(guard: UpstreamGuard, attempt, times: int):
+    async def main():
+        return [await guard.call(attempt) for _ in range(times)]
+    return asyncio.run(main())
+
+
+def test_client_errors_keep_breaker_closed():
+    guard = UpstreamGuard("weather", failure_threshold=3, hedging=False)
+    results = call_repeatedly(guard, failing(404), 10)
+    assert guard.breaker.state == "closed"
+    assert all(result.error == "获取天气信息失败: 404" for result in results)
+
+
+def test_server_errors_open_breaker():
+    guard = UpstreamGuard("weather", failure_threshold=3, hedging=False)
+    results = call_repeatedly(guard, failing(503), 4)
+    assert guard.breaker.state == "open"
+    assert results[-1].error == "上游暂时不可用（已熔断）"
+
+
+def test_is_upstream_error():
+    assert is_upstream_error(500) and is_upstream_error(429)
+    assert not is_upstream_error(404) and not is_upstream_error(401)
+    assert is_upstream_error(httpx.ConnectError("refused"))
+    assert not is_upstream_error(KeyError("main"))
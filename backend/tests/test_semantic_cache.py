@@ -0,0 +1,47 @@
+"""
+语义缓存：数字和否定词不同的问题不能互相命中
+"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from semantic_cache import SemanticCache
+from session import Session
+
+
+def make_cache(threshold=None):
+    return SemanticCache(enabled=True, threshold=threshold, capacity=100, dim=512, ttl=60)
+
+
+def lookup(cache, question, cached_question):
+    session = Session("test", 10)
+    cache.set(cache.key_for(session, cached_question, [], True, False), "回答", [])
+    return cache.get(cache.key_for(session, question, [], True, False))
+
+
+@pytest.mark.parametrize("question, cached_question", [
+    ("25岁的人适合学编程吗", "35岁的人适合学编程吗"),
+    ("三十岁怎么规划职业", "四十岁怎么规划职业"),
+    ("为什么猫喜欢吃鱼", "为什么猫不喜欢吃鱼"),
+    ("Why do people like coffee", "Why don't people like coffee"),
+])
+def test_numbers_and_negation_never_hit(question, cached_question):
+    # 阈值为0时相似度不起作用，只看数字和否定词
+    assert lookup(make_cache(threshold=0.0), question, cached_question) is None
+
+
+@pytest.mark.parametrize("question, cached_question", [
+    ("猫为什么怕水", "狗为什么怕水"),
+    ("如何学习英语", "如何学习日语"),
+])
+def test_different_questions_miss_at_default_threshold(question, cached_question):
+    assert lookup(make_cache(), question, cached_question) is None
+
+
+@pytest.mark.parametrize("question, cached_question", [
+    ("推荐几本科幻小说吧", "推荐几本科幻小说"),
+    ("What is machine learning?", "what is machine learning"),
+    ("25岁学编程晚吗？", "25岁学编程晚吗"),
+])
+def test_surface_variants_hit(question, cached_question):
+    assert lookup(make_cache(), question, cached_question) == {"response": "回答", "tools_used": []}
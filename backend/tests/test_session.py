@@ -0,0 +1,74 @@
+"""
+会话存储：按会话隔离、LRU/TTL淘汰、消息上限与摘要折叠
+"""
+import asyncio
+import time
+
+import pytest
+
+from config import settings
+from context import ContextBuilder
+from session import Session, SessionStore
+from shared_state import InMemorySharedState
+
+
+@pytest.fixture
+def make_store(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_STORE", "memory")
+
+    def make(**kwargs):
+        return SessionStore(shared_state=InMemorySharedState(), **kwargs)
+    return make
+
+
+def test_sessions_are_isolated(make_store):
+    store = make_store()
+    store.get("a").add_user_message("我是A")
+    store.get("b").add_user_message("我是B")
+    assert [m.content for m in store.get("a").messages] == ["我是A"]
+    assert [m.content for m in store.get("b").messages] == ["我是B"]
+
+
+def test_least_recently_used_session_is_evicted(make_store):
+    store = make_store(max_sessions=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert store.peek("b") is None
+    assert store.peek("a") is not None and store.peek("c") is not None
+    assert len(store) == 2
+
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(ttl_seconds=0.05)
+    store.get("a").add_user_message("你好")
+    time.sleep(0.06)
+    assert store.peek("a") is None
+    assert store.get("a").messages == []
+
+
+def test_load_without_create_returns_none_for_unknown_session(make_store):
+    store = make_store()
+    assert asyncio.run(store.load("missing", create=False)) is None
+    assert asyncio.run(store.load("new")) is store.peek("new")
+
+
+def test_overflow_is_summarized_before_it_is_trimmed():
+    session = Session("s", max_messages=10)
+    builder = ContextBuilder(token_budget=100000, summary_max_tokens=100000)
+
+    async def chat(turns: int):
+        for turn in range(turns):
+            await builder.build(session)
+            session.add_user_message(f"问题{turn}")
+            session.add_ai_message(f"回答{turn}")
+        return await builder.build(session)
+
+    summary, history = asyncio.run(chat(30))
+    # 短消息一直没有超出token预算，但超出消息上限的部分都先折叠进了摘要
+    assert len(session.messages) <= session.max_messages + 2
+    assert "问题0" in summary and "回答0" in summary
+    for turn in range(30):
+        assert f"问题{turn}" in summary + history
+    assert history.startswith("用户:")
@@ -0,0 +1,69 @@
+"""
+共享状态和共享工具缓存
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shared_state import InMemorySharedState, SQLiteSharedState
+from tools.cache import SharedStateCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        yield InMemorySharedState()
+    else:
+        backend = SQLiteSharedState(str(tmp_path / "shared_state.db"))
+        yield backend
+        backend.close()
+
+
+def test_sqlite_async_calls_run_off_event_loop(tmp_path):
+    state = SQLiteSharedState(str(tmp_path / "shared_state.db"))
+    threads = []
+    original = state.get
+
+    def get(key):
+        threads.append(threading.get_ident())
+        return original(key)
+
+    state.get = get
+
+    async def main():
+        await state.aset("key", 1)
+        assert await state.aincr("key") == 2
+        assert await state.aget("key") == 2
+        assert await state.aadd("key", 3) is False
+
+    asyncio.run(main())
+    state.close()
+    assert threads and threading.get_ident() not in threads
+
+
+def test_trim_deletes_expired_then_soonest_expiring(state):
+    state.set("cache:expired", 0, ttl=0.01)
+    for index in range(5):
+        state.set(f"cache:{index}", index, ttl=100 + index)
+    state.set("other", 0)
+    time.sleep(0.02)
+
+    assert state.trim("cache:", 3) == 3
+    assert state.count("cache:") == 3
+    assert state.get("cache:0") is None and state.get("cache:1") is None
+    assert state.get("cache:4") == 4
+    assert state.get("other") == 0
+
+
+def test_shared_state_cache_enforces_max_entries(state):
+    cache = SharedStateCache(state, max_entries=10)
+
+    async def main():
+        for index in range(100):
+            await cache.aset(str(index), index, ttl=100)
+
+    asyncio.run(main())
+    assert len(cache) <= 10
+    assert cache.get("99") == 99
@@ -0,0 +1,112 @@
+"""
+对话持久化：追加日志读写、压缩、写后队列与淘汰后的重新加载
+"""
+import asyncio
+import time
+
+from session import SessionStore
+from shared_state import InMemorySharedState
+from storage import Record, SQLiteConversationStore, WriteBehindQueue
+
+
+def message(session_id: str, role: str, content: str, created_at: float = None) -> Record:
+    return Record(session_id, "message", role, content, created_at or time.time())
+
+
+def clear(session_id: str) -> Record:
+    return Record(session_id, "clear", None, None, time.time())
+
+
+def count(store: SQLiteConversationStore) -> int:
+    return store._conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+
+def test_load_returns_latest_messages_after_last_clear(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    store.append([message("a", "user", "旧问题"), clear("a")])
+    store.append([message("a", "user", f"问题{index}") for index in range(5)])
+    store.append([message("b", "user", "别的会话")])
+    assert store.load("a", 3) == [("user", "问题2"), ("user", "问题3"), ("user", "问题4")]
+    assert store.load("missing", 3) == []
+    store.close()
+
+
+def test_compact_drops_cleared_expired_and_overflow_records(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    store.append([message("cleared", "user", "清空前"), clear("cleared"), message("cleared", "user", "清空后")])
+    store.append([message("stale", "user", "很久以前", created_at=time.time() - 3600)])
+    store.append([message("long", "user", f"问题{index}") for index in range(10)])
+
+    deleted = store.compact(retention_seconds=60, max_messages=4)
+    assert deleted == 2 + 1 + 6
+    assert count(store) == 1 + 4
+    assert store.load("cleared", 10) == [("user", "清空后")]
+    assert store.load("stale", 10) == []
+    assert store.load("long", 10) == [("user", f"问题{index}") for index in range(6, 10)]
+    store.close()
+
+
+def test_write_behind_queue_batches_and_flushes(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    written = []
+
+    async def on_written(session_ids):
+        written.append(session_ids)
+
+    async def main():
+        queue = WriteBehindQueue(store, batch_size=100, flush_interval=0.01, on_written=on_written)
+        for index in range(5):
+            queue.submit(message("a", "user", f"问题{index}"))
+        assert queue.has_pending("a")
+        await queue.flush()
+        assert not queue.has_pending("a")
+        await queue.stop()
+
+    asyncio.run(main())
+    assert written == [{"a"}]
+    assert len(store.load("a", 10)) == 5
+    store.close()
+
+
+def test_evicted_session_is_reloaded_from_store(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "conversations.db"))
+
+    async def main():
+        sessions = SessionStore(max_sessions=1, store=store, shared_state=InMemorySharedState())
+        session = await sessions.load("a")
+        session.add_user_message("你好")
+        session.add_ai_message("你好！")
+        # 加载b会淘汰a，此时a的记录可能还在写后队列中
+        await sessions.load("b")
+        assert sessions.peek("a") is None
+        reloaded = await sessions.load("a")
+        assert reloaded is not session
+        assert [(m.type, m.content) for m in reloaded.messages] == [("human", "你好"), ("ai", "你好！")]
+        assert await sessions.load("missing", create=False) is None
+        await sessions.close()
+
+    asyncio.run(main())
+
+
+def test_session_written_by_another_worker_is_reloaded(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    shared = InMemorySharedState()
+
+    async def main():
+        first = SessionStore(store=SQLiteConversationStore(path), shared_state=shared)
+        second = SessionStore(store=SQLiteConversationStore(path), shared_state=shared)
+        (await first.load("a")).add_user_message("第一句")
+        await first.writer.flush()
+
+        cached = await second.load("a")
+        assert [m.content for m in cached.messages] == ["第一句"]
+        (await first.load("a")).add_user_message("第二句")
+        await first.writer.flush()
+        # 共享版本号变化后丢弃内存副本，重新从存储读取
+        assert [m.content for m in (await second.load("a")).messages] == ["第一句", "第二句"]
+        # 自己的写入不会导致重新加载
+        assert await first.load("a") is await first.load("a")
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
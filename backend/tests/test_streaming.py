@@ -0,0 +1,123 @@
+"""
+流式响应：并发上限与429、客户端断开/失联时取消生成并释放名额
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import settings
+from streaming import CancellableStreamingResponse, StreamLimiter
+
+
+def test_limiter_rejects_when_full_and_queue_disabled():
+    async def main():
+        limiter = StreamLimiter(limit=1, queue_timeout=0)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        limiter.release()
+        assert await limiter.acquire()
+        return limiter
+
+    limiter = asyncio.run(main())
+    assert limiter.get_stats() == {"limit": 1, "active": 1, "waiting": 0, "rejected": 1}
+
+
+def test_limiter_queues_until_a_slot_is_released():
+    async def main():
+        limiter = StreamLimiter(limit=1, queue_timeout=1, queue_max=1)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        # 排队数已满，直接拒绝
+        assert limiter.waiting == 1 and not await limiter.acquire()
+        limiter.release()
+        assert await queued
+        return limiter
+
+    assert asyncio.run(main()).active == 1
+
+
+def test_limiter_rejects_after_queue_timeout():
+    async def main():
+        limiter = StreamLimiter(limit=1, queue_timeout=0.02, queue_max=5)
+        await limiter.acquire()
+        return await limiter.acquire(), limiter
+
+    accepted, limiter = asyncio.run(main())
+    assert not accepted and limiter.waiting == 0 and limiter.retry_after() == 1
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_STORE", "memory")
+    import app as app_module
+
+    async def chat_stream(message, use_tools, session_id, tool_mode=None):
+        yield "你"
+        yield "好"
+
+    monkeypatch.setattr(app_module.ai_agent, "chat_stream", chat_stream)
+    monkeypatch.setattr(app_module, "stream_limiter", StreamLimiter(limit=1, queue_timeout=0))
+    return app_module
+
+
+def test_stream_endpoint_returns_429_with_retry_after(app_module):
+    client = TestClient(app_module.app)
+    asyncio.run(app_module.stream_limiter.acquire())
+    response = client.post("/chat/stream", json={"message": "你好"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    app_module.stream_limiter.release()
+    response = client.post("/chat/stream", json={"message": "你好"})
+    assert response.status_code == 200 and response.text == "你好"
+    assert app_module.stream_limiter.active == 0
+
+
+def run_response(send, receive):
+    """返回 (on_close调用次数, 生成器是否已关闭)"""
+    state = {"closed": 0, "generator_closed": False}
+
+    async def content():
+        try:
+            while True:
+                yield "块"
+                await asyncio.sleep(0.01)
+        finally:
+            state["generator_closed"] = True
+
+    def on_close():
+        state["closed"] += 1
+
+    async def main():
+        response = CancellableStreamingResponse(content(), send_timeout=0.05, on_close=on_close)
+        await asyncio.wait_for(response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send), 1)
+
+    asyncio.run(main())
+    return state["closed"], state["generator_closed"]
+
+
+def test_disconnect_cancels_generation_and_releases_slot():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    assert run_response(send, receive) == (1, True)
+    assert len(sent) > 1 and sent[-1].get("more_body", True)
+
+
+def test_stalled_client_times_out_and_releases_slot():
+    async def send(message):
+        if message["type"] == "http.response.body":
+            await asyncio.sleep(10)
+
+    async def receive():
+        await asyncio.sleep(10)
+
+    assert run_response(send, receive) == (1, True)
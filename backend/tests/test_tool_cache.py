@@ -0,0 +1,90 @@
+"""
+工具结果缓存：请求合并、过期结果兜底
+"""
+import asyncio
+import time
+
+from tools.base import ToolResult
+from tools.cache import TTLCache, ToolResultCache
+
+
+class Upstream:
+    """记录调用次数的假上游"""
+
+    def __init__(self, delay: float = 0.05, success: bool = True):
+        self.delay = delay
+        self.success = success
+        self.calls = 0
+
+    async def __call__(self) -> ToolResult:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return ToolResult(
+            tool_name="weather",
+            result={"city": "北京", "call": self.calls},
+            success=self.success,
+            error=None if self.success else "获取天气信息失败: 503"
+        )
+
+
+def make_cache(ttl: float = 60, revalidate: float = 0) -> ToolResultCache:
+    return ToolResultCache(
+        backend=TTLCache(100),
+        ttls={"weather": ttl},
+        stale_ttl=60,
+        revalidate_windows={"weather": revalidate}
+    )
+
+
+def test_concurrent_misses_call_upstream_once():
+    cache, upstream = make_cache(), Upstream()
+
+    async def main():
+        return await asyncio.gather(*[
+            cache.get_or_execute("weather", {"city": "北京"}, upstream) for _ in range(10)
+        ])
+
+    results = asyncio.run(main())
+    assert upstream.calls == 1
+    assert all(result.result["call"] == 1 for result in results)
+    stats = cache.get_stats()["tools"]["weather"]
+    assert stats["misses"] == 1 and stats["coalesced"] == 9
+
+    assert asyncio.run(cache.get_or_execute("weather", {"city": "北京"}, upstream)).result["call"] == 1
+    assert upstream.calls == 1
+
+
+def test_cancelled_initiator_hands_over_to_one_waiter():
+    cache, upstream = make_cache(), Upstream()
+
+    async def main():
+        initiator = asyncio.create_task(cache.get_or_execute("weather", {"city": "北京"}, upstream))
+        await asyncio.sleep(0.01)
+        waiters = [
+            asyncio.create_task(cache.get_or_execute("weather", {"city": "北京"}, upstream))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        initiator.cancel()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    # 被取消的首次调用 + 一个接手的等待者，其余等待者合并到接手的调用上
+    assert upstream.calls == 2
+    assert all(result.result["call"] == 2 for result in results)
+
+
+def test_failures_are_not_cached_and_stale_result_is_served():
+    cache = make_cache(ttl=0.05)
+    asyncio.run(cache.get_or_execute("weather", {"city": "北京"}, Upstream(delay=0)))
+    time.sleep(0.06)
+
+    failing = Upstream(delay=0, success=False)
+    result = asyncio.run(cache.get_or_execute("weather", {"city": "北京"}, failing))
+    assert not result.success and failing.calls == 1
+    asyncio.run(cache.get_or_execute("weather", {"city": "北京"}, failing))
+    assert failing.calls == 2
+
+    stale = asyncio.run(cache.get_stale("weather", {"city": "北京"}))
+    assert stale.success and stale.result["stale"] is True and stale.result["call"] == 1
+    assert asyncio.run(cache.get_stale("weather", {"city": "上海"})) is None
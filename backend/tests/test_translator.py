@@ -0,0 +1,41 @@
+"""
+翻译微批处理器的后台任务
+"""
+import asyncio
+
+import pytest
+
+from tools.translator import TranslationBatcher
+
+
+async def echo_pack(texts, source_lang, target_lang):
+    return [{"translated_text": text.upper()} for text in texts]
+
+
+def test_flush_tasks_are_tracked_until_done():
+    async def main():
+        batcher = TranslationBatcher(echo_pack, window=0.01, max_chars=500)
+        pending = asyncio.gather(batcher.submit("a", "zh-CN", "en"), batcher.submit("b", "zh-CN", "en"))
+        await asyncio.sleep(0)
+        assert len(batcher._tasks) == 1
+        results = await pending
+        await asyncio.sleep(0)
+        return batcher, results
+
+    batcher, results = asyncio.run(main())
+    assert [result["translated_text"] for result in results] == ["A", "B"]
+    assert not batcher._tasks
+
+
+def test_close_cancels_pending_batches():
+    async def main():
+        batcher = TranslationBatcher(echo_pack, window=60, max_chars=500)
+        waiter = asyncio.create_task(batcher.submit("a", "zh-CN", "en"))
+        await asyncio.sleep(0)
+        await batcher.close()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return batcher
+
+    batcher = asyncio.run(main())
+    assert not batcher._tasks and not batcher._pending
@@ -8,6 +8,11 @@ from .time_tool import TimeTool
 from .translator import TranslatorTool
 from .web_search import WebSearchTool
 from .manager import ToolManager
+from .cache import CacheBackend, TTLCache, SharedStateCache, ToolResultCache
+from .http_client import AsyncHTTPClient, get_http_client, set_http_client, close_http_client
+from .rate_limit import TokenBucket
+from .resilience import CircuitBreaker, LatencyTracker, UpstreamGuard
+from .refresher import WeatherRefresher
 
 __all__ = [
     'BaseTool',
@@ -17,5 +22,18 @@ __all__ = [
     'TimeTool',
     'TranslatorTool',
     'WebSearchTool',
-    'ToolManager'
+    'ToolManager',
+    'CacheBackend',
+    'TTLCache',
+    'SharedStateCache',
+    'ToolResultCache',
+    'AsyncHTTPClient',
+    'get_http_client',
+    'set_http_client',
+    'close_http_client',
+    'TokenBucket',
+    'CircuitBreaker',
+    'LatencyTracker',
+    'UpstreamGuard',
+    'WeatherRefresher'
 ] 
\ No newline at end of file
@@ -2,8 +2,9 @@
 基础工具类
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
-from pydantic import BaseModel
+from typing import Dict, Any, List, Optional, Union
+import httpx
+from pydantic import BaseModel, Field
 
 
 class ToolResult(BaseModel):
@@ -12,20 +13,63 @@ class ToolResult(BaseModel):
     result: Any
     success: bool
     error: Optional[str] = None
+    # 失败是否由上游故障引起（熔断器只统计这类失败），不返回给客户端
+    upstream_error: bool = Field(default=False, exclude=True)
+
+
+def is_upstream_error(cause: Union[int, BaseException]) -> bool:
+    """HTTP状态码或异常是否表示上游故障：网络错误、超时、5xx和429（404、参数错误等不算）"""
+    if isinstance(cause, BaseException):
+        return isinstance(cause, httpx.TransportError)
+    return cause >= 500 or cause == 429
 
 
 class BaseTool(ABC):
     """工具基类"""
     
-    def __init__(self, name: str, description: str):
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        triggers: Optional[List[str]] = None,
+        parameters: Optional[Dict[str, Any]] = None
+    ):
         self.name = name
         self.description = description
+        # 触发关键词（用于意图检测）
+        self.triggers = triggers or []
+        # 参数的JSON Schema（用于模型原生工具调用）
+        self.parameters = parameters or {"type": "object", "properties": {}}
     
     @abstractmethod
     async def execute(self, **parameters) -> ToolResult:
         """执行工具"""
         pass
     
+    async def close(self):
+        """释放资源（应用关闭时调用）"""
+        pass
+    
+    def normalize_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """规范化参数（用于生成缓存键）：字符串去除首尾空白、合并连续空白并转小写"""
+        normalized = {}
+        for key, value in parameters.items():
+            if isinstance(value, str):
+                value = " ".join(value.split()).lower()
+            normalized[key] = value
+        return normalized
+    
+    def get_schema(self) -> Dict[str, Any]:
+        """获取工具调用schema（OpenAI函数调用格式）"""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters
+            }
+        }
+    
     def get_info(self) -> Dict[str, str]:
         """获取工具信息"""
         return {
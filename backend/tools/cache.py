@@ -0,0 +1,309 @@
+"""
+工具结果缓存
+"""
+import json
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from .base import ToolResult
+from shared_state import SharedStateBackend, get_shared_state
+from metrics import TOOL_CACHE_REQUESTS
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """缓存存储后端接口（事件循环中通过 aget / aset 读写）"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """读取未过期的值，不存在时返回None"""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float):
+        """写入值，ttl秒后过期"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        """删除值"""
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """清空缓存"""
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: float):
+        self.set(key, value, ttl)
+
+
+class TTLCache(CacheBackend):
+    """进程内LRU缓存，每个条目带过期时间"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedStateCache(CacheBackend):
+    """基于共享状态的缓存（多worker之间共享，键加命名空间前缀）
+
+    每个worker每写入约 max_entries 的1%次清理一次过期条目，
+    条目数仍超过 max_entries 时删除最早过期的条目。
+    """
+
+    def __init__(self, state: SharedStateBackend, max_entries: int, namespace: str = "tool_cache"):
+        self.state = state
+        self.max_entries = max_entries
+        self.prefix = f"{namespace}:"
+        self.trim_every = max(1, max_entries // 100)
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.state.get(self.prefix + key)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.state.set(self.prefix + key, value, ttl)
+        if self._should_trim():
+            self.state.trim(self.prefix, self.max_entries)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self.state.aget(self.prefix + key)
+
+    async def aset(self, key: str, value: Any, ttl: float):
+        await self.state.aset(self.prefix + key, value, ttl)
+        if self._should_trim():
+            await self.state.atrim(self.prefix, self.max_entries)
+
+    def _should_trim(self) -> bool:
+        self._writes += 1
+        return self._writes % self.trim_every == 0
+
+    def delete(self, key: str):
+        self.state.delete(self.prefix + key)
+
+    def clear(self):
+        self.state.clear(self.prefix)
+
+    def __len__(self) -> int:
+        return self.state.count(self.prefix)
+
+
+def default_cache_backend() -> CacheBackend:
+    """单进程时使用进程内LRU缓存，配置了共享状态后端时使用共享缓存"""
+    if settings.SHARED_STATE_BACKEND == "memory":
+        return TTLCache(settings.TOOL_CACHE_MAX_ENTRIES)
+    return SharedStateCache(get_shared_state(), settings.TOOL_CACHE_MAX_ENTRIES)
+
+
+class ToolResultCache:
+    """工具结果缓存
+
+    - 按工具配置TTL，未配置TTL的工具（如时间）不缓存
+    - 缓存键由工具名和规范化后的参数生成
+    - 并发的相同未命中请求只调用一次上游（请求合并）
+    - 只缓存成功的结果
+    - 过期不超过重新验证窗口的结果直接返回，同时在后台刷新（stale-while-revalidate）
+    - 过期的结果再保留stale_ttl秒，上游故障时可以返回
+    """
+
+    def __init__(
+        self,
+        backend: Optional[CacheBackend] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        stale_ttl: Optional[float] = None,
+        revalidate_windows: Optional[Dict[str, float]] = None
+    ):
+        self.backend = backend if backend is not None else default_cache_backend()
+        self.ttls = ttls if ttls is not None else dict(settings.TOOL_CACHE_TTLS)
+        self.stale_ttl = stale_ttl if stale_ttl is not None else settings.TOOL_STALE_TTL_SECONDS
+        self.revalidate_windows = (
+            revalidate_windows if revalidate_windows is not None
+            else dict(settings.TOOL_CACHE_REVALIDATE_WINDOWS)
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        """工具是否启用缓存"""
+        return self.ttls.get(tool_name, 0) > 0
+
+    @staticmethod
+    def make_key(tool_name: str, parameters: Dict[str, Any]) -> str:
+        """由工具名和（已规范化的）参数生成缓存键"""
+        return f"{tool_name}:{json.dumps(parameters, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    async def get_or_execute(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        execute: Callable[[], Awaitable[ToolResult]]
+    ) -> ToolResult:
+        """命中缓存时直接返回，否则执行并写入缓存"""
+        key = self.make_key(tool_name, parameters)
+        cached = await self.backend.aget(key)
+        if cached is not None:
+            # 旧格式的条目（没有fresh_until）按未命中处理
+            expired_for = time.time() - cached.get("fresh_until", 0)
+            if expired_for < 0:
+                self._count(tool_name, "hits")
+                return ToolResult(**cached["result"])
+            if expired_for < self.revalidate_windows.get(tool_name, 0):
+                self._count(tool_name, "revalidated")
+                if key not in self._inflight:
+                    self._revalidate(key, tool_name, execute)
+                return ToolResult(**cached["result"])
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._count(tool_name, "coalesced")
+            result = await self._await_inflight(key)
+            if result is not None:
+                return result
+
+        self._count(tool_name, "misses")
+        return await self._execute_and_store(key, tool_name, execute, self._begin(key))
+
+    async def _await_inflight(self, key: str) -> Optional[ToolResult]:
+        """等待执行中的相同请求；发起请求的一方被取消时改为等待新发起的请求，
+        没有新请求时返回None（由当前调用方重新发起，其余等待者合并到它上面）"""
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return None
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+
+    async def refresh(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        execute: Callable[[], Awaitable[ToolResult]]
+    ) -> ToolResult:
+        """不论缓存是否新鲜都重新执行并写入缓存（已有相同请求在执行时等待其结果）"""
+        key = self.make_key(tool_name, parameters)
+        result = await self._await_inflight(key)
+        if result is not None:
+            return result
+        return await self._execute_and_store(key, tool_name, execute, self._begin(key))
+
+    async def fresh_for(self, tool_name: str, parameters: Dict[str, Any]) -> float:
+        """缓存结果还能保持新鲜的秒数（已过期为负数，不存在时为负无穷）"""
+        cached = await self.backend.aget(self.make_key(tool_name, parameters))
+        if cached is None or "fresh_until" not in cached:
+            return float("-inf")
+        return cached["fresh_until"] - time.time()
+
+    def _begin(self, key: str) -> asyncio.Future:
+        """登记一个执行中的请求，相同请求等待它的结果"""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    async def _execute_and_store(
+        self,
+        key: str,
+        tool_name: str,
+        execute: Callable[[], Awaitable[ToolResult]],
+        future: asyncio.Future
+    ) -> ToolResult:
+        try:
+            result = await execute()
+            if result.success:
+                ttl = self.ttls[tool_name]
+                entry = {"result": result.model_dump(), "fresh_until": time.time() + ttl}
+                await self.backend.aset(key, entry, ttl + self.stale_ttl)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _revalidate(self, key: str, tool_name: str, execute: Callable[[], Awaitable[ToolResult]]):
+        """在后台刷新缓存（不阻塞当前请求）"""
+        task = asyncio.create_task(self._execute_and_store(key, tool_name, execute, self._begin(key)))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("后台刷新缓存失败", extra={"error": str(task.exception())})
+
+    async def get_stale(self, tool_name: str, parameters: Dict[str, Any]) -> Optional[ToolResult]:
+        """读取已过期但仍在保留期内的结果（结果中标记 stale），没有时返回None"""
+        cached = await self.backend.aget(self.make_key(tool_name, parameters))
+        if cached is None or "result" not in cached:
+            return None
+        self._count(tool_name, "stale")
+        result = ToolResult(**cached["result"])
+        if isinstance(result.result, dict):
+            result.result = {**result.result, "stale": True}
+        return result
+
+    def _count(self, tool_name: str, field: str):
+        stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "coalesced": 0, "revalidated": 0, "stale": 0})
+        stats[field] += 1
+        TOOL_CACHE_REQUESTS.labels(tool_name, field).inc()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中统计"""
+        return {
+            "size": len(self.backend),
+            "tools": {name: dict(stats) for name, stats in self._stats.items()}
+        }
+
+    def clear(self):
+        """清空缓存"""
+        self.backend.clear()
@@ -1,38 +1,45 @@
 """
 计算器工具
 """
-import math
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, List, Optional
 from .base import BaseTool, ToolResult
+from .expression import ExpressionEvaluator, ExpressionError
 
 
 class CalculatorTool(BaseTool):
     """数学计算器工具"""
-    
+
     def __init__(self):
         super().__init__(
             name="calculator",
-            description="数学计算器，支持基本运算"
+            description="数学计算器，支持四则运算、幂运算和 sqrt、sin、cos、tan、log、log10、exp、abs、round、min、max、sum、pow 函数及常量 pi、e",
+            triggers=['计算', '算', '等于', '+', '-', '*', '/'],
+            parameters={
+                "type": "object",
+                "properties": {
+                    "expression": {"type": "string", "description": "数学表达式，例如 (15 + 23) * 2 或 sqrt(2) * pi"},
+                    "expressions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "需要一次计算的多个表达式"
+                    }
+                }
+            }
         )
-    
-    async def execute(self, expression: str) -> ToolResult:
-        """执行数学计算"""
+        self.evaluator = ExpressionEvaluator()
+
+    async def execute(self, expression: Optional[str] = None, expressions: Optional[List[str]] = None) -> ToolResult:
+        """执行数学计算（传入expressions时批量计算）"""
+        if expressions is not None:
+            return await self.execute_batch(expressions)
+
         try:
-            # 安全地评估数学表达式
-            allowed_names = {
-                'abs': abs, 'round': round, 'min': min, 'max': max,
-                'sum': sum, 'pow': pow, 'sqrt': math.sqrt,
-                'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
-                'log': math.log, 'log10': math.log10, 'exp': math.exp,
-                'pi': math.pi, 'e': math.e
-            }
-            
-            # 清理表达式，只允许安全的字符
-            safe_expr = ''.join(c for c in expression if c.isdigit() or c in '+-*/.() ')
-            
-            # 使用eval但限制在安全的命名空间中
-            result = eval(safe_expr, {"__builtins__": {}}, allowed_names)
-            
+            if expression is None:
+                raise ExpressionError("缺少表达式")
+            # 在线程池中求值，避免阻塞事件循环
+            result = await asyncio.to_thread(self.evaluator.evaluate, expression)
+
             return ToolResult(
                 tool_name=self.name,
                 result={
@@ -52,4 +59,26 @@ class CalculatorTool(BaseTool):
                 },
                 success=False,
                 error=str(e)
-            ) 
\ No newline at end of file
+            )
+
+    async def execute_batch(self, expressions: List[str]) -> ToolResult:
+        """批量计算多个表达式（一次线程切换），单个表达式出错不影响其余结果"""
+        results = await asyncio.to_thread(self._evaluate_many, expressions)
+        return ToolResult(
+            tool_name=self.name,
+            result={
+                "results": results,
+                "type": "batch"
+            },
+            success=any("result" in item for item in results) or not results
+        )
+
+    def _evaluate_many(self, expressions: List[str]) -> List[Dict[str, Any]]:
+        """依次求值，返回与输入一一对应的结果"""
+        results = []
+        for expression in expressions:
+            try:
+                results.append({"expression": expression, "result": self.evaluator.evaluate(expression)})
+            except Exception as e:
+                results.append({"expression": expression, "error": f"计算错误: {str(e)}"})
+        return results
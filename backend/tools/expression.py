@@ -0,0 +1,163 @@
+"""
+安全的数学表达式求值（基于AST，带资源限制和LRU缓存）
+"""
+import ast
+import math
+import operator
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+from config import settings
+
+
+class ExpressionError(ValueError):
+    """表达式不合法或超出计算限制"""
+    pass
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+FUNCTIONS = {
+    'abs': abs, 'round': round, 'min': min, 'max': max,
+    'sum': sum, 'pow': pow, 'sqrt': math.sqrt,
+    'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'log': math.log, 'log10': math.log10, 'exp': math.exp,
+}
+
+CONSTANTS = {
+    'pi': math.pi, 'e': math.e
+}
+
+# round 的小数位数上限（整数的负小数位数需要计算 10**|ndigits|）
+MAX_ROUND_DIGITS = 100
+
+# 常见的全角/中文运算符
+REPLACEMENTS = str.maketrans({'×': '*', '÷': '/', '（': '(', '）': ')', '，': ','})
+
+
+class ExpressionEvaluator:
+    """基于AST的表达式求值器
+
+    只允许数字、四则/幂/取模运算、列出的函数和常量；限制嵌套深度、求值步数、
+    指数大小和整数位数，避免 9**9**9 之类的输入占满CPU。结果按表达式缓存。
+    """
+
+    def __init__(
+        self,
+        max_depth: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        max_exponent: Optional[float] = None,
+        max_int_bits: Optional[int] = None,
+        cache_size: Optional[int] = None
+    ):
+        self.max_depth = max_depth or settings.CALCULATOR_MAX_DEPTH
+        self.max_steps = max_steps or settings.CALCULATOR_MAX_STEPS
+        self.max_exponent = max_exponent or settings.CALCULATOR_MAX_EXPONENT
+        self.max_int_bits = max_int_bits or settings.CALCULATOR_MAX_INT_BITS
+        self._cached = lru_cache(maxsize=cache_size or settings.CALCULATOR_CACHE_SIZE)(self._evaluate_safely)
+
+    def evaluate(self, expression: str) -> Any:
+        """求值表达式，不合法或超出限制时抛出ExpressionError"""
+        ok, value = self._cached(expression.translate(REPLACEMENTS).strip())
+        if not ok:
+            raise ExpressionError(value)
+        return value
+
+    def cache_info(self):
+        """缓存命中统计"""
+        return self._cached.cache_info()
+
+    def _evaluate_safely(self, expression: str) -> Tuple[bool, Any]:
+        """求值并把错误也作为结果返回（便于缓存）"""
+        try:
+            tree = ast.parse(expression, mode="eval")
+            return True, self._eval(tree.body, 0, [0])
+        except ExpressionError as e:
+            return False, str(e)
+        except SyntaxError:
+            return False, "表达式语法错误"
+        except (ArithmeticError, ValueError, TypeError) as e:
+            return False, str(e)
+
+    def _eval(self, node: ast.AST, depth: int, steps: list) -> Any:
+        if depth > self.max_depth:
+            raise ExpressionError(f"表达式嵌套过深（超过{self.max_depth}层）")
+        steps[0] += 1
+        if steps[0] > self.max_steps:
+            raise ExpressionError(f"表达式过于复杂（超过{self.max_steps}步）")
+
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return self._check_size(node.value)
+        if isinstance(node, ast.Name):
+            if node.id in CONSTANTS:
+                return CONSTANTS[node.id]
+            raise ExpressionError(f"未知的名称: {node.id}")
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            operand = self._check_number(self._eval(node.operand, depth + 1, steps))
+            return UNARY_OPERATORS[type(node.op)](operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left = self._check_number(self._eval(node.left, depth + 1, steps))
+            right = self._check_number(self._eval(node.right, depth + 1, steps))
+            if isinstance(node.op, ast.Pow):
+                self._check_power(left, right)
+            return self._check_size(BINARY_OPERATORS[type(node.op)](left, right))
+        if isinstance(node, (ast.List, ast.Tuple)):
+            raise ExpressionError("列表只能作为函数参数，如 sum([1, 2, 3])")
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function = FUNCTIONS.get(node.func.id)
+            if function is None:
+                raise ExpressionError(f"不支持的函数: {node.func.id}")
+            args = [self._eval_argument(arg, depth + 1, steps) for arg in node.args]
+            self._check_arguments(function, args)
+            return self._check_size(function(*args))
+        raise ExpressionError(f"不支持的表达式: {type(node).__name__}")
+
+    def _eval_argument(self, node: ast.AST, depth: int, steps: list) -> Any:
+        """函数参数可以是列表字面量（元素个数受求值步数限制）"""
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self._check_number(self._eval(item, depth + 1, steps)) for item in node.elts]
+        return self._eval(node, depth, steps)
+
+    @staticmethod
+    def _check_number(value: Any) -> Any:
+        """运算数只能是数字（列表、字符串与数字相乘会按重复次数分配内存）"""
+        if type(value) not in (int, float):
+            raise ExpressionError("运算数必须是数字")
+        return value
+
+    def _check_arguments(self, function: Any, args: List[Any]):
+        """调用前检查会导致大量计算的参数"""
+        if function is pow and len(args) >= 2:
+            self._check_power(args[0], args[1])
+        if function is round and len(args) >= 2:
+            ndigits = args[1]
+            if type(ndigits) is not int or abs(ndigits) > MAX_ROUND_DIGITS:
+                raise ExpressionError(f"round的小数位数必须是绝对值不超过{MAX_ROUND_DIGITS}的整数")
+
+    def _check_power(self, base: Any, exponent: Any):
+        """限制幂运算规模"""
+        if isinstance(exponent, (int, float)) and abs(exponent) > self.max_exponent:
+            raise ExpressionError(f"指数过大（绝对值超过{self.max_exponent}）")
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0:
+            if abs(base).bit_length() * exponent > self.max_int_bits:
+                raise ExpressionError(f"结果过大（超过{self.max_int_bits}位）")
+
+    def _check_size(self, value: Any) -> Any:
+        """限制整数结果的位数，拒绝复数结果（如负数的分数次幂）"""
+        if isinstance(value, complex):
+            raise ExpressionError("结果不是实数")
+        if isinstance(value, int) and value.bit_length() > self.max_int_bits:
+            raise ExpressionError(f"结果过大（超过{self.max_int_bits}位）")
+        return value
@@ -0,0 +1,101 @@
+"""
+共享异步HTTP客户端
+"""
+import asyncio
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+
+
+class AsyncHTTPClient:
+    """进程级共享的异步HTTP客户端（连接池 + 单主机并发限制）"""
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        connect_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        max_connections_per_host: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else settings.HTTP_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else settings.HTTP_CONNECT_TIMEOUT
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=keepalive_expiry if keepalive_expiry is not None else settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        self.max_connections_per_host = max_connections_per_host or settings.HTTP_MAX_CONNECTIONS_PER_HOST
+        self.transport = transport  # 可替换为本地桩服务（如 httpx.ASGITransport）
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """获取底层httpx客户端（首次使用时创建）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                follow_redirects=True,
+                transport=self.transport
+            )
+        return self._client
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """获取指定主机的并发信号量"""
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """发送请求，同一主机的并发连接数受限"""
+        async with self._get_host_semaphore(url):
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        """发送GET请求"""
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._host_semaphores.clear()
+
+
+# 全局HTTP客户端实例
+_http_client: Optional[AsyncHTTPClient] = None
+
+
+def get_http_client() -> AsyncHTTPClient:
+    """获取全局HTTP客户端"""
+    global _http_client
+    if _http_client is None:
+        _http_client = AsyncHTTPClient()
+    return _http_client
+
+
+def set_http_client(client: Optional[AsyncHTTPClient]):
+    """替换全局HTTP客户端（基准测试中接入本地桩服务）"""
+    global _http_client
+    _http_client = client
+
+
+async def close_http_client():
+    """关闭全局HTTP客户端（应用关闭时调用）"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -1,21 +1,43 @@
 """
 工具管理器
 """
-from typing import Dict, List, Any, Union
+import asyncio
+import logging
+from typing import Dict, List, Any, Union, Optional, Tuple
 from .base import BaseTool, ToolResult
+from .cache import ToolResultCache
+from .resilience import UpstreamGuard, create_upstream_guards
+from .refresher import WeatherRefresher
 from .calculator import CalculatorTool
 from .weather import WeatherTool
 from .time_tool import TimeTool
 from .translator import TranslatorTool
 from .web_search import WebSearchTool
+from metrics import TOOL_SECONDS, TOOL_ERRORS, TOOL_UPSTREAM_EVENTS
+from config import settings
+
+logger = logging.getLogger(__name__)
 
 
 class ToolManager:
     """工具管理器"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[ToolResultCache] = None,
+        guards: Optional[Dict[str, UpstreamGuard]] = None
+    ):
         self.tools: Dict[str, BaseTool] = {}
+        if cache is None and settings.TOOL_CACHE_ENABLED:
+            cache = ToolResultCache()
+        self.cache = cache
+        self.guards = guards if guards is not None else create_upstream_guards()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.version = 0  # 工具注册变化时递增，用于失效缓存的工具目录
         self._register_default_tools()
+        self.refresher: Optional[WeatherRefresher] = None
+        if settings.WEATHER_REFRESH_ENABLED and cache is not None and cache.is_cacheable("weather"):
+            self.refresher = WeatherRefresher(self)
     
     def _register_default_tools(self):
         """注册默认工具"""
@@ -25,9 +47,22 @@ class ToolManager:
         self.register_tool(TranslatorTool())
         self.register_tool(WebSearchTool())
     
+    async def start(self):
+        """启动后台任务（应用启动时调用）；未配置天气API密钥时不刷新天气"""
+        if self.refresher is not None and settings.OPENWEATHER_API_KEY:
+            await self.refresher.start()
+    
+    async def close(self):
+        """停止后台任务（应用关闭时调用）"""
+        if self.refresher is not None:
+            await self.refresher.close()
+        for tool in self.tools.values():
+            await tool.close()
+    
     def register_tool(self, tool: BaseTool):
         """注册工具"""
         self.tools[tool.name] = tool
+        self.version += 1
     
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> ToolResult:
         """执行工具"""
@@ -39,17 +74,128 @@ class ToolManager:
                 error=f"工具 '{tool_name}' 不存在"
             )
         
+        tool = self.tools[tool_name]
+        cacheable = self.cache is not None and self.cache.is_cacheable(tool_name)
+        with TOOL_SECONDS.labels(tool_name).time():
+            if cacheable:
+                result = await self.cache.get_or_execute(
+                    tool_name,
+                    tool.normalize_parameters(parameters),
+                    lambda: self._execute_guarded(tool, parameters)
+                )
+            else:
+                result = await self._execute_guarded(tool, parameters)
+        if not result.success and cacheable:
+            # 上游故障时返回仍在保留期内的过期结果
+            stale = await self.cache.get_stale(tool_name, tool.normalize_parameters(parameters))
+            if stale is not None:
+                TOOL_UPSTREAM_EVENTS.labels(tool_name, "stale").inc()
+                logger.warning("工具执行失败，返回过期缓存", extra={"tool": tool_name, "error": result.error})
+                result = stale
+            else:
+                TOOL_ERRORS.labels(tool_name, "error").inc()
+                logger.warning("工具执行失败", extra={"tool": tool_name, "error": result.error})
+        elif not result.success:
+            TOOL_ERRORS.labels(tool_name, "error").inc()
+            logger.warning("工具执行失败", extra={"tool": tool_name, "error": result.error})
+        if result.success and self.refresher is not None and tool_name == self.refresher.TOOL_NAME:
+            # 只统计查询成功的城市，拼错或不存在的城市不会进入热门集合
+            self.refresher.observe(tool.normalize_parameters(parameters))
+        return result
+    
+    async def execute_many(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[ToolResult]:
+        """批量执行工具调用
+        
+        相同的调用（工具名 + 规范化参数）只执行一次，其余并发执行，
+        每个工具的并发数受 TOOL_CONCURRENCY_LIMITS 限制；结果按输入顺序返回。
+        """
+        unique: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        keys = []
+        for tool_name, parameters in calls:
+            key = self.call_key(tool_name, parameters)
+            keys.append(key)
+            unique.setdefault(key, (tool_name, parameters))
+        
+        results = await asyncio.gather(*[
+            self.execute_limited(tool_name, parameters)
+            for tool_name, parameters in unique.values()
+        ])
+        by_key = dict(zip(unique, results))
+        return [by_key[key] for key in keys]
+    
+    async def execute_limited(
+        self,
+        tool_name: str,
+        parameters: Dict[str, Any],
+        started: Optional[asyncio.Event] = None
+    ) -> ToolResult:
+        """在工具并发上限内执行单个调用（带超时），取得执行名额时设置started"""
+        semaphore = self._semaphores.get(tool_name)
+        if semaphore is None:
+            limit = settings.TOOL_CONCURRENCY_LIMITS.get(tool_name, settings.TOOL_DEFAULT_CONCURRENCY)
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[tool_name] = semaphore
+        async with semaphore:
+            if started is not None:
+                started.set()
+            try:
+                return await asyncio.wait_for(
+                    self.execute_tool(tool_name, parameters),
+                    timeout=settings.TOOL_CALL_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                TOOL_ERRORS.labels(tool_name, "timeout").inc()
+                return ToolResult(
+                    tool_name=tool_name,
+                    result=None,
+                    success=False,
+                    error="工具执行超时"
+                )
+    
+    def call_key(self, tool_name: str, parameters: Dict[str, Any]) -> str:
+        """生成工具调用的去重键（工具名 + 规范化后的参数）"""
+        tool = self.tools.get(tool_name)
+        if tool is not None:
+            parameters = tool.normalize_parameters(parameters)
+        return ToolResultCache.make_key(tool_name, parameters)
+    
+    async def _execute_guarded(self, tool: BaseTool, parameters: Dict[str, Any]) -> ToolResult:
+        """经过上游容错包装（限流、熔断、自适应超时、对冲）执行工具"""
+        guard = self.guards.get(tool.name)
+        if guard is None:
+            return await self._execute(tool, parameters)
+        return await guard.call(lambda: self._execute(tool, parameters))
+    
+    async def _execute(self, tool: BaseTool, parameters: Dict[str, Any]) -> ToolResult:
+        """直接执行工具（不经过缓存）"""
         try:
-            tool = self.tools[tool_name]
             return await tool.execute(**parameters)
         except Exception as e:
+            logger.exception("工具执行异常", extra={"tool": tool.name})
             return ToolResult(
-                tool_name=tool_name,
+                tool_name=tool.name,
                 result=None,
                 success=False,
                 error=str(e)
             )
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取工具结果缓存统计"""
+        if self.cache is None:
+            return {"enabled": False}
+        stats = {"enabled": True, **self.cache.get_stats()}
+        if self.refresher is not None:
+            stats["weather_refresh"] = self.refresher.get_stats()
+        return stats
+    
+    def get_upstream_stats(self) -> Dict[str, Any]:
+        """获取各上游的熔断状态和耗时统计"""
+        return {name: guard.get_stats() for name, guard in self.guards.items()}
+    
+    def get_tool_schemas(self) -> List[Dict[str, Any]]:
+        """导出所有工具的调用schema（供模型原生工具调用使用）"""
+        return [tool.get_schema() for tool in self.tools.values()]
+    
     def get_available_tools(self) -> List[Dict[str, str]]:
         """获取可用工具列表"""
         return [tool.get_info() for tool in self.tools.values()]
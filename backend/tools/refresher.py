@@ -0,0 +1,135 @@
+"""
+热门城市天气的后台刷新
+
+统计各城市成功的天气查询次数（每个刷新周期按衰减系数衰减），查询最多的若干城市构成热门集合，
+热门集合以 WEATHER_REFRESH_SEED_CITIES 为初始值，随查询自动变化。
+后台任务每个周期把缓存即将过期或不存在的热门城市重新查询一遍，按查询次数从高到低，
+每个周期最多刷新 WEATHER_REFRESH_MAX_PER_CYCLE 个城市以控制上游配额；刷新请求同样经过上游限流和熔断。热门城市的查询因此基本都命中缓存。
+
+多worker部署时缓存在共享状态中，每个周期只由抢到租约的进程刷新；查询次数按进程统计。
+"""
+import os
+import heapq
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+from shared_state import get_shared_state
+from metrics import WEATHER_REFRESHES
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherRefresher:
+    """热门城市天气的后台刷新任务"""
+
+    TOOL_NAME = "weather"
+
+    def __init__(
+        self,
+        manager: "ToolManager",
+        interval: Optional[float] = None,
+        refresh_ahead: Optional[float] = None,
+        max_per_cycle: Optional[int] = None,
+        hot_size: Optional[int] = None
+    ):
+        self.manager = manager
+        self.interval = interval or settings.WEATHER_REFRESH_INTERVAL_SECONDS
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else settings.WEATHER_REFRESH_AHEAD_SECONDS
+        self.max_per_cycle = max_per_cycle or settings.WEATHER_REFRESH_MAX_PER_CYCLE
+        self.hot_size = hot_size or settings.WEATHER_REFRESH_HOT_SIZE
+        self.scores: Dict[str, float] = {}
+        self.refreshed = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+        self.seed(settings.WEATHER_REFRESH_SEED_CITIES)
+
+    def seed(self, cities: Iterable[str], score: float = 1.0):
+        """预置热门城市（没有查询时随衰减逐渐移出热门集合）"""
+        tool = self.manager.tools[self.TOOL_NAME]
+        for city in cities:
+            city = tool.normalize_parameters({"city": city})["city"]
+            self.scores[city] = max(self.scores.get(city, 0.0), score)
+
+    def observe(self, parameters: Dict[str, Any]):
+        """记录一次成功的天气查询（参数已规范化）"""
+        city = parameters.get("city")
+        if isinstance(city, str) and city:
+            self.scores[city] = self.scores.get(city, 0.0) + 1
+
+    def hot_cities(self) -> List[str]:
+        """查询次数最多的城市，从高到低"""
+        return heapq.nlargest(self.hot_size, self.scores, key=self.scores.get)
+
+    def _decay(self):
+        decay = settings.WEATHER_REFRESH_DECAY
+        self.scores = {
+            city: score * decay
+            for city, score in self.scores.items()
+            if score * decay >= settings.WEATHER_REFRESH_MIN_SCORE
+        }
+
+    async def refresh_once(self) -> int:
+        """刷新一批即将过期的热门城市，返回成功刷新的城市数"""
+        cache = self.manager.cache
+        tool = self.manager.tools[self.TOOL_NAME]
+        due = []
+        for city in self.hot_cities():
+            parameters = {"city": city}
+            if await cache.fresh_for(self.TOOL_NAME, parameters) < self.refresh_ahead:
+                due.append(parameters)
+                if len(due) >= self.max_per_cycle:
+                    break
+
+        results = await asyncio.gather(*[
+            cache.refresh(
+                self.TOOL_NAME,
+                parameters,
+                lambda parameters=parameters: self.manager._execute_guarded(tool, parameters)
+            )
+            for parameters in due
+        ], return_exceptions=True)
+        succeeded = sum(1 for result in results if not isinstance(result, BaseException) and result.success)
+        self.refreshed += succeeded
+        self.failed += len(due) - succeeded
+        WEATHER_REFRESHES.labels("success").inc(succeeded)
+        WEATHER_REFRESHES.labels("failure").inc(len(due) - succeeded)
+        return succeeded
+
+    async def start(self):
+        """启动后台刷新任务（应用启动时调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def close(self):
+        """停止后台刷新任务（应用关闭时调用）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_periodically(self):
+        shared_state = get_shared_state()
+        while True:
+            try:
+                # 多worker部署时每个周期只由抢到租约的进程刷新
+                if await shared_state.aadd("lease:weather_refresh", os.getpid(), ttl=self.interval * 0.9):
+                    refreshed = await self.refresh_once()
+                    if refreshed:
+                        logger.debug("热门城市天气已刷新", extra={"cities": refreshed})
+                self._decay()
+            except Exception:
+                logger.exception("热门城市天气刷新失败")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """热门城市及刷新次数"""
+        return {
+            "running": self._task is not None,
+            "hot_cities": self.hot_cities(),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+        }
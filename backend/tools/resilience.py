@@ -0,0 +1,208 @@
+"""
+上游容错 - 网络工具的限流、熔断、自适应超时和对冲请求
+
+每个上游（按工具名区分）一个 UpstreamGuard，状态按worker进程统计：
+
+- 限流：令牌桶，超出速率的请求排队等待
+- 熔断：连续失败达到阈值后直接失败，每隔 reset_timeout 放行一次试探请求，成功即恢复；
+  只统计上游故障（网络错误、超时、5xx和429），城市不存在（404）、未配置密钥等失败不影响熔断状态
+- 自适应超时：按近期成功请求耗时的p99乘以系数，限制在[min_timeout, max_timeout]内；
+  熔断后的试探请求使用上限超时，上游整体变慢时由试探成功的样本放宽超时
+- 对冲请求：请求耗时超过近期分位数时再发一个相同请求，取先成功的结果
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+from .base import ToolResult
+from .rate_limit import TokenBucket
+from metrics import TOOL_CIRCUIT_OPEN, TOOL_UPSTREAM_EVENTS
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Attempt = Callable[[], Awaitable[ToolResult]]
+
+
+class CircuitBreaker:
+    """熔断器：closed（正常）→ open（直接失败）→ half_open（放行试探请求）"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """是否放行请求；熔断期间每隔reset_timeout放行一次试探请求"""
+        state = self.state
+        if state == "half_open":
+            # 下一次试探要再等reset_timeout，试探请求被取消也不会卡住
+            self.opened_at = time.monotonic()
+        return state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """近期请求耗时的滑动窗口"""
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class UpstreamGuard:
+    """单个上游的容错包装"""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 0,
+        burst: int = 1,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        min_timeout: Optional[float] = None,
+        max_timeout: Optional[float] = None,
+        hedging: Optional[bool] = None
+    ):
+        self.name = name
+        self.rate_limiter = TokenBucket(rate, burst) if rate > 0 else None
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.TOOL_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout if reset_timeout is not None else settings.TOOL_BREAKER_RESET_SECONDS
+        )
+        self.latency = LatencyTracker(settings.TOOL_LATENCY_WINDOW)
+        self.min_timeout = min_timeout if min_timeout is not None else settings.TOOL_ADAPTIVE_TIMEOUT_MIN
+        self.max_timeout = max_timeout if max_timeout is not None else settings.TOOL_CALL_TIMEOUT
+        self.hedging = settings.TOOL_HEDGING_ENABLED if hedging is None else hedging
+
+    def timeout(self) -> float:
+        """当前的单次请求超时：样本不足时使用上限"""
+        if len(self.latency) < settings.TOOL_LATENCY_MIN_SAMPLES:
+            return self.max_timeout
+        timeout = self.latency.quantile(0.99) * settings.TOOL_ADAPTIVE_TIMEOUT_MULTIPLIER
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    def hedge_delay(self) -> Optional[float]:
+        """发出对冲请求前的等待时间；未开启或样本不足时为None"""
+        if not self.hedging or len(self.latency) < settings.TOOL_LATENCY_MIN_SAMPLES:
+            return None
+        return self.latency.quantile(settings.TOOL_HEDGE_QUANTILE)
+
+    async def call(self, attempt: Attempt) -> ToolResult:
+        """在限流、熔断和超时约束下执行一次工具调用"""
+        probing = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            TOOL_UPSTREAM_EVENTS.labels(self.name, "rejected").inc()
+            return self._failure("上游暂时不可用（已熔断）")
+
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        timeout = self.max_timeout if probing else self.timeout()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._hedged(attempt), timeout)
+        except asyncio.TimeoutError:
+            TOOL_UPSTREAM_EVENTS.labels(self.name, "timeout").inc()
+            self._record(False)
+            return self._failure(f"上游响应超时（{timeout:.1f}秒）")
+
+        if result.success:
+            self.latency.observe(time.monotonic() - started)
+            self._record(True)
+        elif result.upstream_error:
+            self._record(False)
+        return result
+
+    async def _hedged(self, attempt: Attempt) -> ToolResult:
+        """请求耗时超过对冲延迟时再发一个相同请求，返回先成功的结果"""
+        delay = self.hedge_delay()
+        if delay is None:
+            return await attempt()
+
+        first = asyncio.create_task(attempt())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            if self.rate_limiter is None or self.rate_limiter.try_acquire():
+                TOOL_UPSTREAM_EVENTS.labels(self.name, "hedged").inc()
+                tasks.add(asyncio.create_task(attempt()))
+            while True:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.success or not tasks:
+                        return result
+        finally:
+            for task in tasks:
+                task.cancel()
+            first.cancel()
+
+    def _record(self, success: bool):
+        was_open = self.breaker.opened_at is not None
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        is_open = self.breaker.opened_at is not None
+        if is_open != was_open:
+            TOOL_CIRCUIT_OPEN.labels(self.name).set(1 if is_open else 0)
+            if is_open:
+                logger.warning("上游连续失败，已熔断", extra={"tool": self.name, "failures": self.breaker.failures})
+            else:
+                logger.info("上游已恢复", extra={"tool": self.name})
+
+    def _failure(self, error: str) -> ToolResult:
+        return ToolResult(tool_name=self.name, result=None, success=False, error=error, upstream_error=True)
+
+    def get_stats(self) -> Dict[str, object]:
+        """熔断状态、当前超时和近期耗时分位数"""
+        stats = {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "timeout": round(self.timeout(), 3),
+            "samples": len(self.latency),
+        }
+        if len(self.latency):
+            stats["p50"] = round(self.latency.quantile(0.5), 3)
+            stats["p95"] = round(self.latency.quantile(0.95), 3)
+        return stats
+
+
+def create_upstream_guards() -> Dict[str, UpstreamGuard]:
+    """按配置为网络工具创建容错包装"""
+    if not settings.TOOL_RESILIENCE_ENABLED:
+        return {}
+    guards = {}
+    for name in settings.TOOL_RESILIENCE_TOOLS:
+        rate, burst = settings.TOOL_RATE_LIMITS.get(name, (0, 1))
+        guards[name] = UpstreamGuard(name, rate, burst)
+    return guards
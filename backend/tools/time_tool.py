@@ -12,7 +12,14 @@ class TimeTool(BaseTool):
     def __init__(self):
         super().__init__(
             name="time",
-            description="获取当前时间"
+            description="获取当前时间",
+            triggers=['时间', '几点', '日期', '今天', '现在'],
+            parameters={
+                "type": "object",
+                "properties": {
+                    "timezone": {"type": "string", "description": "IANA时区名称，默认 Asia/Shanghai"}
+                }
+            }
         )
     
     async def execute(self, timezone: str = "Asia/Shanghai") -> ToolResult:
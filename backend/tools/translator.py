@@ -1,111 +1,227 @@
 """
 翻译工具 - 使用 MyMemory 免费API
 """
-import requests
-from typing import Dict, Any
-from .base import BaseTool, ToolResult
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Set, Tuple
+from .base import BaseTool, ToolResult, is_upstream_error
+from .cache import TTLCache
+from .http_client import get_http_client
+from .rate_limit import TokenBucket
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# 语言代码映射
+LANG_MAPPING = {
+    "zh": "zh-CN", "zh-cn": "zh-CN", "chinese": "zh-CN",
+    "en": "en", "english": "en",
+    "ja": "ja", "japanese": "ja",
+    "ko": "ko", "korean": "ko",
+    "fr": "fr", "french": "fr",
+    "de": "de", "german": "de",
+    "es": "es", "spanish": "es",
+    "ru": "ru", "russian": "ru",
+    "ar": "ar", "arabic": "ar",
+    "hi": "hi", "hindi": "hi",
+    "pt": "pt", "portuguese": "pt",
+    "it": "it", "italian": "it"
+}
+
+# 合并多条文本时使用的分隔符
+BATCH_SEPARATOR = "\n"
+
+
+class TranslationError(Exception):
+    """上游翻译失败（upstream表示上游故障，而不是请求本身的问题）"""
+
+    def __init__(self, message: str, upstream: bool = False):
+        super().__init__(message)
+        self.upstream = upstream
+
+
+def _is_upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, TranslationError):
+        return error.upstream
+    return is_upstream_error(error)
+
+
+class TranslationBatcher:
+    """翻译微批处理器
+
+    同一语言对在时间窗口内到达的请求合并为一个批次，重复文本只翻译一次；
+    批次按上游单次请求的长度上限拆包后发送。
+    """
+
+    def __init__(self, translate_pack, window: float, max_chars: int):
+        self.translate_pack = translate_pack
+        self.window = window
+        self.max_chars = max_chars
+        self._pending: Dict[Tuple[str, str], List[Tuple[str, asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, text: str, source_lang: str, target_lang: str) -> Dict[str, Any]:
+        """提交一条文本，返回该文本的翻译结果"""
+        langpair = (source_lang, target_lang)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._pending.get(langpair)
+        if queue is None:
+            queue = self._pending[langpair] = []
+            task = asyncio.create_task(self._flush_later(langpair))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append((text, future))
+        return await future
+
+    async def _flush_later(self, langpair: Tuple[str, str]):
+        """等待时间窗口结束后发送该语言对的批次"""
+        await asyncio.sleep(self.window)
+        items = self._pending.pop(langpair, [])
+        waiters: Dict[str, List[asyncio.Future]] = {}
+        for text, future in items:
+            waiters.setdefault(text, []).append(future)
+
+        packs = self._pack(list(waiters))
+        try:
+            results = await asyncio.gather(
+                *[self.translate_pack(pack, *langpair) for pack in packs],
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            for futures in waiters.values():
+                for future in futures:
+                    future.cancel()
+            raise
+        for pack, pack_results in zip(packs, results):
+            for index, text in enumerate(pack):
+                outcome = pack_results if isinstance(pack_results, BaseException) else pack_results[index]
+                for future in waiters[text]:
+                    if future.done():
+                        continue
+                    if isinstance(outcome, BaseException):
+                        future.set_exception(outcome)
+                    else:
+                        future.set_result(outcome)
+
+    async def close(self):
+        """取消尚未完成的批次（应用关闭时调用），等待中的调用方收到取消"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for items in self._pending.values():
+            for _, future in items:
+                future.cancel()
+        self._pending.clear()
+
+    def _pack(self, texts: List[str]) -> List[List[str]]:
+        """按长度上限把文本装进若干个上游请求（含分隔符的文本单独发送）"""
+        packs: List[List[str]] = []
+        current: List[str] = []
+        size = 0
+        for text in texts:
+            length = len(text.encode("utf-8"))
+            if BATCH_SEPARATOR in text or length >= self.max_chars:
+                packs.append([text])
+                continue
+            if current and size + len(BATCH_SEPARATOR) + length > self.max_chars:
+                packs.append(current)
+                current, size = [], 0
+            size += length + (len(BATCH_SEPARATOR) if current else 0)
+            current.append(text)
+        if current:
+            packs.append(current)
+        return packs
 
 
 class TranslatorTool(BaseTool):
     """文本翻译工具"""
-    
+
     def __init__(self):
         super().__init__(
             name="translate",
-            description="文本翻译（使用MyMemory免费API）"
+            description="文本翻译（使用MyMemory免费API）",
+            triggers=['翻译', 'translate', '英文', '中文', '日文', '韩文', '法文', '德文', '西班牙文', '俄文'],
+            parameters={
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string", "description": "要翻译的文本"},
+                    "texts": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "需要翻译成同一目标语言的多条文本"
+                    },
+                    "target_lang": {"type": "string", "description": "目标语言代码，例如 en、zh、ja、ko、fr、de、es、ru"}
+                }
+            }
         )
-    
-    async def execute(self, text: str, target_lang: str = "en") -> ToolResult:
-        """执行文本翻译"""
+        self.rate_limiter = TokenBucket(settings.TRANSLATE_RATE_LIMIT, settings.TRANSLATE_RATE_BURST)
+        self.batcher = TranslationBatcher(
+            self._translate_pack,
+            window=settings.TRANSLATE_BATCH_WINDOW_MS / 1000,
+            max_chars=settings.TRANSLATE_BATCH_MAX_CHARS
+        )
+        self.cache = TTLCache(settings.TRANSLATE_CACHE_MAX_ENTRIES)
+
+    async def close(self):
+        """取消尚未发送的翻译批次"""
+        await self.batcher.close()
+
+    def normalize_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """规范化参数：待翻译文本保留大小写，只合并空白"""
+        normalized = super().normalize_parameters(parameters)
+        if isinstance(parameters.get("text"), str):
+            normalized["text"] = " ".join(parameters["text"].split())
+        return normalized
+
+    @staticmethod
+    def _resolve_langpair(target_lang: str) -> Tuple[str, str]:
+        """标准化目标语言并推断源语言"""
+        target_lang = target_lang.lower()
+        if target_lang in LANG_MAPPING:
+            target_lang = LANG_MAPPING[target_lang]
+
+        # 检测源语言（自动检测）
+        # 根据目标语言智能选择源语言
+        if target_lang.lower() in ["zh", "zh-cn", "chinese"]:
+            source_lang = "en"  # 如果目标是中文，源语言设为英文
+        else:
+            source_lang = "zh-CN"  # 如果目标是其他语言，源语言设为中文
+        return source_lang, target_lang
+
+    async def execute(
+        self,
+        text: Optional[str] = None,
+        target_lang: str = "en",
+        texts: Optional[List[str]] = None
+    ) -> ToolResult:
+        """执行文本翻译（传入texts时批量翻译）"""
+        if texts is not None:
+            return await self.execute_batch(texts, target_lang)
+
         try:
-            # 语言代码映射
-            lang_mapping = {
-                "zh": "zh-CN", "zh-cn": "zh-CN", "chinese": "zh-CN",
-                "en": "en", "english": "en",
-                "ja": "ja", "japanese": "ja",
-                "ko": "ko", "korean": "ko",
-                "fr": "fr", "french": "fr",
-                "de": "de", "german": "de",
-                "es": "es", "spanish": "es",
-                "ru": "ru", "russian": "ru",
-                "ar": "ar", "arabic": "ar",
-                "hi": "hi", "hindi": "hi",
-                "pt": "pt", "portuguese": "pt",
-                "it": "it", "italian": "it"
-            }
-            
-            # 标准化语言代码
-            target_lang = target_lang.lower()
-            if target_lang in lang_mapping:
-                target_lang = lang_mapping[target_lang]
-            
-            # 检测源语言（自动检测）
-            # 根据目标语言智能选择源语言
-            if target_lang.lower() in ["zh", "zh-cn", "chinese"]:
-                source_lang = "en"  # 如果目标是中文，源语言设为英文
-            else:
-                source_lang = "zh-CN"  # 如果目标是其他语言，源语言设为中文
-            
-            # 使用 MyMemory 免费翻译API
-            url = "https://api.mymemory.translated.net/get"
-            params = {
-                "q": text,
-                "langpair": f"{source_lang}|{target_lang}",
-                "de": "your-email@domain.com"  # 可选，用于提高限制
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data.get("responseStatus") == 200:
-                    translated_text = data["responseData"]["translatedText"]
-                    
-                    # 安全地获取检测到的语言信息
-                    detected_lang = source_lang  # 默认使用我们设置的源语言
-                    confidence = 0
-                    
-                    # 如果API返回了检测到的语言信息，则使用它
-                    if "detectedLanguage" in data["responseData"]:
-                        detected_lang = data["responseData"]["detectedLanguage"].get("language", source_lang)
-                        confidence = data["responseData"]["detectedLanguage"].get("confidence", 0)
-                    
-                    return ToolResult(
-                        tool_name=self.name,
-                        result={
-                            "original_text": text,
-                            "translated_text": translated_text,
-                            "source_language": detected_lang,
-                            "target_language": target_lang,
-                            "confidence": confidence,
-                            "type": "translation"
-                        },
-                        success=True
-                    )
-                else:
-                    return ToolResult(
-                        tool_name=self.name,
-                        result={
-                            "text": text,
-                            "error": f"翻译失败: {data.get('responseDetails', '未知错误')}",
-                            "type": "error"
-                        },
-                        success=False,
-                        error=f"翻译失败: {data.get('responseDetails', '未知错误')}"
-                    )
-            else:
-                return ToolResult(
-                    tool_name=self.name,
-                    result={
-                        "text": text,
-                        "error": f"翻译请求失败: {response.status_code}",
-                        "type": "error"
-                    },
-                    success=False,
-                    error=f"翻译请求失败: {response.status_code}"
-                )
-                
+            if text is None:
+                raise TranslationError("缺少待翻译文本")
+            source_lang, target_lang = self._resolve_langpair(target_lang)
+            translation = await self._translate(text, source_lang, target_lang)
+            return ToolResult(
+                tool_name=self.name,
+                result=self._build_result(text, target_lang, translation),
+                success=True
+            )
+        except TranslationError as e:
+            return ToolResult(
+                tool_name=self.name,
+                result={
+                    "text": text,
+                    "error": str(e),
+                    "type": "error"
+                },
+                success=False,
+                error=str(e),
+                upstream_error=_is_upstream_failure(e)
+            )
         except Exception as e:
             return ToolResult(
                 tool_name=self.name,
@@ -115,5 +231,118 @@ class TranslatorTool(BaseTool):
                     "type": "error"
                 },
                 success=False,
-                error=str(e)
-            ) 
\ No newline at end of file
+                error=str(e),
+                upstream_error=_is_upstream_failure(e)
+            )
+
+    async def execute_batch(self, texts: List[str], target_lang: str = "en") -> ToolResult:
+        """批量翻译多条文本，单条失败不影响其余结果"""
+        source_lang, target_lang = self._resolve_langpair(target_lang)
+        outcomes = await asyncio.gather(
+            *[self._translate(text, source_lang, target_lang) for text in texts],
+            return_exceptions=True
+        )
+        translations = []
+        upstream_errors = 0
+        for text, outcome in zip(texts, outcomes):
+            if isinstance(outcome, Exception):
+                translations.append({"text": text, "error": str(outcome), "type": "error"})
+                upstream_errors += _is_upstream_failure(outcome)
+            else:
+                translations.append(self._build_result(text, target_lang, outcome))
+        success = any("translated_text" in item for item in translations) or not texts
+        return ToolResult(
+            tool_name=self.name,
+            result={
+                "translations": translations,
+                "target_language": target_lang,
+                "type": "translation_batch"
+            },
+            success=success,
+            upstream_error=not success and upstream_errors > 0
+        )
+
+    async def _translate(self, text: str, source_lang: str, target_lang: str) -> Dict[str, Any]:
+        """翻译单条文本：先查缓存，未命中时提交到微批处理器"""
+        key = f"{source_lang}|{target_lang}:{text}"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        translation = await self.batcher.submit(text, source_lang, target_lang)
+        self.cache.set(key, translation, settings.TOOL_CACHE_TTLS.get(self.name, 86400))
+        return translation
+
+    async def _translate_pack(self, texts: List[str], source_lang: str, target_lang: str) -> List[Any]:
+        """把一组文本合并成一次上游请求；合并请求失败或返回条数对不上时逐条重试"""
+        if len(texts) == 1:
+            return [await self._request(texts[0], source_lang, target_lang)]
+
+        try:
+            combined = await self._request(BATCH_SEPARATOR.join(texts), source_lang, target_lang)
+            parts = combined["translated_text"].split(BATCH_SEPARATOR)
+            if len(parts) == len(texts):
+                return [
+                    {**combined, "translated_text": part.strip()}
+                    for part in parts
+                ]
+        except TranslationError as e:
+            logger.info("合并翻译请求失败，逐条重试", extra={"texts": len(texts), "error": str(e)})
+        else:
+            logger.info("合并翻译返回条数不符，逐条重试", extra={"texts": len(texts)})
+
+        return await asyncio.gather(
+            *[self._request(text, source_lang, target_lang) for text in texts],
+            return_exceptions=True
+        )
+
+    async def _request(self, text: str, source_lang: str, target_lang: str) -> Dict[str, Any]:
+        """调用一次 MyMemory 翻译API（受限流约束）"""
+        await self.rate_limiter.acquire()
+
+        # 使用 MyMemory 免费翻译API
+        params = {
+            "q": text,
+            "langpair": f"{source_lang}|{target_lang}",
+            "de": "your-email@domain.com"  # 可选，用于提高限制
+        }
+        response = await get_http_client().get(settings.MYMEMORY_API_URL, params=params)
+
+        if response.status_code != 200:
+            raise TranslationError(
+                f"翻译请求失败: {response.status_code}", upstream=is_upstream_error(response.status_code)
+            )
+
+        data = response.json()
+        status = data.get("responseStatus")
+        if status != 200:
+            # 配额用尽时响应体中的状态为429
+            raise TranslationError(
+                f"翻译失败: {data.get('responseDetails', '未知错误')}",
+                upstream=isinstance(status, int) and is_upstream_error(status)
+            )
+
+        # 安全地获取检测到的语言信息
+        detected_lang = source_lang  # 默认使用我们设置的源语言
+        confidence = 0
+
+        # 如果API返回了检测到的语言信息，则使用它
+        if "detectedLanguage" in data["responseData"]:
+            detected_lang = data["responseData"]["detectedLanguage"].get("language", source_lang)
+            confidence = data["responseData"]["detectedLanguage"].get("confidence", 0)
+
+        return {
+            "translated_text": data["responseData"]["translatedText"],
+            "source_language": detected_lang,
+            "confidence": confidence
+        }
+
+    def _build_result(self, text: str, target_lang: str, translation: Dict[str, Any]) -> Dict[str, Any]:
+        """组装单条翻译结果"""
+        return {
+            "original_text": text,
+            "translated_text": translation["translated_text"],
+            "source_language": translation["source_language"],
+            "target_language": target_lang,
+            "confidence": translation["confidence"],
+            "type": "translation"
+        }
@@ -1,10 +1,10 @@
 """
 天气查询工具
 """
-import requests
-import os
 from typing import Dict, Any
-from .base import BaseTool, ToolResult
+from .base import BaseTool, ToolResult, is_upstream_error
+from .http_client import get_http_client
+from gazetteer import get_gazetteer
 from config import settings
 
 
@@ -14,9 +14,27 @@ class WeatherTool(BaseTool):
     def __init__(self):
         super().__init__(
             name="weather",
-            description="获取天气信息"
+            description="获取天气信息",
+            triggers=['天气', '气温', '温度', 'weather', 'temperature'],
+            parameters={
+                "type": "object",
+                "properties": {
+                    "city": {"type": "string", "description": "城市名称，例如 北京"}
+                },
+                "required": ["city"]
+            }
         )
     
+    def normalize_parameters(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """城市索引中的城市统一为显示名称（"Beijing"、"北京市"与"北京"共用缓存）"""
+        normalized = super().normalize_parameters(parameters)
+        city = normalized.get("city")
+        if isinstance(city, str):
+            place = get_gazetteer().lookup(city)
+            if place is not None:
+                normalized["city"] = place.name
+        return normalized
+    
     async def execute(self, city: str) -> ToolResult:
         """执行天气查询"""
         try:
@@ -34,9 +52,20 @@ class WeatherTool(BaseTool):
                     error="天气API密钥未配置"
                 )
             
-            # 调用OpenWeatherMap API
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric&lang=zh_cn"
-            response = requests.get(url, timeout=10)
+            # 调用OpenWeatherMap API：城市索引中的城市按坐标查询，其他按名称查询
+            url = settings.OPENWEATHER_API_URL
+            params = {
+                "appid": api_key,
+                "units": "metric",
+                "lang": "zh_cn"
+            }
+            place = get_gazetteer().lookup(city)
+            if place is not None:
+                city = place.name
+                params.update(lat=place.latitude, lon=place.longitude)
+            else:
+                params["q"] = city
+            response = await get_http_client().get(url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -61,7 +90,8 @@ class WeatherTool(BaseTool):
                         "type": "error"
                     },
                     success=False,
-                    error=f"获取天气信息失败: {response.status_code}"
+                    error=f"获取天气信息失败: {response.status_code}",
+                    upstream_error=is_upstream_error(response.status_code)
                 )
         except Exception as e:
             return ToolResult(
@@ -72,5 +102,6 @@ class WeatherTool(BaseTool):
                     "type": "error"
                 },
                 success=False,
-                error=str(e)
+                error=str(e),
+                upstream_error=is_upstream_error(e)
             ) 
\ No newline at end of file
@@ -1,9 +1,10 @@
 """
 网络搜索工具
 """
-import requests
 from typing import Dict, Any
-from .base import BaseTool, ToolResult
+from .base import BaseTool, ToolResult, is_upstream_error
+from .http_client import get_http_client
+from config import settings
 
 
 class WebSearchTool(BaseTool):
@@ -12,15 +13,29 @@ class WebSearchTool(BaseTool):
     def __init__(self):
         super().__init__(
             name="web_search",
-            description="网络搜索相关信息"
+            description="网络搜索相关信息",
+            triggers=['搜索', '查找', '查询', 'search', '了解', '联网', '上网'],
+            parameters={
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "搜索关键词"}
+                },
+                "required": ["query"]
+            }
         )
     
     async def execute(self, query: str) -> ToolResult:
         """执行网络搜索"""
         try:
             # 使用DuckDuckGo API进行搜索
-            url = f"https://api.duckduckgo.com/?q={query}&format=json&no_html=1&skip_disambig=1"
-            response = requests.get(url, timeout=10)
+            url = settings.DUCKDUCKGO_API_URL
+            params = {
+                "q": query,
+                "format": "json",
+                "no_html": 1,
+                "skip_disambig": 1
+            }
+            response = await get_http_client().get(url, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -43,7 +58,8 @@ class WebSearchTool(BaseTool):
                         "type": "error"
                     },
                     success=False,
-                    error=f"搜索失败: {response.status_code}"
+                    error=f"搜索失败: {response.status_code}",
+                    upstream_error=is_upstream_error(response.status_code)
                 )
         except Exception as e:
             return ToolResult(
@@ -54,5 +70,6 @@ class WebSearchTool(BaseTool):
                     "type": "error"
                 },
                 success=False,
-                error=str(e)
+                error=str(e),
+                upstream_error=is_upstream_error(e)
             ) 
\ No newline at end of file